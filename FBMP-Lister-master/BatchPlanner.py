@@ -0,0 +1,125 @@
+import json
+import math
+import os
+from collections import namedtuple
+
+import Utils
+
+productDirectoryName = "Products Directory"
+productsPerBatch = 50  # fb has a 50 product limit for CSV uploads
+manifestName = "manifest.json"
+
+# batch: which "Products Directory N" the product goes in, row: its row in that batch's CSV (0-based),
+# folder: its image folder inside the batch directory (numbered across the whole run, like it always was)
+BatchSlot = namedtuple('BatchSlot', ['batch', 'row', 'folder'])
+
+
+# Decides where every product of a run goes. Image downloads and the CSV export both look their products
+# up here instead of counting on their own, so rows and image folders always end up in the same batch, and
+# the same product list always produces the same layout.
+# Products can be planned all at once or added one at a time in listing order (the scrape pipeline). Batch
+# numbers count up from firstBatch, or come from allocateBatch() as each batch is opened when the total
+# isn't known up front.
+class BatchPlan:
+    def __init__(self, products=(), firstBatch=1, productsPerBatch=productsPerBatch, allocateBatch=None):
+        self.firstBatch = firstBatch
+        self.productsPerBatch = productsPerBatch
+        self.allocateBatch = allocateBatch
+        self.slots = {}
+        self.batchNumbers = []
+        self.imageFiles = {}  # product -> file names in its folder, filled in once the images are downloaded
+        for product in products:
+            self.add(product)
+
+    # Whether the next add() opens a batch, and so calls allocateBatch (a database transaction)
+    @property
+    def opensBatch(self):
+        return len(self.slots) // self.productsPerBatch == len(self.batchNumbers)
+
+    def add(self, product):
+        index = len(self.slots)
+        if self.opensBatch:
+            if self.allocateBatch is not None:
+                self.batchNumbers.append(self.allocateBatch())
+            else:
+                self.batchNumbers.append(self.firstBatch + len(self.batchNumbers))
+        slot = BatchSlot(self.batchNumbers[-1], index % self.productsPerBatch, str(index + 1))
+        self.slots[product] = slot
+        return slot
+
+    def __len__(self):
+        return len(self.slots)
+
+    def slotFor(self, product):
+        return self.slots[product]
+
+    @property
+    def batches(self):
+        return sorted(self.batchNumbers)
+
+    def batchDirectory(self, baseDir, batch):
+        return os.path.join(baseDir, f"{productDirectoryName} {batch}")
+
+    def productFolder(self, baseDir, product):
+        slot = self.slots[product]
+        return os.path.join(self.batchDirectory(baseDir, slot.batch), slot.folder)
+
+    def setImageFiles(self, product, fileNames):
+        self.imageFiles[product] = fileNames
+
+    def manifestPath(self, baseDir, batch):
+        return os.path.join(self.batchDirectory(baseDir, batch), manifestName)
+
+    def csvPath(self, baseDir, batch):
+        return self.exportPath(baseDir, batch, '.csv')
+
+    # the batch's product sheet for whichever export format is in use (extension includes the dot)
+    def exportPath(self, baseDir, batch, extension):
+        return os.path.join(self.batchDirectory(baseDir, batch), f'Products{batch}{extension}')
+
+
+# Hands out batch numbers from products.db, so the scraper, the export and several runs at once can never
+# end up in the same batch. Batch folders from before the allocator are scanned for once, the first time,
+# so the numbering carries on after them; after that nothing lists the base directory.
+class BatchAllocator:
+    def __init__(self, dbManager, settingsManager):
+        self.dbManager = dbManager
+        self.settingsManager = settingsManager
+
+    # Reserves enough batches for productCount products and returns the first one
+    def allocate(self, productCount):
+        baseDir = self.settingsManager.getBaseDir()
+        firstFree = 1
+        if self.dbManager.lastAllocatedBatch() is None:
+            firstFree = Utils.getNextBatchNumber(productDirectoryName, baseDir or '.') or 1
+        return self.dbManager.allocateBatches(math.ceil(productCount / productsPerBatch), baseDir, firstFree)
+
+    def nextBatch(self):
+        return self.allocate(1)
+
+
+# Everything in a batch in one file: the export file and, per product, its row there, its image folder and
+# the image files in it. The uploader and later stages read this instead of listing the batch's folders.
+def writeManifest(batchPlan, baseDir, batch, products, exportFile):
+    manifest = {
+        'batch': batch,
+        'file': os.path.basename(exportFile),
+        'products': [{
+            'row': batchPlan.slotFor(product).row,
+            'title': product.title,
+            'price': product.price,
+            'folder': batchPlan.slotFor(product).folder,
+            'images': batchPlan.imageFiles.get(product, []),
+        } for product in products],
+    }
+    manifestPath = batchPlan.manifestPath(baseDir, batch)
+    tempPath = manifestPath + '.tmp'
+    with open(tempPath, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tempPath, manifestPath)
+    return manifestPath
+
+
+def readManifest(batchDirectory):
+    with open(os.path.join(batchDirectory, manifestName), encoding='utf-8') as file:
+        return json.load(file)
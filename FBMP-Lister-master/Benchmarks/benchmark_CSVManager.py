@@ -0,0 +1,78 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import CSVManager as CSVManagerModule
+from BatchPlanner import BatchPlan
+from CSVManager import CSVManager
+from Product import Product
+
+
+# the default headers a fresh settings.json gets
+csvHeaders = {
+    "CONDITION": "Used - Like New",
+    "DESCRIPTION": "Good Condition, ships for free with Economy Shipping",
+    "AVAILABLE INVENTORY": 3,
+    "AVAILABLE FOR LOCAL PICKUP": "No",
+    "SHIPPING PRICE": 0,
+    "OFFER FREE SHIPPING": "Yes",
+}
+
+
+# just what CSVManager reads from a SettingsManager, without touching settings.json
+class BenchmarkSettings:
+    def __init__(self, baseDir, exportFormat):
+        self.settings = {'baseDir': baseDir, 'csvHeaders': csvHeaders, 'exportFormat': exportFormat}
+
+    def getBaseDir(self):
+        return self.settings['baseDir']
+
+
+def export(exportFormat, products, traceMemory):
+    with tempfile.TemporaryDirectory() as baseDir:
+        csvManager = CSVManager(BenchmarkSettings(baseDir, exportFormat))
+        batchPlan = BatchPlan(products, 1)
+
+        if traceMemory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        csvManager.saveProducts(products, batchPlan)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if traceMemory else 0
+        tracemalloc.stop()
+        return elapsed, peak
+
+
+# Export time per format, and peak memory (tracemalloc, beyond the product list itself) at a tenth of
+# the products and at all of them: if the export streams, the two peaks are about the same
+def main():
+    argParser = argparse.ArgumentParser(description="Benchmark CSV and XLSX product export")
+    argParser.add_argument('--products', type=int, default=100_000)
+    args = argParser.parse_args()
+    products = [Product(f"Stainless Steel Insulated Water Bottle 32oz #{i}", 20.0 + i % 50, []) for i in range(args.products)]
+    formats = CSVManagerModule.availableExporters()
+
+    sys.stdout = open(os.devnull, 'w')  # saveProducts prints a line per batch file
+    try:
+        results = []
+        for exportFormat in formats:
+            elapsed, _ = export(exportFormat, products, traceMemory=False)
+            _, smallPeak = export(exportFormat, products[:len(products) // 10], traceMemory=True)
+            _, fullPeak = export(exportFormat, products, traceMemory=True)
+            results.append((exportFormat, elapsed, smallPeak, fullPeak))
+    finally:
+        sys.stdout.close()
+        sys.stdout = sys.__stdout__
+
+    print(f"{len(products)} products, {len(products) // 50} files per format")
+    for exportFormat, elapsed, smallPeak, fullPeak in results:
+        print(f"{exportFormat:5} {elapsed:8.2f}s {len(products) / elapsed:10.0f} products/sec   "
+              f"peak memory {smallPeak / 1024:8.0f} KiB at {len(products) // 10}, {fullPeak / 1024:8.0f} KiB at {len(products)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DatabaseManager import DatabaseManager
+
+
+# What addProduct used to do: a fresh connection, a rollback-journal transaction and an fsync per product
+def legacyAddProduct(dbPath, url, title):
+    try:
+        with sqlite3.connect(dbPath) as conn:
+            conn.execute("INSERT INTO products (url, title) VALUES (?, ?)", (url, title))
+    except sqlite3.IntegrityError:
+        pass
+
+
+def legacySetup(dbPath):
+    with sqlite3.connect(dbPath) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS products (id INTEGER PRIMARY KEY, url TEXT UNIQUE, title TEXT)")
+
+
+def report(name, count, elapsed):
+    print(f"{name:34} {count / elapsed:12.0f} inserts/sec")
+
+
+# Compares inserts/sec for the old connect-per-insert behaviour, the persistent connection and the buffered path
+def main():
+    argParser = argparse.ArgumentParser(description="Benchmark DatabaseManager inserts")
+    argParser.add_argument('--products', type=int, default=2000)
+    args = argParser.parse_args()
+    rows = [(f"https://www.ebay.com/itm/{300000000000 + i}", f"Product {i}") for i in range(args.products)]
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        dbPath = os.path.join(tempDir, 'legacy.db')
+        legacySetup(dbPath)
+        start = time.perf_counter()
+        for url, title in rows:
+            legacyAddProduct(dbPath, url, title)
+        report("connect per insert (old)", len(rows), time.perf_counter() - start)
+
+        dbManager = DatabaseManager(os.path.join(tempDir, 'persistent.db'))
+        start = time.perf_counter()
+        for url, title in rows:
+            dbManager.addProduct(url, title)
+        report("persistent connection, WAL", len(rows), time.perf_counter() - start)
+        dbManager.close()
+
+        dbManager = DatabaseManager(os.path.join(tempDir, 'buffered.db'))
+        start = time.perf_counter()
+        for url, title in rows:
+            dbManager.bufferProduct(url, title)
+        dbManager.flushProducts()
+        report(f"buffered, {dbManager.batchSize} per transaction", len(rows), time.perf_counter() - start)
+        dbManager.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ItemKeyIndex import ItemKeyIndex
+
+
+def measure(build):
+    tracemalloc.start()
+    structure = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return structure, size
+
+
+def lookupsPerSecond(contains, probes):
+    start = time.perf_counter()
+    for probe in probes:
+        contains(probe)
+    return len(probes) / (time.perf_counter() - start)
+
+
+# Memory per million keys and lookups/sec for the ItemKeyIndex, a plain Python set, and the SQLite query
+# productAlreadyExistsInDatabase used to run for every product
+def main():
+    argParser = argparse.ArgumentParser(description="Benchmark the in-memory known item index")
+    argParser.add_argument('--keys', type=int, default=1_000_000)
+    argParser.add_argument('--lookups', type=int, default=200_000)
+    args = argParser.parse_args()
+
+    random.seed(1)
+    itemIds = random.sample(range(100_000_000_000, 400_000_000_000), args.keys)
+    # half hits, half misses
+    probes = random.sample(itemIds, args.lookups // 2) + [random.randrange(400_000_000_000, 500_000_000_000)
+                                                          for _ in range(args.lookups // 2)]
+    perMillion = 1_000_000 / args.keys
+
+    index, indexBytes = measure(lambda: ItemKeyIndex(itemIds))
+    print(f"{'ItemKeyIndex':16} {indexBytes * perMillion / 1_000_000:8.1f} MB per million keys "
+          f"{lookupsPerSecond(index.__contains__, probes):12.0f} lookups/sec")
+
+    plainSet, setBytes = measure(lambda: set(itemIds))
+    print(f"{'set of ints':16} {setBytes * perMillion / 1_000_000:8.1f} MB per million keys "
+          f"{lookupsPerSecond(plainSet.__contains__, probes):12.0f} lookups/sec")
+
+    with tempfile.TemporaryDirectory() as tempDir:
+        conn = sqlite3.connect(os.path.join(tempDir, 'products.db'))
+        conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, url TEXT UNIQUE, title TEXT)")
+        conn.executemany("INSERT INTO products (url, title) VALUES (?, ?)",
+                         ((f"https://www.ebay.com/itm/{itemId}", "Product") for itemId in itemIds))
+        conn.commit()
+
+        def sqliteContains(itemId):
+            return conn.execute("SELECT 1 FROM products WHERE url=? AND title=?",
+                                (f"https://www.ebay.com/itm/{itemId}", "Product")).fetchone() is not None
+        sqliteProbes = probes[:20_000]
+        print(f"{'SQLite query':16} {'on disk':>8}                  {lookupsPerSecond(sqliteContains, sqliteProbes):12.0f} lookups/sec")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ProductParser
+
+defaultPagesDir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Tests', 'fixtures')
+
+
+# Parses every saved item page in a directory with each available backend and prints pages/sec and CPU per page.
+# Point --pages at a folder of real eBay item pages (saved with "Save Page As... HTML only") for real numbers.
+def main():
+    argParser = argparse.ArgumentParser(description="Benchmark the product page parser backends")
+    argParser.add_argument('--pages', default=defaultPagesDir, help="directory of saved eBay item pages (*.html)")
+    argParser.add_argument('--rounds', type=int, default=50, help="how many times to parse every page")
+    args = argParser.parse_args()
+
+    pages = []
+    for path in sorted(glob.glob(os.path.join(args.pages, '*.html'))):
+        with open(path, 'rb') as file:
+            pages.append(file.read())
+    if not pages:
+        print(f"No .html pages found in {args.pages}")
+        return
+
+    # the jsonld backend only beats the others on pages that have the structured data, the rest go to the DOM
+    structured = sum(ProductParser.findJsonLd(content) is not None for content in pages)
+    print(f"{len(pages)} pages ({structured} with JSON-LD), {args.rounds} rounds")
+    for name in ProductParser.availableParsers():
+        parser = ProductParser.getParser(name)
+        start = time.perf_counter()
+        cpuStart = time.process_time()
+        for _ in range(args.rounds):
+            for content in pages:
+                parser.parse(content)
+        elapsed = time.perf_counter() - start
+        cpuPerPage = (time.process_time() - cpuStart) / (len(pages) * args.rounds)
+        print(f"{name:12} {len(pages) * args.rounds / elapsed:10.1f} pages/sec {cpuPerPage * 1000:8.3f}ms CPU/page")
+
+if __name__ == '__main__':
+    main()
@@ -1,54 +1,188 @@
 import csv
 import logging
 import os
+import shutil
+import time
 import Utils
+from BatchPlanner import BatchPlan, productDirectoryName, writeManifest
+
+try:
+    from openpyxl import Workbook, load_workbook
+except ImportError:  # openpyxl is optional, only the xlsx export needs it
+    Workbook = load_workbook = None
+
+# Default values
+defaultExportFormat = 'csv'
+
+
+# Export backends. write() gets the header and an iterable of rows for one batch file and streams them out
+# to a temp file that replaces the real one only once it's complete, so the uploader never sees a
+# half-written file. Rows already in the file (an earlier export to the same batch) are kept.
+class CsvExporter:
+    name = 'csv'
+    extension = '.csv'
+
+    def write(self, filePath, fieldNames, rows):
+        tempPath = filePath + '.tmp'
+        try:
+            if os.path.isfile(filePath):
+                shutil.copyfile(filePath, tempPath)
+                mode, needsHeader = 'a', False
+            else:
+                mode, needsHeader = 'w', True
+            with open(tempPath, mode=mode, newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                if needsHeader:
+                    writer.writerow(fieldNames)
+                writer.writerows(rows)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tempPath, filePath)
+        finally:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+
+
+# Marketplace's bulk upload takes spreadsheets too. openpyxl's write-only mode streams each row to disk as
+# it's appended, so memory stays flat however many rows go through it.
+class XlsxExporter:
+    name = 'xlsx'
+    extension = '.xlsx'
+
+    def write(self, filePath, fieldNames, rows):
+        tempPath = filePath + '.tmp'
+        try:
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            if os.path.isfile(filePath):
+                existing = load_workbook(filePath, read_only=True)
+                for row in existing.worksheets[0].iter_rows(values_only=True):
+                    sheet.append(row)
+                existing.close()
+            else:
+                sheet.append(fieldNames)
+            for row in rows:
+                sheet.append(row)
+            workbook.save(tempPath)
+            os.replace(tempPath, filePath)
+        finally:
+            if os.path.exists(tempPath):
+                os.remove(tempPath)
+
+
+exportBackends = {
+    CsvExporter.name: CsvExporter,
+    XlsxExporter.name: XlsxExporter,
+}
+
+
+def availableExporters():
+    return [name for name in exportBackends if name != XlsxExporter.name or Workbook is not None]
+
+
+# Falls back to CSV if the requested format is unknown or its library isn't installed
+def getExporter(name):
+    if name not in availableExporters():
+        print(f"Export format '{name}' is not available, falling back to {CsvExporter.name}")
+        return CsvExporter()
+    return exportBackends[name]()
+
 
 class CSVManager:
-    def __init__(self, settingsManager):
-        self.baseDir = "Products Directory"
+    # batchAllocator (BatchPlanner.BatchAllocator) numbers the batches when saveProducts isn't given a plan.
+    # Without one they're numbered from the batch folders already in the base directory.
+    def __init__(self, settingsManager, batchAllocator=None):
+        self.baseDir = productDirectoryName
         self.settingsManager = settingsManager
         self.settings = self.settingsManager.settings
+        self.batchAllocator = batchAllocator
         self.fieldNames = self.generateFieldNames()
-        self.currentBatch = Utils.getNextBatchNumber(self.baseDir)
+        self.currentBatch = None
 
     def generateFieldNames(self):
         baseFields = ['TITLE', 'PRICE'] # These are dynamic fields that we get from the products so we add these seperately
         additionalFields = list(self.settings.get('csvHeaders', {}).keys())
         return baseFields + [field for field in additionalFields if field not in baseFields]
 
-    def saveProducts(self, products):
-        productCount = 0  # Track the number of products processed in the current batch
+    # batchPlan should be the one the images were downloaded with (ScrapeSession.batchPlan) so rows and
+    # image folders land in the same batch. Without one, the products are planned from the next free batch.
+    # Each batch's file is written in one go through the exportFormat backend (csv or xlsx), followed by
+    # the batch's manifest.json.
+    def saveProducts(self, products, batchPlan=None):
+        if batchPlan is None:
+            if self.batchAllocator is not None:
+                self.currentBatch = self.batchAllocator.allocate(len(products))
+            else:
+                self.currentBatch = Utils.getNextBatchNumber(self.baseDir, self.settingsManager.getBaseDir() or '.')
+            batchPlan = BatchPlan(products, self.currentBatch)
 
         try:
+            productsByBatch = {}
             for product in products:
-                if productCount % 50 == 0 and productCount > 0:
-                    self.currentBatch += 1  # Move to the next batch after every 50 products (FB only allows 50 per CSV)
+                productsByBatch.setdefault(batchPlan.slotFor(product).batch, []).append(product)
 
-                directory = os.path.join(self.settingsManager.getBaseDir(), f"Products Directory {self.currentBatch}")
-                if not os.path.exists(directory):
-                    os.makedirs(directory)
+            exporter = getExporter(self.settings.get('exportFormat', defaultExportFormat))
+            template = self.defaultRow()
+            for batch, batchProducts in sorted(productsByBatch.items()):
+                batchProducts.sort(key=lambda product: batchPlan.slotFor(product).row)
+                os.makedirs(batchPlan.batchDirectory(self.settingsManager.getBaseDir(), batch), exist_ok=True)
 
-                csvFile = os.path.join(directory, f'Products{self.currentBatch}.csv')
-                self.writeProductToCsv(csvFile, product)
+                exportFile = batchPlan.exportPath(self.settingsManager.getBaseDir(), batch, exporter.extension)
+                exporter.write(exportFile, self.fieldNames, self.productRows(batchProducts, template))
+                writeManifest(batchPlan, self.settingsManager.getBaseDir(), batch, batchProducts, exportFile)
 
-                productCount += 1  # Increment the count after processing each product
+                print(f"{len(batchProducts)} products successfully saved to {exportFile}.")
 
-                print(f"Products successfully saved to {csvFile}.")
+        except Exception as e:
+            logging.error(f"Error saving products: {e}", exc_info=True)
 
+    # The csvHeaders defaults as a row in fieldNames order, built once per export.
+    # TITLE and PRICE are the only columns that differ between products.
+    def defaultRow(self):
+        csvHeaders = self.settings.get('csvHeaders', {})
+        return [csvHeaders.get(field, '') for field in self.fieldNames]
+
+    def productRows(self, products, template):
+        titleIndex = self.fieldNames.index('TITLE')
+        priceIndex = self.fieldNames.index('PRICE')
+        for product in products:
+            row = template.copy()
+            row[titleIndex] = getattr(product, 'title', '')
+            row[priceIndex] = getattr(product, 'price', '')
+            yield row
+
+    def writeProductsToCsv(self, filePath, products, template=None):
+        template = template if template is not None else self.defaultRow()
+        CsvExporter().write(filePath, self.fieldNames, self.productRows(products, template))
+
+    # Re-scrape results for items that are already listed: what to reprice, take down or put back up.
+    # Written to their own "Listing Updates <time>" folder, one CSV per kind of change, only for kinds that
+    # actually have rows. Returns the folder, or None when nothing changed.
+    def saveDelta(self, delta):
+        if not delta.changedCount:
+            return None
+        directory = os.path.join(self.settingsManager.getBaseDir(), f"Listing Updates {time.strftime('%Y-%m-%d %H%M%S')}")
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if delta.priceChanges:
+                self.writeRows(os.path.join(directory, 'Price Changes.csv'), ['TITLE', 'URL', 'OLD PRICE', 'PRICE', 'EBAY PRICE'],
+                               ([change.title, change.url, change.oldPrice, change.newPrice, change.ebayPrice] for change in delta.priceChanges))
+            if delta.lowStock:
+                self.writeRows(os.path.join(directory, 'Low Or Out Of Stock.csv'), ['TITLE', 'URL'],
+                               ([change.title, change.url] for change in delta.lowStock))
+            if delta.backInStock:
+                self.writeRows(os.path.join(directory, 'Back In Stock.csv'), ['TITLE', 'URL'],
+                               ([change.title, change.url] for change in delta.backInStock))
+            print(f"Listing updates saved to {directory}.")
+            return directory
         except Exception as e:
-            logging.error(f"Error saving products to CSV: {e}", exc_info=True)
+            logging.error(f"Error saving listing updates to CSV: {e}", exc_info=True)
+
+    def writeRows(self, filePath, header, rows):
+        with open(filePath, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(rows)
 
     def writeProductToCsv(self, filePath, product):
-        fileExists = os.path.isfile(filePath)
-        with open(filePath, mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=self.fieldNames)
-            if not fileExists:
-                writer.writeheader()
-
-            # Start with default values from settings
-            row = {field: self.settings.get('csvHeaders', {}).get(field, '') for field in self.fieldNames}
-
-            # Update row with product data for title and price
-            row['TITLE'] = getattr(product, 'title', '')
-            row['PRICE'] = getattr(product, 'price', '')
-            writer.writerow(row)
+        self.writeProductsToCsv(filePath, [product])
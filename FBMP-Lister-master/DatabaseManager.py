@@ -1,35 +1,204 @@
 import sqlite3
+import threading
+import time
+
+import Utils
+from DatabaseMigrations import migrations
+from ItemKeyIndex import ItemKeyIndex
+from ListingDelta import ListingState
+
+# Default values
+defaultBatchSize = 100  # products per transaction on the buffered path
+defaultFlushInterval = 0.5  # seconds a buffered product can wait before it's written anyway
 
 class DatabaseManager:
-    def __init__(self, dbPath='products.db'):
+    def __init__(self, dbPath='products.db', batchSize=defaultBatchSize, flushInterval=defaultFlushInterval):
         self.dbPath = dbPath
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        # One connection for the life of the app instead of a connect (and fsync) per call. The scraper's
+        # parser threads share it, so every use goes through the lock.
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(self.dbPath, check_same_thread=False)
+        # WAL lets readers carry on while a write is committing, and NORMAL only syncs at checkpoints,
+        # which is safe in WAL mode (a crash can lose the last commits, never corrupt the file)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.pendingProducts = []
+        self.pendingRejections = []
+        self.lastFlush = time.monotonic()
+        self.lastFlushSeconds = 0.0
+        self.maxFlushSeconds = 0.0
         self.initializeDb()
+        self.knownItems = self.loadKnownItems()
 
+    # Brings the file up to the current schema by applying whichever migrations it hasn't had yet
     def initializeDb(self):
-        with sqlite3.connect(self.dbPath) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''CREATE TABLE IF NOT EXISTS products (
-                                id INTEGER PRIMARY KEY,
-                                url TEXT UNIQUE,
-                                title TEXT
-                              )''')
-
-    def addProduct(self, url, title):
+        with self.lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(migrations[version:], start=version + 1):
+                with self.conn:
+                    self.conn.execute("BEGIN")
+                    migration(self.conn)
+                    self.conn.execute(f"PRAGMA user_version = {number}")
+
+    def close(self):
+        with self.lock:
+            self.flushProducts()
+            self.conn.close()
+
+    # Everything in the products table, loaded once so lookups never have to query it.
+    # Straight from the item_id column, rows without one (non-eBay links) are keyed by their URL.
+    def loadKnownItems(self):
+        with self.lock:
+            return ItemKeyIndex(itemId if itemId is not None else url
+                                for itemId, url in self.conn.execute("SELECT item_id, url FROM products"))
+
+    def addProduct(self, url, title, price=None, available=None, fingerprint=None):
         try:
-            with sqlite3.connect(self.dbPath) as conn:
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO products (url, title) VALUES (?, ?)", (url, title))
+            with self.lock, self.conn:
+                self.conn.execute(insertProductSql, productRow(url, title, price, available, fingerprint, now=time.time()))
+            self.knownItems.addUrl(url)
         except sqlite3.IntegrityError:
             print(f"Product with URL {url} already exists.")
 
+    # Many (url, title, [price, available, fingerprint]) rows, one transaction. Products that are already stored,
+    # by URL or by item ID, are skipped. Returns how many were added.
+    def addProducts(self, products):
+        now = time.time()
+        rows = [productRow(*product, now=now) for product in products]
+        with self.lock, self.conn:
+            changesBefore = self.conn.total_changes
+            self.conn.executemany(insertNewProductsSql, rows)
+            added = self.conn.total_changes - changesBefore
+        for product in products:
+            self.knownItems.addUrl(product[0])
+        return added
+
+    # Items we skipped because we already had them were still on the store, so move their last_seen forward
+    def touchItems(self, itemIds):
+        with self.lock, self.conn:
+            now = time.time()
+            self.conn.executemany("UPDATE products SET last_seen=? WHERE item_id=?", ((now, itemId) for itemId in itemIds))
+
+    # What every stored item looked like when we last saw it, item ID -> ListingState, for a re-scrape to compare against
+    def getListingStates(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT item_id, last_price, last_available, fingerprint FROM products "
+                                     "WHERE item_id IS NOT NULL").fetchall()
+        return {itemId: ListingState(price, None if available is None else bool(available), fingerprint)
+                for itemId, price, available, fingerprint in rows}
+
+    # (price, available, fingerprint, itemId) rows from a re-scrape (ListingDelta.observations), one transaction
+    def updateListings(self, observations):
+        with self.lock, self.conn:
+            now = time.time()
+            self.conn.executemany(updateListingSql, ((price, None if available is None else int(available), fingerprint, now, itemId)
+                                                     for price, available, fingerprint, itemId in observations))
+
+    # Buffered version of addProduct for the scraper: rows are written together once batchSize of them
+    # are waiting or the oldest has waited flushInterval, whichever comes first. Call flushProducts at the end.
+    def bufferProduct(self, url, title, price=None, available=None, fingerprint=None):
+        with self.lock:
+            self.pendingProducts.append((url, title, price, available, fingerprint))
+            self.knownItems.addUrl(url)
+            if len(self.pendingProducts) >= self.batchSize or time.monotonic() - self.lastFlush >= self.flushInterval:
+                self.flushProducts()
+
+    # Same as bufferProduct for an item the filters turned down, written with the next batch of products
+    def bufferRejectedItem(self, url, filterKey):
+        with self.lock:
+            self.pendingRejections.append((url, filterKey))
+            if len(self.pendingRejections) >= self.batchSize:
+                self.flushProducts()
+
+    def flushProducts(self):
+        with self.lock:
+            if self.pendingProducts or self.pendingRejections:
+                start = time.perf_counter()
+                self.addProducts(self.pendingProducts)
+                self.pendingProducts = []
+                self.addRejectedItems(self.pendingRejections)
+                self.pendingRejections = []
+                self.lastFlushSeconds = time.perf_counter() - start
+                self.maxFlushSeconds = max(self.maxFlushSeconds, self.lastFlushSeconds)
+            self.lastFlush = time.monotonic()
+
+    # (url, filterKey) rows for items a ProductFilter turned down, one transaction. A newer rejection replaces
+    # the old one. Links without an item ID (non-eBay) aren't kept.
+    def addRejectedItems(self, rejections):
+        now = time.time()
+        rows = [(itemId, filterKey, now) for itemId, filterKey in ((Utils.getItemId(url), filterKey) for url, filterKey in rejections)
+                if itemId is not None]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO rejected_items (item_id, filter, rejected) VALUES (?, ?, ?)", rows)
+
+    # Forgets what each filter (name -> its key now) turned down under other settings, so a changed setting
+    # gives those items another look right away instead of once rejectedItemTtl runs out
+    def clearStaleRejections(self, currentKeys):
+        with self.lock, self.conn:
+            for name, key in currentKeys.items():
+                self.conn.execute("DELETE FROM rejected_items WHERE (filter = ? OR filter LIKE ?) AND filter != ?",
+                                  (name, f"{name} %", key))
+
+    # Item IDs rejected by one of filterKeys at or after `since` (unix time), for the crawler to skip
+    def getRejectedItemIds(self, filterKeys, since=0):
+        filterKeys = list(filterKeys)
+        if not filterKeys:
+            return ItemKeyIndex()
+        with self.lock:
+            rows = self.conn.execute(f"SELECT item_id FROM rejected_items WHERE rejected >= ? AND filter IN "
+                                     f"({', '.join('?' * len(filterKeys))})", (since, *filterKeys)).fetchall()
+        return ItemKeyIndex(itemId for itemId, in rows)
+
+    # Answered from memory. The url column is unique, so the url (or rather the item it points at) is what
+    # decides whether we have a product; the title is kept in the signature for existing callers.
     def productAlreadyExistsInDatabase(self, url, title):
-        conn = sqlite3.connect(self.dbPath)
-        c = conn.cursor()
-        c.execute("SELECT 1 FROM products WHERE url=? AND title=?", (url, title))
-        if c.fetchone() is None:
-            conn.close()
-            return False
-        else:
+        if self.knownItems.containsUrl(url):
             print("Product found in database")
-            conn.close()
             return True
+        return False
+
+    # (itemId, url, price, available, fingerprint, checkInterval, nextCheck) for every item the price monitor watches
+    def getMonitoredItems(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT item_id, url, last_price, last_available, fingerprint, check_interval, next_check "
+                                     "FROM products WHERE item_id IS NOT NULL").fetchall()
+        return [(itemId, url, price, None if available is None else bool(available), fingerprint, interval, nextCheck)
+                for itemId, url, price, available, fingerprint, interval, nextCheck in rows]
+
+    # (checkInterval, nextCheck, itemId) rows from the price monitor
+    def updateSchedule(self, schedule):
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE products SET check_interval=?, next_check=? WHERE item_id=?", schedule)
+
+    # Reserves count consecutive batch numbers that were never handed out before and returns the first.
+    # firstFree is the lowest one allowed (for batch folders older than the batches table). BEGIN IMMEDIATE
+    # takes the write lock before reading the last number, so two apps on the same file can't get the same batch.
+    def allocateBatches(self, count, directory, firstFree=1):
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            lastBatch = self.conn.execute("SELECT max(number) FROM batches").fetchone()[0]
+            firstBatch = max(firstFree, (lastBatch or 0) + 1)
+            now = time.time()
+            self.conn.executemany("INSERT INTO batches (number, allocated, directory) VALUES (?, ?, ?)",
+                                  ((firstBatch + offset, now, directory) for offset in range(count)))
+        return firstBatch
+
+    def lastAllocatedBatch(self):
+        with self.lock:
+            return self.conn.execute("SELECT max(number) FROM batches").fetchone()[0]
+
+    # Item IDs (and other product URLs) of everything scraped on previous runs or queued in this one.
+    # This is the live index, so store links can be checked against it without copying it.
+    def getKnownItemIds(self):
+        return self.knownItems
+
+
+productColumns = "url, title, item_id, first_seen, last_seen, last_price, last_available, fingerprint"
+insertProductSql = f"INSERT INTO products ({productColumns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+insertNewProductsSql = f"INSERT OR IGNORE INTO products ({productColumns}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+updateListingSql = "UPDATE products SET last_price=?, last_available=?, fingerprint=?, last_seen=? WHERE item_id=?"
+
+def productRow(url, title, price=None, available=None, fingerprint=None, now=None):
+    return url, title, Utils.getItemId(url), now, now, price, None if available is None else int(available), fingerprint
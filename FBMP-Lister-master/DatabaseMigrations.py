@@ -0,0 +1,78 @@
+import Utils
+
+# Schema changes for products.db, oldest first. A database's PRAGMA user_version is the number of migrations
+# already applied to it, and DatabaseManager.initializeDb runs the rest in order, each in its own transaction.
+# To change the schema, append a new function to the list. Never edit or reorder one that has shipped.
+
+
+def createProductsTable(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS products (
+                        id INTEGER PRIMARY KEY,
+                        url TEXT UNIQUE,
+                        title TEXT
+                      )''')
+
+
+# The same listing reached through different tracking parameters used to be stored once per URL.
+# Rows get their canonical eBay item ID; when an item is already in the table more than once, only the
+# oldest row keeps the ID so the unique index can go on.
+def addItemIds(conn):
+    conn.execute("ALTER TABLE products ADD COLUMN item_id INTEGER")
+    seenItemIds = set()
+    updates = []
+    for rowId, url in conn.execute("SELECT id, url FROM products ORDER BY id").fetchall():
+        itemId = Utils.getItemId(url)
+        if itemId is not None and itemId not in seenItemIds:
+            seenItemIds.add(itemId)
+            updates.append((itemId, rowId))
+    conn.executemany("UPDATE products SET item_id=? WHERE id=?", updates)
+    conn.execute("CREATE UNIQUE INDEX products_item_id ON products (item_id)")
+
+
+# When we first and last saw each item (unix time) and the eBay price it had then
+def addScrapeHistory(conn):
+    conn.execute("ALTER TABLE products ADD COLUMN first_seen REAL")
+    conn.execute("ALTER TABLE products ADD COLUMN last_seen REAL")
+    conn.execute("ALTER TABLE products ADD COLUMN last_price REAL")
+
+
+# Whether the item was available when last seen (1/0) and the fingerprint of its page, for re-scrapes
+def addListingState(conn):
+    conn.execute("ALTER TABLE products ADD COLUMN last_available INTEGER")
+    conn.execute("ALTER TABLE products ADD COLUMN fingerprint TEXT")
+
+
+# When the price monitor should look at each item next, and how long it's currently waiting between checks
+def addCheckSchedule(conn):
+    conn.execute("ALTER TABLE products ADD COLUMN check_interval REAL")
+    conn.execute("ALTER TABLE products ADD COLUMN next_check REAL")
+
+
+# Batch numbers handed out by BatchAllocator, and which base directory each went to
+def addBatches(conn):
+    conn.execute('''CREATE TABLE batches (
+                        number INTEGER PRIMARY KEY,
+                        allocated REAL,
+                        directory TEXT
+                      )''')
+
+
+# Items a ProductFilter turned down and which filter it was (its key), so later runs can skip them
+# without fetching their page again
+def addRejectedItems(conn):
+    conn.execute('''CREATE TABLE rejected_items (
+                        item_id INTEGER PRIMARY KEY,
+                        filter TEXT,
+                        rejected REAL
+                      )''')
+
+
+migrations = [
+    createProductsTable,
+    addItemIds,
+    addScrapeHistory,
+    addListingState,
+    addCheckSchedule,
+    addBatches,
+    addRejectedItems,
+]
@@ -0,0 +1,93 @@
+import atexit
+import queue
+import threading
+from collections import namedtuple
+
+RejectedItem = namedtuple('RejectedItem', ['url', 'filterKey'])
+
+
+# The only thread that writes scraped products to the database. Scraper workers hand their "seen" records
+# to markSeen (and the items the filters turned down to markRejected) and go straight back to fetching; this thread groups them into transactions through the
+# DatabaseManager's buffered path (batchSize rows or flushInterval seconds per commit).
+# flush() waits until everything queued so far is committed, close() does the same and stops the thread.
+# close() also runs at interpreter exit, so a clean exit never drops queued records.
+class DatabaseWriter:
+    stopMarker = object()
+
+    def __init__(self, dbManager):
+        self.dbManager = dbManager
+        self.queue = queue.Queue()
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="DatabaseWriter", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def markSeen(self, url, title, price=None, available=None, fingerprint=None):
+        if self.closed:
+            raise RuntimeError("DatabaseWriter is closed")
+        self.dbManager.knownItems.addUrl(url)  # known right away, even before the writer gets to it
+        self.queue.put((url, title, price, available, fingerprint))
+
+    def markRejected(self, url, filterKey):
+        if self.closed:
+            raise RuntimeError("DatabaseWriter is closed")
+        self.queue.put(RejectedItem(url, filterKey))
+
+    @property
+    def queueDepth(self):
+        return self.queue.qsize()
+
+    # seconds the most recent / slowest commit took
+    @property
+    def lastFlushLatency(self):
+        return self.dbManager.lastFlushSeconds
+
+    @property
+    def maxFlushLatency(self):
+        return self.dbManager.maxFlushSeconds
+
+    def flush(self):
+        if self.closed:
+            return
+        flushed = threading.Event()
+        self.queue.put(flushed)
+        flushed.wait()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(self.stopMarker)
+        self.thread.join()
+        atexit.unregister(self.close)
+
+    def run(self):
+        while True:
+            try:
+                record = self.queue.get(timeout=self.dbManager.flushInterval)
+            except queue.Empty:
+                # nothing new for a while, commit whatever is still waiting
+                self.flushPending()
+                continue
+
+            if record is self.stopMarker:
+                self.flushPending()
+                return
+            if isinstance(record, threading.Event):
+                self.flushPending()
+                record.set()
+                continue
+            try:
+                if isinstance(record, RejectedItem):
+                    self.dbManager.bufferRejectedItem(*record)
+                else:
+                    self.dbManager.bufferProduct(*record)
+            except Exception as e:
+                print(f"Error writing products to the database: {e}")
+
+    # A failed commit leaves the rows buffered in the DatabaseManager, so they're retried on the next flush
+    def flushPending(self):
+        try:
+            self.dbManager.flushProducts()
+        except Exception as e:
+            print(f"Error writing products to the database: {e}")
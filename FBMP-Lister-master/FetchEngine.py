@@ -0,0 +1,147 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from RateLimiter import throttleStatuses
+
+# Default values
+defaultMaxConcurrency = 100  # total requests in flight across every host
+defaultMaxPerHost = 25  # requests in flight against a single host
+defaultTimeout = 10
+defaultRetries = 5
+defaultBackoffFactor = 1
+defaultRetryStatuses = (429, 500, 502, 503, 504)
+
+
+# Same retry policy as the old requests session (5 retries, exponential backoff on 5xx),
+# but everything runs on one event loop so we aren't paying a thread per request in flight.
+# With an HttpCache, fetch() revalidates what it has with conditional GETs (see HttpCache).
+# With a RateLimiter, every attempt waits for its host's turn and reports back how the host answered;
+# engines that share a limiter share each host's budget.
+class FetchEngine:
+    def __init__(self, maxConcurrency=defaultMaxConcurrency, maxPerHost=defaultMaxPerHost, timeout=defaultTimeout,
+                 retries=defaultRetries, backoffFactor=defaultBackoffFactor, retryStatuses=defaultRetryStatuses,
+                 rateLimiter=None):
+        self.rateLimiter = rateLimiter
+        self.maxConcurrency = maxConcurrency
+        self.maxPerHost = maxPerHost
+        self.timeout = timeout
+        self.retries = retries
+        self.backoffFactor = backoffFactor
+        self.retryStatuses = set(retryStatuses)
+
+    # aiohttp sessions are tied to the loop they were created on, so every run opens its own client.
+    # The HttpCache (if any) is the run's too, the caller opens and closes it.
+    @asynccontextmanager
+    async def connect(self, cache=None):
+        connector = aiohttp.TCPConnector(limit=self.maxConcurrency, limit_per_host=self.maxPerHost)
+        # like the requests timeout this bounds connecting and each read, not the whole (possibly large) body
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            yield FetchClient(self, session, cache)
+
+    # Convenience for callers that aren't async themselves (a single product page, a one-off check).
+    def fetchOne(self, url, ttl=None, cache=None):
+        async def fetch():
+            async with self.connect(cache) as client:
+                return await client.fetch(url, ttl)
+        return asyncio.run(fetch())
+
+
+class FetchClient:
+    def __init__(self, engine, session, cache=None):
+        self.engine = engine
+        self.session = session
+        self.cache = cache
+
+    # ttl: seconds a cached copy can be used without asking the server. Without it (or a cache) the page
+    # always comes from the server, though a conditional GET means an unchanged one costs a 304.
+    # A body evicted by another thread between lookup and read is just a miss.
+    async def fetch(self, url, ttl=None):
+        cache = self.cache
+        if cache is None:
+            return await self.request(url, readBody)
+
+        entry = cache.lookup(url)
+        if entry is not None and cache.isFresh(entry, ttl):
+            body = cache.read(entry)
+            if body is not None:
+                cache.count('hits')
+                return body
+            entry = None
+
+        async def readAndStore(response):
+            body = await response.read()
+            cache.count('misses')
+            cache.store(url, body, response.headers)
+            return body
+
+        async def readOrRevalidate(response):
+            if response.status != 304 or entry is None:
+                return await readAndStore(response)
+            body = cache.read(entry)
+            if body is not None:
+                cache.count('revalidated')
+                cache.refresh(url)
+            return body
+
+        body = await self.request(url, readOrRevalidate, cache.conditionalHeaders(entry))
+        if body is None:
+            # unchanged, but evicted while we were asking: the server has to send the whole page after all
+            body = await self.request(url, readAndStore)
+        return body
+
+    # Streams the body to disk chunk by chunk instead of holding it in memory. It lands under a temporary
+    # name first so a failed or retried download never leaves a truncated file behind. Returns bytes written.
+    async def download(self, url, filePath, chunkSize):
+        async def saveBody(response):
+            partPath = filePath + '.part'
+            written = 0
+            try:
+                with open(partPath, 'wb') as file:
+                    async for chunk in response.content.iter_chunked(chunkSize):
+                        file.write(chunk)
+                        written += len(chunk)
+                os.replace(partPath, filePath)
+            except BaseException:
+                # also when the run is cancelled halfway through a body
+                if os.path.exists(partPath):
+                    os.remove(partPath)
+                raise
+            return written
+        return await self.request(url, saveBody)
+
+    async def request(self, url, handleResponse, headers=None):
+        rateLimiter = self.engine.rateLimiter
+        attempt = 0
+        while True:
+            if rateLimiter is not None:
+                await rateLimiter.acquire(url)
+            try:
+                async with self.session.get(url, headers=headers) as response:
+                    if rateLimiter is not None:
+                        rateLimiter.record(url, response.status, response.headers.get('Retry-After'))
+                    if response.status in self.engine.retryStatuses and attempt < self.engine.retries:
+                        raise RetryableStatus(response.status)
+                    response.raise_for_status()
+                    return await handleResponse(response)
+            except (RetryableStatus, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                if attempt >= self.engine.retries:
+                    raise
+                # the rate limiter already slowed the host down (and knows its Retry-After), no need to wait twice
+                paced = rateLimiter is not None and isinstance(e, RetryableStatus) and e.status in throttleStatuses
+            if not paced:
+                await asyncio.sleep(self.engine.backoffFactor * (2 ** attempt))
+            attempt += 1
+
+
+async def readBody(response):
+    return await response.read()
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status):
+        super().__init__(f"Retryable status {status}")
+        self.status = status
@@ -0,0 +1,326 @@
+import argparse
+import gzip
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import ProductParser
+import Utils
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional, gzip is always there
+    zstandard = None
+
+# Default values
+defaultMaxBytes = 1024 ** 3
+defaultSegmentBytes = 64 * 1024 ** 2
+defaultCompression = 'gzip'
+defaultCommitEvery = 200
+defaultAbandonedSeconds = 24 * 3600  # a segment still marked as being written after this was left by a crash
+defaultReparseChunk = 200  # records per reparse task
+
+
+def gzipCompress(content):
+    return gzip.compress(content, compresslevel=6)
+
+
+def zstdCompress(content):
+    return zstandard.ZstdCompressor(level=10).compress(content)
+
+
+def zstdDecompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+# codec -> (segment file extension, compress, decompress). Every record is its own gzip member / zstd frame,
+# so a record can be read on its own from its offset, and `zcat segment.gz` still gives back every page.
+codecs = {
+    'gzip': ('.gz', gzipCompress, gzip.decompress),
+    'zstd': ('.zst', zstdCompress, zstdDecompress),
+}
+warnedCodecs = set()
+
+
+def availableCodecs():
+    return [name for name in codecs if name != 'zstd' or zstandard is not None]
+
+
+# Asked for a codec we can't use: gzip, said once per process rather than every time an archive is opened
+def getCodec(name):
+    if name not in availableCodecs():
+        if name not in warnedCodecs:
+            warnedCodecs.add(name)
+            print(f"Compression '{name}' is not available, falling back to gzip")
+        return 'gzip'
+    return name
+
+
+# Every item page we fetched, exactly as eBay sent it, so when a selector breaks or we want a new field the
+# pages can be parsed again without going back to eBay. Pages are compressed one by one and appended to
+# segment files; index.db says where each one is, by item ID and fetch time. Segments are never rewritten:
+# once the archive is past maxBytes the oldest segments are deleted whole, with their index rows.
+# Parser threads call store() concurrently. Several archives can be open on the same folder (a single item
+# scraped during a store run, parallel runs): each one writes to segments of its own, which stay marked as
+# being written until it closes them so nobody evicts them, and the index is only written in short
+# transactions, so no archive ever waits on another's.
+class HtmlArchive:
+    def __init__(self, archiveDir, maxBytes=defaultMaxBytes, compression=defaultCompression,
+                 segmentBytes=defaultSegmentBytes):
+        self.archiveDir = archiveDir
+        self.maxBytes = maxBytes
+        self.segmentBytes = segmentBytes
+        self.codec = getCodec(compression)
+        self.lock = threading.Lock()
+        self.stored = 0
+        self.storedBytes = 0  # before compression
+        self.pending = []  # index rows for pages already in the segment, written every defaultCommitEvery pages
+        os.makedirs(self.archiveDir, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.archiveDir, 'index.db'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS segments (
+                                number INTEGER PRIMARY KEY,
+                                codec TEXT,
+                                size INTEGER,
+                                writing REAL
+                              )''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS pages (
+                                id INTEGER PRIMARY KEY,
+                                item_id INTEGER,
+                                url TEXT,
+                                fetched REAL,
+                                segment INTEGER,
+                                offset INTEGER,
+                                size INTEGER
+                              )''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_item ON pages (item_id, fetched)")
+        self.conn.commit()
+        self.segment = None
+        self.segmentFile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.closeSegment()
+            self.evict()
+            self.conn.close()
+
+    def segmentPath(self, number, codec):
+        return os.path.join(self.archiveDir, f"segment-{number:06d}{codecs[codec][0]}")
+
+    # A new segment for this archive alone; its number comes from SQLite, so two archives never get the same one
+    def openSegment(self):
+        with self.conn:
+            number = self.conn.execute("INSERT INTO segments (codec, size, writing) VALUES (?, 0, ?)",
+                                       (self.codec, time.time())).lastrowid
+        self.segment = [number, 0]
+        self.segmentFile = open(self.segmentPath(number, self.codec), 'ab')
+
+    def closeSegment(self):
+        if self.segmentFile is not None:
+            self.segmentFile.close()
+            self.flushIndex(closing=True)
+            self.segmentFile = None
+            self.segment = None
+
+    # One short transaction for the pages stored since the last one. A crash before it only loses their index
+    # rows; the bytes stay in the segment, unreferenced.
+    def flushIndex(self, closing=False):
+        if self.segment is None:
+            return
+        number, size = self.segment
+        with self.conn:
+            self.conn.executemany("INSERT INTO pages (item_id, url, fetched, segment, offset, size) VALUES (?, ?, ?, ?, ?, ?)",
+                                  self.pending)
+            self.conn.execute("UPDATE segments SET size=?, writing=? WHERE number=?",
+                              (size, None if closing else time.time(), number))
+        self.pending = []
+
+    def store(self, url, content, fetched=None):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        data = codecs[self.codec][1](content)
+        with self.lock:
+            if self.segmentFile is None:
+                self.openSegment()
+            number, offset = self.segment
+            self.segmentFile.write(data)
+            # on disk before the index points at it
+            self.segmentFile.flush()
+            self.segment[1] += len(data)
+            self.pending.append((Utils.getItemId(url), url, fetched if fetched is not None else time.time(),
+                                 number, offset, len(data)))
+            self.stored += 1
+            self.storedBytes += len(content)
+            if self.segment[1] >= self.segmentBytes:
+                self.closeSegment()
+                self.evict()
+            elif len(self.pending) >= defaultCommitEvery:
+                self.flushIndex()
+
+    def read(self, segment, codec, offset, size):
+        with open(self.segmentPath(segment, codec), 'rb') as file:
+            file.seek(offset)
+            return codecs[codec][2](file.read(size))
+
+    # The newest copy of an item's page, or None
+    def get(self, itemId):
+        with self.lock:
+            self.flushIndex()
+            row = self.conn.execute('''SELECT pages.segment, segments.codec, pages.offset, pages.size FROM pages
+                                       JOIN segments ON segments.number = pages.segment
+                                       WHERE item_id=? ORDER BY fetched DESC LIMIT 1''', (itemId,)).fetchone()
+        return self.read(*row) if row else None
+
+    # (fetched, url) for every stored copy of an item, oldest first
+    def history(self, itemId):
+        with self.lock:
+            self.flushIndex()
+            return self.conn.execute("SELECT fetched, url FROM pages WHERE item_id=? ORDER BY fetched", (itemId,)).fetchall()
+
+    # (segmentPath, codec, [(itemId, url, fetched, offset, size)]) for everything in the archive, in
+    # segment order; latestOnly keeps only the newest copy of every item
+    def records(self, latestOnly=False):
+        with self.lock:
+            self.flushIndex()
+            query = '''SELECT pages.segment, segments.codec, item_id, url, fetched, offset, pages.size FROM pages
+                       JOIN segments ON segments.number = pages.segment'''
+            if latestOnly:
+                # pages that aren't items (no item ID) are all kept
+                query += ''' WHERE item_id IS NULL OR pages.id = (SELECT id FROM pages AS newest
+                                                           WHERE newest.item_id = pages.item_id
+                                                           ORDER BY fetched DESC LIMIT 1)'''
+            rows = self.conn.execute(query + " ORDER BY pages.segment, offset").fetchall()
+        segments = {}
+        for segment, codec, itemId, url, fetched, offset, size in rows:
+            segments.setdefault((segment, codec), []).append((itemId, url, fetched, offset, size))
+        return [(self.segmentPath(segment, codec), codec, entries) for (segment, codec), entries in segments.items()]
+
+    def totalBytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM segments").fetchone()[0]
+
+    def __len__(self):
+        with self.lock:
+            self.flushIndex()
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    # Oldest segments first. The newest segment is never evicted, even if it alone is over the cap, and neither
+    # is one another archive is still writing to (unless it has been at it for so long that it must have crashed).
+    def evict(self):
+        excess = self.totalBytes() - self.maxBytes
+        if excess <= 0:
+            return
+        evicted = []
+        for number, codec, size, writing in self.conn.execute("SELECT number, codec, size, writing FROM segments "
+                                                              "ORDER BY number").fetchall()[:-1]:
+            if excess <= 0:
+                break
+            if writing is not None and time.time() - writing < defaultAbandonedSeconds:
+                continue
+            evicted.append((number, codec))
+            excess -= size
+        for number, codec in evicted:
+            try:
+                os.remove(self.segmentPath(number, codec))
+            except FileNotFoundError:
+                pass
+        with self.conn:
+            self.conn.executemany("DELETE FROM pages WHERE segment=?", [(number,) for number, _ in evicted])
+            self.conn.executemany("DELETE FROM segments WHERE number=?", [(number,) for number, _ in evicted])
+        if evicted:
+            print(f"Evicted {len(evicted)} segments from the HTML archive")
+
+
+# Runs in a worker process: parses one run of records from a segment. Only the records' offsets go
+# through the process pool, every worker reads the pages from disk itself.
+def parseRecords(segmentPath, codec, entries, parserName):
+    parser = ProductParser.getParser(parserName)
+    decompress = codecs[codec][2]
+    results = []
+    with open(segmentPath, 'rb') as file:
+        for itemId, url, fetched, offset, size in entries:
+            file.seek(offset)
+            try:
+                details = parser.parse(decompress(file.read(size)))
+            except Exception as e:
+                print(f"Error parsing archived page for {url}: {e}")
+                details = None
+            results.append((itemId, url, fetched, details))
+    return results
+
+
+class ReparseStats:
+    def __init__(self):
+        self.pages = 0
+        self.failed = 0
+        self.missingTitle = 0
+        self.missingPrice = 0
+        self.missingImages = 0
+        self.elapsed = 0.0
+
+    @property
+    def pagesPerSecond(self):
+        return self.pages / self.elapsed if self.elapsed else 0.0
+
+    def add(self, details):
+        self.pages += 1
+        if details is None:
+            self.failed += 1
+            return
+        self.missingTitle += not details.title
+        self.missingPrice += details.price is None
+        self.missingImages += not details.images
+
+    # A selector that broke shows up as a lot of pages missing the same field
+    def report(self):
+        return (f"Reparsed {self.pages} pages in {self.elapsed:.1f}s ({self.pagesPerSecond:.1f} pages/sec): "
+                f"{self.failed} failed, {self.missingTitle} without a title, {self.missingPrice} without a price, "
+                f"{self.missingImages} without images")
+
+
+# Runs the current parser over the archived pages on every core, no network. onResult gets
+# (itemId, url, fetched, ProductDetails or None) for every page, in no particular order.
+def reparse(archive, parserName=ProductParser.StructuredDataParser.name, workers=None, latestOnly=True,
+            onResult=None, chunkSize=defaultReparseChunk):
+    stats = ReparseStats()
+    start = time.perf_counter()
+    tasks = [(segmentPath, codec, entries[index:index + chunkSize])
+             for segmentPath, codec, entries in archive.records(latestOnly)
+             for index in range(0, len(entries), chunkSize)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(parseRecords, segmentPath, codec, entries, parserName)
+                   for segmentPath, codec, entries in tasks]
+        for future in futures:
+            for result in future.result():
+                stats.add(result[3])
+                if onResult is not None:
+                    onResult(*result)
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Parse archived eBay item pages again, without fetching them")
+    argParser.add_argument('archiveDir', help="the HTML Archive folder")
+    argParser.add_argument('--parser', default=ProductParser.StructuredDataParser.name, choices=ProductParser.availableParsers())
+    argParser.add_argument('--workers', type=int, default=None, help="worker processes, defaults to one per core")
+    argParser.add_argument('--all-copies', action='store_true', help="parse every stored copy, not just each item's newest")
+    args = argParser.parse_args()
+
+    # only reading: every segment says which codec it was written with
+    with HtmlArchive(args.archiveDir, maxBytes=float('inf'), compression='gzip') as archive:
+        print(f"{len(archive)} pages, {archive.totalBytes() / 1024 ** 2:.1f}MB compressed")
+        stats = reparse(archive, args.parser, args.workers, latestOnly=not args.all_copies)
+    print(stats.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+# Default values
+defaultMaxBytes = 512 * 1024 ** 2
+
+CachedResponse = namedtuple('CachedResponse', ['url', 'etag', 'lastModified', 'stored', 'size'])
+
+
+class CacheStats:
+    def __init__(self, hits=0, revalidated=0, misses=0):
+        self.hits = hits  # served within the TTL, no request at all
+        self.revalidated = revalidated  # conditional GET answered with 304, no body
+        self.misses = misses  # full download, new or changed
+
+    def __repr__(self):
+        return f"CacheStats(hits={self.hits}, revalidated={self.revalidated}, misses={self.misses})"
+
+
+# Page bodies we've downloaded, with the ETag / Last-Modified they came with, so the next request for the
+# same URL can be conditional (If-None-Match / If-Modified-Since) and cost a 304 instead of the whole page.
+# Callers that can live with slightly old content pass a TTL to FetchClient.fetch and get the stored body
+# back without any request while it's fresh. Bodies are files named after the URL's hash, index.db keeps the
+# rest. Least recently used entries are evicted once the cache grows past maxBytes.
+# A cache is opened for a run and shared by every thread and event loop in it, hence the lock.
+class HttpCache:
+    def __init__(self, cacheDir, maxBytes=defaultMaxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.stats = CacheStats()
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(self.cacheDir, 'tmp'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.cacheDir, 'index.db'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                url TEXT PRIMARY KEY,
+                                etag TEXT,
+                                lastModified TEXT,
+                                stored REAL,
+                                lastUsed REAL,
+                                size INTEGER
+                              )''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_lastUsed ON responses (lastUsed)")
+        self.conn.commit()
+        self.totalSize = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def bodyPath(self, url):
+        urlHash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cacheDir, urlHash[:2], urlHash)
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.conn.execute("SELECT url, etag, lastModified, stored, size FROM responses WHERE url=?",
+                                    (url,)).fetchone()
+            if row is None or not os.path.exists(self.bodyPath(url)):
+                return None
+            self.conn.execute("UPDATE responses SET lastUsed=? WHERE url=?", (time.time(), url))
+            self.conn.commit()
+            return CachedResponse(*row)
+
+    def isFresh(self, entry, ttl):
+        return bool(ttl) and time.time() - entry.stored < ttl
+
+    # None if the body was evicted since the lookup
+    def read(self, entry):
+        try:
+            with open(self.bodyPath(entry.url), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    # outcome: 'hits', 'revalidated' or 'misses'
+    def count(self, outcome):
+        with self.lock:
+            setattr(self.stats, outcome, getattr(self.stats, outcome) + 1)
+
+    # The headers that turn the next GET for this entry into a conditional one
+    def conditionalHeaders(self, entry):
+        headers = {}
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry is not None and entry.lastModified:
+            headers['If-Modified-Since'] = entry.lastModified
+        return headers
+
+    # Anything that says no-store is left alone. Bodies land under a temporary name first,
+    # so a reader never sees half a page.
+    def store(self, url, body, headers):
+        if 'no-store' in headers.get('Cache-Control', ''):
+            return
+        bodyPath = self.bodyPath(url)
+        tempPath = os.path.join(self.cacheDir, 'tmp', uuid.uuid4().hex)
+        with open(tempPath, 'wb') as file:
+            file.write(body)
+        os.makedirs(os.path.dirname(bodyPath), exist_ok=True)
+        now = time.time()
+        with self.lock:
+            os.replace(tempPath, bodyPath)
+            previous = self.conn.execute("SELECT size FROM responses WHERE url=?", (url,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO responses (url, etag, lastModified, stored, lastUsed, size) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (url, headers.get('ETag'), headers.get('Last-Modified'), now, now, len(body)))
+            self.conn.commit()
+            self.totalSize += len(body) - (previous[0] if previous else 0)
+            if self.totalSize > self.maxBytes:
+                self.evict()
+
+    # After a 304: the stored body is good for another TTL
+    def refresh(self, url):
+        with self.lock:
+            self.conn.execute("UPDATE responses SET stored=? WHERE url=?", (time.time(), url))
+            self.conn.commit()
+
+    # Called with the lock held. Evicts down to 90% of maxBytes so we're not back here on the next store.
+    def evict(self):
+        excess = self.totalSize - self.maxBytes * 0.9
+        evicted = []
+        for url, size in self.conn.execute("SELECT url, size FROM responses ORDER BY lastUsed"):
+            if excess <= 0:
+                break
+            evicted.append(url)
+            excess -= size
+            self.totalSize -= size
+        for url in evicted:
+            try:
+                os.remove(self.bodyPath(url))
+            except FileNotFoundError:
+                pass
+        self.conn.executemany("DELETE FROM responses WHERE url=?", [(url,) for url in evicted])
+        self.conn.commit()
+        print(f"Evicted {len(evicted)} pages from the HTTP cache")
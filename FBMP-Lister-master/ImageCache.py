@@ -0,0 +1,121 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+
+# Default values
+defaultMaxBytes = 2 * 1024 ** 3
+
+
+# Keeps one copy of every image we've downloaded, keyed by the SHA-256 of its bytes, plus an index of which
+# URL resolved to which content. Product folders get a hardlink (or a copy where links aren't possible) so
+# re-scraping overlapping stores or re-running a batch doesn't download or store the same image again.
+# Least recently used images are evicted once the cache grows past maxBytes.
+class ImageCache:
+    def __init__(self, cacheDir, maxBytes=defaultMaxBytes):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(self.cacheDir, 'tmp'), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(self.cacheDir, 'index.db'))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS blobs (
+                                hash TEXT PRIMARY KEY,
+                                size INTEGER,
+                                lastUsed REAL
+                              )''')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS urls (
+                                url TEXT PRIMARY KEY,
+                                hash TEXT
+                              )''')
+        self.conn.execute("CREATE INDEX IF NOT EXISTS blobs_lastUsed ON blobs (lastUsed)")
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def close(self):
+        self.evict()
+        self.conn.close()
+
+    def blobPath(self, contentHash):
+        return os.path.join(self.cacheDir, contentHash[:2], contentHash)
+
+    # Somewhere to stream a download to before we know its hash. Same filesystem as the blobs so store() can rename.
+    def newTempPath(self):
+        return os.path.join(self.cacheDir, 'tmp', uuid.uuid4().hex)
+
+    # Returns the content hash for a URL we've already downloaded, or None if we need to fetch it
+    def lookup(self, url):
+        row = self.conn.execute("SELECT hash FROM urls WHERE url=?", (url,)).fetchone()
+        if row and os.path.exists(self.blobPath(row[0])):
+            self.hits += 1
+            self.conn.execute("UPDATE blobs SET lastUsed=? WHERE hash=?", (time.time(), row[0]))
+            self.conn.commit()
+            return row[0]
+        self.misses += 1
+        return None
+
+    # Moves a finished download into the cache. If the same bytes are already stored under another URL,
+    # the new file is dropped and the URL just points at the existing blob.
+    def store(self, url, tempPath):
+        contentHash = hashFile(tempPath)
+        blobPath = self.blobPath(contentHash)
+        if os.path.exists(blobPath):
+            os.remove(tempPath)
+        else:
+            os.makedirs(os.path.dirname(blobPath), exist_ok=True)
+            os.replace(tempPath, blobPath)
+        self.conn.execute("INSERT OR REPLACE INTO blobs (hash, size, lastUsed) VALUES (?, ?, ?)",
+                          (contentHash, os.path.getsize(blobPath), time.time()))
+        self.conn.execute("INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)", (url, contentHash))
+        self.conn.commit()
+        return contentHash
+
+    # Puts a cached image at filePath. Anything editing it later has to replace the file rather than
+    # write into it, otherwise the edit would leak into the cache through the hardlink.
+    def materialize(self, contentHash, filePath):
+        if os.path.exists(filePath):
+            os.remove(filePath)
+        try:
+            os.link(self.blobPath(contentHash), filePath)
+        except OSError:
+            shutil.copyfile(self.blobPath(contentHash), filePath)
+
+    def totalBytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self):
+        excess = self.totalBytes() - self.maxBytes
+        if excess <= 0:
+            return
+        evicted = []
+        for contentHash, size in self.conn.execute("SELECT hash, size FROM blobs ORDER BY lastUsed"):
+            if excess <= 0:
+                break
+            evicted.append(contentHash)
+            excess -= size
+        for contentHash in evicted:
+            try:
+                os.remove(self.blobPath(contentHash))
+            except FileNotFoundError:
+                pass
+        self.conn.executemany("DELETE FROM blobs WHERE hash=?", [(contentHash,) for contentHash in evicted])
+        self.conn.executemany("DELETE FROM urls WHERE hash=?", [(contentHash,) for contentHash in evicted])
+        self.conn.commit()
+        print(f"Evicted {len(evicted)} images from the image cache")
+
+
+def hashFile(filePath, chunkSize=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(filePath, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunkSize), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
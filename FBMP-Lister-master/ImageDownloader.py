@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+
+from FetchEngine import FetchEngine
+
+# Default values
+defaultMaxConcurrentDownloads = 32
+defaultMaxDownloadsPerHost = 16  # nearly every image comes from i.ebayimg.com, so this is the real limit
+defaultChunkSize = 64 * 1024
+
+
+class DownloadStats:
+    def __init__(self):
+        self.files = 0
+        self.failures = 0
+        self.bytes = 0
+        self.cacheHits = 0
+        self.existing = 0  # already in the product folder from an earlier run, not downloaded again
+        self.elapsed = 0.0
+
+    @property
+    def bytesPerSecond(self):
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (f"DownloadStats(files={self.files}, failures={self.failures}, bytes={self.bytes}, "
+                f"cacheHits={self.cacheHits}, existing={self.existing}, elapsed={self.elapsed:.2f}s, bytesPerSecond={self.bytesPerSecond:.0f})")
+
+
+# Downloads images over one pooled client: connections to the image CDN are reused, the number of
+# downloads in flight is capped overall and per host, and every body is streamed straight to disk.
+# With an ImageCache, anything downloaded before (or earlier in the same run) is linked from the cache instead.
+class ImageDownloader:
+    def __init__(self, maxConcurrency=defaultMaxConcurrentDownloads, maxPerHost=defaultMaxDownloadsPerHost,
+                 chunkSize=defaultChunkSize, rateLimiter=None):
+        self.fetchEngine = FetchEngine(maxConcurrency=maxConcurrency, maxPerHost=maxPerHost, rateLimiter=rateLimiter)
+        self.chunkSize = chunkSize
+
+    # downloads is a list of (url, filePath) pairs
+    def downloadAllSynchronously(self, downloads, imageCache=None):
+        return asyncio.run(self.downloadAll(downloads, imageCache))
+
+    async def downloadAll(self, downloads, imageCache=None):
+        stats = DownloadStats()
+        inFlight = {}  # url -> task fetching it into the cache, so a URL shared by products is downloaded once
+        start = time.perf_counter()
+        async with self.fetchEngine.connect() as client:
+            await asyncio.gather(*(self.download(client, url, filePath, stats, imageCache, inFlight)
+                                   for url, filePath in downloads))
+        stats.elapsed = time.perf_counter() - start
+        self.report(stats)
+        return stats
+
+    def report(self, stats):
+        print(f"Downloaded {stats.files} images ({stats.bytes / 1_000_000:.1f} MB) in {stats.elapsed:.1f}s, "
+              f"{stats.bytesPerSecond / 1_000_000:.2f} MB/s, {stats.cacheHits} from cache, {stats.existing} already there, "
+              f"{stats.failures} failed")
+
+    async def download(self, client, url, filePath, stats, imageCache=None, inFlight=None):
+        if os.path.exists(filePath):
+            stats.existing += 1
+            stats.files += 1
+            return
+        try:
+            if imageCache is None:
+                written = await client.download(url, filePath, self.chunkSize)
+                stats.bytes += written
+            else:
+                contentHash = imageCache.lookup(url)
+                if contentHash:
+                    stats.cacheHits += 1
+                else:
+                    if url not in inFlight:
+                        inFlight[url] = asyncio.ensure_future(self.downloadToCache(client, url, stats, imageCache))
+                    contentHash = await inFlight[url]
+                imageCache.materialize(contentHash, filePath)
+            stats.files += 1
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            stats.failures += 1
+            print(f"Error downloading image from {url}: {e}")
+
+    async def downloadToCache(self, client, url, stats, imageCache):
+        tempPath = imageCache.newTempPath()
+        written = await client.download(url, tempPath, self.chunkSize)
+        stats.bytes += written
+        return imageCache.store(url, tempPath)
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+# Default values
+defaultMaxDimension = 1600
+defaultQuality = 85
+
+
+class ProcessingStats:
+    def __init__(self):
+        self.files = 0
+        self.failures = 0
+        self.bytesBefore = 0
+        self.bytesAfter = 0
+        self.elapsed = 0.0
+
+    @property
+    def imagesPerSecond(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def reductionPercent(self):
+        return 100 * (1 - self.bytesAfter / self.bytesBefore) if self.bytesBefore else 0.0
+
+    def __repr__(self):
+        return (f"ProcessingStats(files={self.files}, failures={self.failures}, bytesBefore={self.bytesBefore}, "
+                f"bytesAfter={self.bytesAfter}, elapsed={self.elapsed:.2f}s)")
+
+
+# Shrinks downloaded images before they go to Marketplace: resized to fit maxDimension, recompressed,
+# and saved without EXIF. Every image is independent, so they're spread over a process pool to use every core.
+# processAll does a list of files in one go. Used as a context manager, the pool stays up and process()
+# takes a few files at a time from an event loop, so the ScrapePipeline can finish each product's images
+# as they arrive; the report comes when the context closes.
+class ImageProcessor:
+    def __init__(self, maxDimension=defaultMaxDimension, quality=defaultQuality, workers=None):
+        self.maxDimension = maxDimension
+        self.quality = quality
+        self.workers = workers or os.cpu_count()
+        self.executor = None
+        self.stats = None
+        self.start = None
+
+    def __enter__(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.stats = ProcessingStats()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.executor.shutdown()
+        self.executor = None
+        self.stats.elapsed = time.perf_counter() - self.start
+        self.report(self.stats)
+
+    async def process(self, filePaths):
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(loop.run_in_executor(self.executor, processImage, filePath,
+                                                              self.maxDimension, self.quality)
+                                         for filePath in filePaths))
+        for filePath, result in zip(filePaths, results):
+            self.count(self.stats, filePath, result)
+
+    def processAll(self, filePaths):
+        stats = ProcessingStats()
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(processImage, filePaths, [self.maxDimension] * len(filePaths),
+                                   [self.quality] * len(filePaths), chunksize=8)
+            for filePath, result in zip(filePaths, results):
+                self.count(stats, filePath, result)
+        stats.elapsed = time.perf_counter() - start
+        self.report(stats)
+        return stats
+
+    def count(self, stats, filePath, result):
+        bytesBefore, bytesAfter, error = result
+        if error:
+            stats.failures += 1
+            print(f"Error processing image {filePath}: {error}")
+            return
+        stats.files += 1
+        stats.bytesBefore += bytesBefore
+        stats.bytesAfter += bytesAfter
+
+    def report(self, stats):
+        print(f"Processed {stats.files} images in {stats.elapsed:.1f}s ({stats.imagesPerSecond:.1f} images/s), "
+              f"{stats.bytesBefore / 1_000_000:.1f} MB -> {stats.bytesAfter / 1_000_000:.1f} MB "
+              f"({stats.reductionPercent:.0f}% smaller), {stats.failures} failed")
+
+
+# Runs in the worker processes, so it has to stay a plain module-level function. Errors come back as
+# a value instead of an exception so one bad image doesn't take down the whole map.
+# The result goes to a temporary file that replaces the original, never an in-place write: product folders
+# are hardlinks into the image cache and writing through one would change the cached copy too.
+def processImage(filePath, maxDimension, quality):
+    try:
+        bytesBefore = os.path.getsize(filePath)
+        tempPath = filePath + '.tmp'
+        with Image.open(filePath) as original:
+            imageFormat = original.format
+            hadMetadata = bool(original.getexif()) or 'icc_profile' in original.info
+            image = ImageOps.exif_transpose(original)  # bake the rotation in since the EXIF orientation goes away
+            image.thumbnail((maxDimension, maxDimension))
+            if imageFormat == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(tempPath, format=imageFormat, quality=quality, optimize=True)
+
+        bytesAfter = os.path.getsize(tempPath)
+        # an already small image can come out bigger after recompressing, only keep that if we had metadata to strip
+        if bytesAfter < bytesBefore or hadMetadata:
+            os.replace(tempPath, filePath)
+        else:
+            os.remove(tempPath)
+            bytesAfter = bytesBefore
+        return bytesBefore, bytesAfter, None
+    except Exception as e:
+        return 0, 0, str(e)
@@ -0,0 +1,74 @@
+import heapq
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+import Utils
+
+# Default values
+defaultCompactThreshold = 50_000  # recent keys kept in a set before they're merged into the sorted array
+
+
+# Membership of every product we've already stored, so "have we seen this?" never touches the disk.
+# eBay item IDs sit in a sorted array of 64-bit ints (8 bytes a key, binary search to look up) plus a small
+# set of IDs added since the last merge. URLs without an item ID (non-eBay links) are kept as strings.
+# It's exact on purpose: a Bloom filter would be smaller still, but every false positive would be a new
+# product we silently never list.
+class ItemKeyIndex:
+    def __init__(self, keys=(), compactThreshold=defaultCompactThreshold):
+        self.compactThreshold = compactThreshold
+        self.lock = threading.Lock()
+        self.otherKeys = set()
+        itemIds = set()
+        for key in keys:
+            if isinstance(key, int):
+                itemIds.add(key)
+            else:
+                self.otherKeys.add(key)
+        self.sortedIds = array('q', sorted(itemIds))
+        self.recentIds = set()
+
+    def __contains__(self, key):
+        if isinstance(key, int):
+            if key in self.recentIds:
+                return True
+            sortedIds = self.sortedIds  # compact() swaps in a new array, readers keep using the one they started with
+            position = bisect_left(sortedIds, key)
+            return position < len(sortedIds) and sortedIds[position] == key
+        return key in self.otherKeys
+
+    def __len__(self):
+        return len(self.sortedIds) + len(self.recentIds) + len(self.otherKeys)
+
+    def add(self, key):
+        with self.lock:
+            if not isinstance(key, int):
+                self.otherKeys.add(key)
+            elif key not in self:
+                self.recentIds.add(key)
+                if len(self.recentIds) >= self.compactThreshold:
+                    self.compact()
+
+    def addUrl(self, url):
+        self.add(keyForUrl(url))
+
+    def containsUrl(self, url):
+        return keyForUrl(url) in self
+
+    # recentIds only ever holds IDs that aren't in sortedIds, so a straight merge keeps the array sorted and unique
+    def compact(self):
+        if self.recentIds:
+            self.sortedIds = array('q', heapq.merge(self.sortedIds, sorted(self.recentIds)))
+            self.recentIds = set()
+
+    def memoryBytes(self):
+        return (sys.getsizeof(self.sortedIds) + sys.getsizeof(self.recentIds) + sys.getsizeof(self.otherKeys)
+                + sum(sys.getsizeof(itemId) for itemId in self.recentIds)
+                + sum(sys.getsizeof(key) for key in self.otherKeys))
+
+
+# The item ID when the URL has one, so every tracking-parameter variant of a listing is the same key
+def keyForUrl(url):
+    itemId = Utils.getItemId(url)
+    return itemId if itemId is not None else url
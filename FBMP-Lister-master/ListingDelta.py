@@ -0,0 +1,72 @@
+import hashlib
+import threading
+from collections import namedtuple
+
+# What products.db remembers about an item from the last time it was scraped (price is the raw eBay price)
+ListingState = namedtuple('ListingState', ['price', 'available', 'fingerprint'])
+# oldPrice/newPrice are listing prices, both run through calculateFinalPrice with the current settings
+PriceChange = namedtuple('PriceChange', ['url', 'title', 'oldPrice', 'newPrice', 'ebayPrice'])
+# available is the "More than 10 available" flag, so lowStock covers items with only a few left as well as sold out ones
+StockChange = namedtuple('StockChange', ['url', 'title'])
+
+
+# Everything a page says that we'd act on, hashed. Same fingerprint means nothing we export has changed,
+# so unchanged items are settled with one string compare. Image URLs are the ones on the page, before
+# resizing, so changing the imageSize setting doesn't make every item look changed.
+def listingFingerprint(details):
+    parts = [details.title or '', repr(details.price), repr(details.available), repr(details.hasVariations)]
+    parts.extend(details.images)
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+# What a re-scrape found on items we'd already listed. Parser threads call observe() concurrently.
+# Every observed item ends up in observations, changed or not, so the database is brought up to date in
+# one go at the end of the run; only the items that changed are kept for the export.
+class ListingDelta:
+    def __init__(self, previousStates):
+        self.previousStates = previousStates  # item ID -> ListingState
+        self.lock = threading.Lock()
+        self.priceChanges = []
+        self.lowStock = []
+        self.backInStock = []
+        self.unchanged = 0
+        self.observations = []  # (price, available, fingerprint, itemId), the order DatabaseManager.updateListings wants
+
+    def isKnown(self, itemId):
+        return itemId in self.previousStates
+
+    # finalPrice turns an eBay price into our listing price (Scraper.calculateFinalPrice)
+    def observe(self, itemId, url, details, finalPrice):
+        previous = self.previousStates[itemId]
+        fingerprint = listingFingerprint(details)
+        with self.lock:
+            self.observations.append((details.price, details.available, fingerprint, itemId))
+            if previous.fingerprint == fingerprint:
+                self.unchanged += 1
+                return
+
+            changed = False
+            # rows stored before we tracked price/availability have nothing to compare with yet
+            if previous.price is not None and details.price is not None and details.price != previous.price:
+                self.priceChanges.append(PriceChange(url, details.title, finalPrice(previous.price),
+                                                     finalPrice(details.price), details.price))
+                changed = True
+            if not details.available and previous.available is True:
+                self.lowStock.append(StockChange(url, details.title))
+                changed = True
+            elif details.available and previous.available is False:
+                self.backInStock.append(StockChange(url, details.title))
+                changed = True
+            if not changed:
+                self.unchanged += 1  # e.g. a new photo or title tweak: stored, but nothing to re-export
+
+    @property
+    def changedCount(self):
+        return len(self.priceChanges) + len(self.lowStock) + len(self.backInStock)
+
+    def __len__(self):
+        return len(self.observations)
+
+    def __repr__(self):
+        return (f"ListingDelta(observed={len(self)}, priceChanges={len(self.priceChanges)}, "
+                f"lowStock={len(self.lowStock)}, backInStock={len(self.backInStock)}, unchanged={self.unchanged})")
@@ -0,0 +1,347 @@
+import argparse
+import heapq
+import os
+import random
+import statistics
+import time
+from bisect import bisect_right
+
+import ProductParser
+from ListingDelta import listingFingerprint
+
+# Default values
+defaultMonitorRequestsPerMinute = 30  # across every item, this is what we spend on eBay no matter how many we watch
+defaultMinCheckInterval = 15 * 60  # seconds, how often the most volatile items get checked at most
+defaultMaxCheckInterval = 24 * 3600  # and how long a stable item can go without a check
+defaultInitialCheckInterval = 6 * 3600
+defaultLowStockCheckInterval = 3600  # items with 10 or fewer left sell out fast, never wait longer than this on them
+defaultReloadInterval = 10 * 60  # how often the live monitor picks up products added to the database since it started
+maxIdleSleep = 60  # seconds, so the live monitor stays responsive while it waits on a far-off check
+
+backoffOnChange = 0.5  # a change halves an item's interval...
+backoffWhenStable = 1.5  # ...and every check that finds nothing new stretches it again
+
+
+# One listed item as the monitor knows it: what we last saw and when to look again
+class MonitoredItem:
+    __slots__ = ('itemId', 'url', 'price', 'available', 'fingerprint', 'interval', 'nextCheck')
+
+    def __init__(self, itemId, url, price=None, available=None, fingerprint=None, interval=None, nextCheck=None):
+        self.itemId = itemId
+        self.url = url
+        self.price = price
+        self.available = available
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.nextCheck = nextCheck
+
+    def __repr__(self):
+        return f"MonitoredItem(itemId={self.itemId}, price={self.price}, available={self.available}, interval={self.interval:.0f}s)"
+
+
+# Priority queue of items keyed by next-check time. Each item is in the heap exactly once: run() pops it,
+# checks it and record() pushes it back with an interval that shrinks while it keeps changing (or is low on
+# stock) and grows while it doesn't, between minInterval and maxInterval.
+class MonitorSchedule:
+    def __init__(self, minInterval=defaultMinCheckInterval, maxInterval=defaultMaxCheckInterval,
+                 initialInterval=defaultInitialCheckInterval, lowStockInterval=defaultLowStockCheckInterval):
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.initialInterval = initialInterval
+        self.lowStockInterval = lowStockInterval
+        self.items = {}
+        self.heap = []  # (nextCheck, itemId)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, itemId):
+        return itemId in self.items
+
+    # Items that were never checked (no nextCheck) are due right away, the request budget spreads them out
+    def add(self, item, now):
+        if item.interval is None:
+            item.interval = self.initialInterval
+        if item.nextCheck is None:
+            item.nextCheck = now
+        self.items[item.itemId] = item
+        heapq.heappush(self.heap, (item.nextCheck, item.itemId))
+
+    def nextCheckTime(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop(self):
+        _, itemId = heapq.heappop(self.heap)
+        return self.items[itemId]
+
+    # details is what the check found (ProductDetails), None when the page couldn't be fetched.
+    # Returns (priceChanged, stockChanged).
+    def record(self, item, details, now):
+        priceChanged = stockChanged = False
+        if details is not None:
+            priceChanged = item.price is not None and details.price is not None and details.price != item.price
+            stockChanged = item.available is not None and bool(details.available) != item.available
+            if details.price is not None:
+                item.price = details.price
+            item.available = bool(details.available)
+            item.fingerprint = listingFingerprint(details)
+            item.interval = self.nextInterval(item, priceChanged or stockChanged)
+        item.nextCheck = now + item.interval
+        heapq.heappush(self.heap, (item.nextCheck, item.itemId))
+        return priceChanged, stockChanged
+
+    def nextInterval(self, item, changed):
+        interval = item.interval * (backoffOnChange if changed else backoffWhenStable)
+        if item.available is False:
+            interval = min(interval, self.lowStockInterval)
+        return min(self.maxInterval, max(self.minInterval, interval))
+
+
+# The global requests-per-minute budget: checks are spaced at least 60/requestsPerMinute seconds apart,
+# however many items are due at once
+class RequestBudget:
+    def __init__(self, requestsPerMinute=defaultMonitorRequestsPerMinute):
+        self.spacing = 60.0 / requestsPerMinute
+        self.nextSlot = 0.0
+
+    def spend(self, now):
+        self.nextSlot = max(now, self.nextSlot) + self.spacing
+
+
+class MonitorStats:
+    def __init__(self):
+        self.checks = 0
+        self.failures = 0
+        self.priceChanges = 0
+        self.stockChanges = 0
+
+    def __repr__(self):
+        return (f"MonitorStats(checks={self.checks}, failures={self.failures}, "
+                f"priceChanges={self.priceChanges}, stockChanges={self.stockChanges})")
+
+
+# The scheduling loop. checkListing(item, now) returns the item's ProductDetails (or None if the check
+# failed) and onChecked(item, details, priceChanged, stockChanged) gets every result. clock and sleep are
+# time.time/time.sleep for the real thing; the simulation passes a virtual clock so days run in a second.
+class PriceMonitor:
+    def __init__(self, schedule, budget, checkListing, onChecked=None, clock=time.time, sleep=time.sleep):
+        self.schedule = schedule
+        self.budget = budget
+        self.checkListing = checkListing
+        self.onChecked = onChecked
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = MonitorStats()
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    # Runs until stop(), until the clock reaches `until`, or after maxChecks checks. beforeWait(now) is
+    # called every time around the loop, the live monitor uses it to pick up new products.
+    def run(self, until=None, maxChecks=None, beforeWait=None):
+        while not self.stopped and (maxChecks is None or self.stats.checks < maxChecks):
+            now = self.clock()
+            if beforeWait is not None:
+                beforeWait(now)
+            due = self.schedule.nextCheckTime()
+            if due is None:
+                if until is None:
+                    self.sleep(maxIdleSleep)  # nothing to watch yet
+                    continue
+                return self.stats
+            startAt = max(due, self.budget.nextSlot)
+            if until is not None and startAt >= until:
+                return self.stats
+            if startAt > now:
+                self.sleep(min(startAt - now, maxIdleSleep))
+                continue
+
+            item = self.schedule.pop()
+            self.budget.spend(now)
+            try:
+                details = self.checkListing(item, now)
+            except Exception as e:
+                print(f"Error checking {item.url}: {e}")
+                details = None
+            priceChanged, stockChanged = self.schedule.record(item, details, now)
+            self.stats.checks += 1
+            self.stats.failures += details is None
+            self.stats.priceChanges += priceChanged
+            self.stats.stockChanges += stockChanged
+            if self.onChecked is not None:
+                self.onChecked(item, details, priceChanged, stockChanged)
+        return self.stats
+
+
+# Long-lived monitor over everything in products.db. Every result is written straight back (price,
+# availability, fingerprint and the item's schedule), so a restart carries on where the last run stopped.
+def monitorProducts(scraper, dbManager, maxChecks=None):
+    settings = scraper.settingsManager.settings
+    schedule = MonitorSchedule(
+        minInterval=float(settings.get('monitorMinCheckInterval', defaultMinCheckInterval)),
+        maxInterval=float(settings.get('monitorMaxCheckInterval', defaultMaxCheckInterval)),
+        lowStockInterval=float(settings.get('monitorLowStockCheckInterval', defaultLowStockCheckInterval)))
+    budget = RequestBudget(float(settings.get('monitorRequestsPerMinute', defaultMonitorRequestsPerMinute)))
+    lastReload = None
+
+    def loadItems(now):
+        nonlocal lastReload
+        if lastReload is not None and now - lastReload < defaultReloadInterval:
+            return
+        lastReload = now
+        for row in dbManager.getMonitoredItems():
+            if row[0] not in schedule:
+                schedule.add(MonitoredItem(*row), now)
+
+    def checkListing(item, now):
+        details = scraper.checkListing(item.url)
+        return details if details.title or details.price is not None else None  # not an item page, try again later
+
+    def onChecked(item, details, priceChanged, stockChanged):
+        if details is not None:
+            dbManager.updateListings([(item.price, item.available, item.fingerprint, item.itemId)])
+        dbManager.updateSchedule([(item.interval, item.nextCheck, item.itemId)])
+        if priceChanged:
+            print(f"Price changed: {details.title} is now ${details.price:.2f} on eBay "
+                  f"(list it at ${scraper.calculateFinalPrice(details.price)})")
+        if stockChanged:
+            print(f"{'Back in stock' if item.available else 'Low stock'}: {details.title}")
+
+    monitor = PriceMonitor(schedule, budget, checkListing, onChecked)
+    try:
+        monitor.run(maxChecks=maxChecks, beforeWait=loadItems)
+    except KeyboardInterrupt:
+        pass
+    print(f"Price monitor stopped: {monitor.stats}")
+    return monitor.stats
+
+
+class VirtualClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+# A store for the simulation, built from saved item pages. Every simulated item starts as a copy of one
+# of the fixtures and changes at random times: a few are volatile (a change every few hours, often low on
+# stock), the rest change every week or so. The monitor only ever sees what a check returns, like for real.
+class SimulatedStore:
+    def __init__(self, fixtureDetails, items, horizon, seed=1, volatileShare=0.2,
+                 volatileMeanChange=4 * 3600, stableMeanChange=7 * 24 * 3600):
+        generator = random.Random(seed)
+        self.changeTimes = {}
+        self.states = {}
+        self.volatile = set()
+        for itemId in range(items):
+            base = fixtureDetails[itemId % len(fixtureDetails)]
+            volatile = generator.random() < volatileShare
+            if volatile:
+                self.volatile.add(itemId)
+            meanChange = volatileMeanChange if volatile else stableMeanChange
+            price, available = base.price or 10.0, not (volatile and generator.random() < 0.5)
+            times, states = [], [base._replace(price=price, available=available)]
+            now = generator.expovariate(1 / meanChange)
+            while now < horizon:
+                if generator.random() < 0.7:
+                    price = round(price * generator.uniform(0.8, 1.2), 2)
+                else:
+                    available = not available
+                times.append(now)
+                states.append(base._replace(price=price, available=available))
+                now += generator.expovariate(1 / meanChange)
+            self.changeTimes[itemId] = times
+            self.states[itemId] = states
+        self.checkTimes = {itemId: [] for itemId in range(items)}
+
+    def check(self, item, now):
+        self.checkTimes[item.itemId].append(now)
+        return self.states[item.itemId][bisect_right(self.changeTimes[item.itemId], now)]
+
+    # A change is caught when a check sees it before it's replaced by the next one (or the run ends)
+    def coverage(self, horizon, itemIds=None):
+        caught, delays, changes = 0, [], 0
+        for itemId in itemIds if itemIds is not None else self.changeTimes:
+            times = self.changeTimes[itemId]
+            checks = self.checkTimes[itemId]
+            for index, changedAt in enumerate(times):
+                changes += 1
+                supersededAt = times[index + 1] if index + 1 < len(times) else horizon
+                position = bisect_right(checks, changedAt)
+                if position < len(checks) and checks[position] < supersededAt:
+                    caught += 1
+                    delays.append(checks[position] - changedAt)
+        return changes, caught, delays
+
+
+def simulate(fixturePaths, items=500, hours=72, requestsPerMinute=defaultMonitorRequestsPerMinute, seed=1,
+             adaptive=True, parserName='lxml'):
+    parser = ProductParser.getParser(parserName)
+    fixtureDetails = []
+    for path in fixturePaths:
+        with open(path, 'rb') as file:
+            fixtureDetails.append(parser.parse(file.read()))
+    horizon = hours * 3600
+    store = SimulatedStore(fixtureDetails, items, horizon, seed)
+    clock = VirtualClock()
+    if adaptive:
+        schedule = MonitorSchedule()
+    else:
+        # the fixed loop: every item goes to the back of the queue after its check, i.e. round robin
+        schedule = MonitorSchedule(minInterval=0, maxInterval=0, initialInterval=0, lowStockInterval=0)
+    for itemId in range(items):
+        schedule.add(MonitoredItem(itemId, f"simulated://{itemId}"), clock())
+    monitor = PriceMonitor(schedule, RequestBudget(requestsPerMinute), store.check, clock=clock, sleep=clock.sleep)
+    stats = monitor.run(until=horizon)
+    return store, stats
+
+
+def printCoverage(label, store, stats, hours):
+    horizon = hours * 3600
+    _, caught, _ = store.coverage(horizon)
+    print(f"{label}: {stats.checks} requests, {stats.checks / caught if caught else 0:.1f} per change caught")
+    for group, itemIds in (("all", None), ("volatile", store.volatile),
+                           ("stable", set(store.changeTimes) - store.volatile)):
+        changes, caught, delays = store.coverage(horizon, itemIds)
+        share = caught / changes * 100 if changes else 0.0
+        delay = statistics.median(delays) / 60 if delays else 0.0
+        print(f"  {group:9s} {caught}/{changes} changes caught ({share:.1f}%), median delay {delay:.0f} min")
+
+
+# python PriceMonitor.py                runs the monitor against products.db until Ctrl+C
+# python PriceMonitor.py --simulate     replays the scheduler against the saved test pages instead
+def main():
+    argParser = argparse.ArgumentParser(description="Re-check listed eBay items for price and stock changes")
+    argParser.add_argument('--simulate', action='store_true', help="simulate against saved item pages, no network")
+    argParser.add_argument('--fixtures', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Tests', 'fixtures'))
+    argParser.add_argument('--items', type=int, default=2000)
+    argParser.add_argument('--hours', type=float, default=72)
+    argParser.add_argument('--rpm', type=float, default=defaultMonitorRequestsPerMinute)
+    argParser.add_argument('--max-checks', type=int, default=None)
+    args = argParser.parse_args()
+
+    if args.simulate:
+        fixturePaths = sorted(os.path.join(args.fixtures, name) for name in os.listdir(args.fixtures) if name.endswith('.html'))
+        print(f"{args.items} items from {len(fixturePaths)} saved pages, {args.hours:g} hours at {args.rpm:g} requests/min")
+        for label, adaptive in (("fixed loop", False), ("priority schedule", True)):
+            store, stats = simulate(fixturePaths, args.items, args.hours, args.rpm, adaptive=adaptive)
+            printCoverage(label, store, stats, args.hours)
+        return
+
+    from DatabaseManager import DatabaseManager
+    from Scraper import Scraper
+    from SettingsManager import SettingsManager
+    dbManager = DatabaseManager()
+    try:
+        monitorProducts(Scraper(dbManager, SettingsManager()), dbManager, args.max_checks)
+    finally:
+        dbManager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import threading
+from abc import ABC, abstractmethod
+
+# Default values
+defaultSkipVariations = True
+defaultSkipUnavailable = True
+defaultMinAvailable = 11  # "More than 10 available", so it's likely still there when a customer orders
+defaultMinEbayPrice = None  # no lower bound
+defaultMaxEbayPrice = None  # no upper bound
+defaultTitleBlocklist = ()
+
+
+# One reason to drop a product right after its page is parsed, before it's recorded, written to the database
+# or has any images downloaded. accepts() gets the parser's ProductDetails. Every filter counts what it threw
+# away and how many image downloads that saved, so it's easy to see which ones are worth having.
+# Rejected items are remembered under the filter's key, and later runs skip them while a filter with the
+# same key is on. Filters with settings put them in the key, so changing a setting gives everything a new look.
+class ProductFilter(ABC):
+    name = None
+
+    def __init__(self):
+        self.rejected = 0
+        self.imagesSaved = 0
+
+    @property
+    def key(self):
+        return self.name
+
+    @abstractmethod
+    def accepts(self, details):
+        pass
+
+
+# Facebook has an awful variations system and variations go out of stock unexpectedly (see Scraper.hasVariations)
+class VariationsFilter(ProductFilter):
+    name = 'variations'
+
+    def accepts(self, details):
+        return not details.hasVariations
+
+
+# At least minAvailable in stock, going by the page's quantity line (ProductParser.parseQuantity). eBay stops
+# counting at "More than 10", which reads as 11, so anything above 11 only lets through items with an exact
+# count that high. Pages without a quantity line are turned down.
+class AvailabilityFilter(ProductFilter):
+    name = 'availability'
+
+    def __init__(self, minAvailable=defaultMinAvailable):
+        super().__init__()
+        self.minAvailable = minAvailable
+
+    @property
+    def key(self):
+        return f"{self.name} {self.minAvailable}"
+
+    def accepts(self, details):
+        return details.quantity is not None and details.quantity >= self.minAvailable
+
+
+# Bounds are on the eBay price, before fees and profit. Pages without a price are left for the usual
+# title/price/images check to drop.
+class PriceRangeFilter(ProductFilter):
+    name = 'price range'
+
+    def __init__(self, minPrice=None, maxPrice=None):
+        super().__init__()
+        self.minPrice = minPrice
+        self.maxPrice = maxPrice
+
+    @property
+    def key(self):
+        return f"{self.name} {self.minPrice}-{self.maxPrice}"
+
+    def accepts(self, details):
+        if details.price is None:
+            return True
+        if self.minPrice is not None and details.price < self.minPrice:
+            return False
+        if self.maxPrice is not None and details.price > self.maxPrice:
+            return False
+        return True
+
+
+# Case-insensitive substring match, so "refurbished" also catches "Refurbished - Excellent"
+class TitleBlocklistFilter(ProductFilter):
+    name = 'title blocklist'
+
+    def __init__(self, words):
+        super().__init__()
+        self.words = [word.lower() for word in words if word]
+
+    @property
+    def key(self):
+        return f"{self.name} {','.join(sorted(self.words))}"
+
+    def accepts(self, details):
+        title = (details.title or '').lower()
+        return not any(word in title for word in self.words)
+
+
+# The filters in the order they run: cheapest first, the first one that says no settles it.
+# Parser threads call accepts() concurrently, the counters are only touched under the lock.
+class FilterChain:
+    def __init__(self, filters=()):
+        self.filters = list(filters)
+        self.lock = threading.Lock()
+
+    def accepts(self, details):
+        return self.rejectedBy(details) is None
+
+    # The filter that turned the product down, None if they all let it through
+    def rejectedBy(self, details):
+        for productFilter in self.filters:
+            if not productFilter.accepts(details):
+                with self.lock:
+                    productFilter.rejected += 1
+                    productFilter.imagesSaved += len(details.images)
+                return productFilter
+        return None
+
+    def keys(self):
+        return [productFilter.key for productFilter in self.filters]
+
+    @property
+    def rejected(self):
+        return sum(productFilter.rejected for productFilter in self.filters)
+
+    def report(self):
+        if not self.filters:
+            return "Filters: none"
+        counts = ", ".join(f"{productFilter.name} {productFilter.rejected} ({productFilter.imagesSaved} images)"
+                           for productFilter in self.filters)
+        return f"Filters rejected {self.rejected} products: {counts}"
+
+    def __len__(self):
+        return len(self.filters)
+
+    def __repr__(self):
+        return f"FilterChain({[productFilter.name for productFilter in self.filters]})"
+
+
+# The blocklist can come from settings.json as a list or typed in as "word, word"
+def parseBlocklist(value):
+    if isinstance(value, str):
+        value = value.split(',')
+    return [word.strip() for word in value or () if word and word.strip()]
+
+
+def parsePrice(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def buildFilterChain(settings):
+    filters = []
+    if settings.get('skipVariations', defaultSkipVariations):
+        filters.append(VariationsFilter())
+    if settings.get('skipUnavailable', defaultSkipUnavailable):
+        filters.append(AvailabilityFilter(int(settings.get('minAvailable', defaultMinAvailable))))
+    minPrice = parsePrice(settings.get('minEbayPrice', defaultMinEbayPrice))
+    maxPrice = parsePrice(settings.get('maxEbayPrice', defaultMaxEbayPrice))
+    if minPrice is not None or maxPrice is not None:
+        filters.append(PriceRangeFilter(minPrice, maxPrice))
+    blocklist = parseBlocklist(settings.get('titleBlocklist', defaultTitleBlocklist))
+    if blocklist:
+        filters.append(TitleBlocklistFilter(blocklist))
+    return FilterChain(filters)
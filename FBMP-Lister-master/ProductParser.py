@@ -0,0 +1,280 @@
+import json
+import re
+from collections import namedtuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml.html
+except ImportError:  # without lxml we're down to html.parser
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxHTMLParser  # selectolax < 1.0
+    except ImportError:  # selectolax is optional, lxml is the default fast path
+        SelectolaxHTMLParser = None
+
+# Everything we pull off an item page in one pass. Price is the raw eBay price, the Scraper applies
+# our fees and profit on top of it. quantity is how many the page says are left (parseQuantity), None
+# when it doesn't say.
+ProductDetails = namedtuple('ProductDetails', ['title', 'price', 'images', 'available', 'hasVariations', 'quantity'],
+                            defaults=(None,))
+
+# I consider a product being "Available" when there are more than 10 in stock (see Scraper.isAvailable)
+availableText = "More than 10 available"
+quantityPattern = re.compile(r'^(more than )?(\d[\d,]*) available', re.IGNORECASE)
+
+
+# The quantity line under the price: "7 available", "More than 10 available", "Last one", "Out of stock".
+# eBay doesn't say how many there are past 10, so "More than 10" comes out as 11.
+def parseQuantity(text):
+    text = (text or '').strip()
+    match = quantityPattern.match(text)
+    if match:
+        quantity = int(match.group(2).replace(',', ''))
+        return quantity + 1 if match.group(1) else quantity
+    lowered = text.lower()
+    if lowered.startswith('last one'):
+        return 1
+    if lowered.startswith(('out of stock', 'sold out')):
+        return 0
+    return None
+
+# Only these subtrees matter for a product, so the html.parser backend skips building the rest of the page.
+# bs4 hands the strainer the raw class attribute, hence matching whole class tokens with a regex.
+productStrainer = SoupStrainer(['h1', 'div'], class_=re.compile(
+    r'(^|\s)(x-item-title__mainTitle|x-price-primary|ux-image-carousel-item|d-quantity__availability|x-msku)(\s|$)'))
+
+
+def parsePrice(text):
+    strippedPrice = text.replace("US $", "").replace("/ea", "").replace(",", "").strip()
+    try:
+        return float(strippedPrice)
+    except ValueError:
+        print("Could not convert price to float.")
+        return None
+
+
+def uniqueSources(sources):
+    return list(dict.fromkeys(source for source in sources if source))
+
+
+# The original parsing path. Slowest, but only needs BeautifulSoup so it's always available.
+class SoupParser:
+    name = 'html.parser'
+
+    def parse(self, content):
+        soup = BeautifulSoup(content, 'html.parser', parse_only=productStrainer)
+        return ProductDetails(self.getTitle(soup), self.getPrice(soup), self.getImages(soup),
+                              self.isAvailable(soup), self.hasVariations(soup), self.getQuantity(soup))
+
+    def getTitle(self, soup):
+        h1Element = soup.find('h1', class_='x-item-title__mainTitle')
+        if h1Element:
+            spanElement = h1Element.find('span', class_='ux-textspans ux-textspans--BOLD')
+            if spanElement:
+                return spanElement.get_text()
+            else:
+                print("Nested <span> element not found.")
+        else:
+            print("<h1> element not found.")
+
+    def getPrice(self, soup):
+        priceDiv = soup.find('div', class_='x-price-primary')
+        if priceDiv:
+            priceSpan = priceDiv.find('span', class_='ux-textspans')
+            if priceSpan:
+                return parsePrice(priceSpan.get_text())
+            else:
+                print("Inner <span> element not found.")
+        else:
+            print("Outer <span> element not found.")
+
+    # every picture in the carousel, the same gallery the JSON-LD lists
+    def getImages(self, soup):
+        imageSources = []
+        for carouselItem in soup.find_all("div", class_="ux-image-carousel-item"):
+            imageSources.extend(img.get("src") for img in carouselItem.find_all("img"))
+        return uniqueSources(imageSources)
+
+    def isAvailable(self, soup):
+        divElement = soup.find('div', class_='d-quantity__availability')
+        if divElement:
+            spanElements = divElement.find_all('span', class_='ux-textspans')
+            if spanElements and spanElements[0].get_text() == availableText:
+                return True
+        else:
+            print("Availability information not found")
+        return False
+
+    def hasVariations(self, soup):
+        return soup.find('div', class_='vim x-msku') is not None
+
+    def getQuantity(self, soup):
+        divElement = soup.find('div', class_='d-quantity__availability')
+        spanElement = divElement.find('span', class_='ux-textspans') if divElement else None
+        return parseQuantity(spanElement.get_text()) if spanElement else None
+
+
+def classXpath(className):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {className} ')"
+
+
+class LxmlParser:
+    name = 'lxml'
+
+    titleXpath = f"//h1[{classXpath('x-item-title__mainTitle')}]//span[{classXpath('ux-textspans--BOLD')}]"
+    priceXpath = f"//div[{classXpath('x-price-primary')}]//span[{classXpath('ux-textspans')}]"
+    imagesXpath = f"//div[{classXpath('ux-image-carousel-item')}]//img/@src"
+    availabilityXpath = f"//div[{classXpath('d-quantity__availability')}]//span[{classXpath('ux-textspans')}]"
+    variationsXpath = f"//div[{classXpath('vim')} and {classXpath('x-msku')}]"
+
+    def parse(self, content):
+        tree = lxml.html.fromstring(content)
+        titleSpans = tree.xpath(self.titleXpath)
+        priceSpans = tree.xpath(self.priceXpath)
+        availabilitySpans = tree.xpath(self.availabilityXpath)
+        availabilityText = availabilitySpans[0].text_content() if availabilitySpans else None
+        return ProductDetails(
+            titleSpans[0].text_content() if titleSpans else None,
+            parsePrice(priceSpans[0].text_content()) if priceSpans else None,
+            uniqueSources(tree.xpath(self.imagesXpath)),
+            availabilityText == availableText,
+            bool(tree.xpath(self.variationsXpath)),
+            parseQuantity(availabilityText))
+
+
+class SelectolaxParser:
+    name = 'selectolax'
+
+    def parse(self, content):
+        tree = SelectolaxHTMLParser(content)
+        titleSpan = tree.css_first('h1.x-item-title__mainTitle span.ux-textspans--BOLD')
+        priceSpan = tree.css_first('div.x-price-primary span.ux-textspans')
+        availabilitySpan = tree.css_first('div.d-quantity__availability span.ux-textspans')
+        availabilityText = availabilitySpan.text() if availabilitySpan is not None else None
+        return ProductDetails(
+            titleSpan.text() if titleSpan else None,
+            parsePrice(priceSpan.text()) if priceSpan else None,
+            uniqueSources(img.attributes.get('src') for img in tree.css('div.ux-image-carousel-item img')),
+            availabilityText == availableText,
+            tree.css_first('div.vim.x-msku') is not None,
+            parseQuantity(availabilityText))
+
+
+# eBay item pages carry the product as schema.org JSON-LD in a <script> tag. Finding that tag with a plain
+# byte search and json-decoding only the blob is a lot cheaper than building a DOM of the whole page, and
+# it doesn't care what the CSS classes are called this month. The two things JSON-LD doesn't say (our "more
+# than 10 available" rule and the variations box) come from byte scans too. Pages without usable JSON-LD
+# go to the fallback DOM parser, so a page never comes out worse than with that backend.
+jsonLdMarker = b'application/ld+json'
+scriptEnd = b'</script>'
+availabilityMarker = b'd-quantity__availability'
+# first text span after the availability marker, same one the DOM parsers read
+availabilitySpanPattern = re.compile(rb'<span class="[^"]*\bux-textspans\b[^"]*"[^>]*>([^<]*)<')
+variationsPattern = re.compile(rb'<div class="([^"]*\bx-msku\b[^"]*)"')
+outOfStock = ('OutOfStock', 'SoldOut', 'Discontinued')
+
+
+# The first JSON-LD blob describing a product, or None
+def findJsonLd(content):
+    start = content.find(jsonLdMarker)
+    while start != -1:
+        blobStart = content.find(b'>', start) + 1
+        blobEnd = content.find(scriptEnd, blobStart)
+        if blobStart == 0 or blobEnd == -1:
+            return None
+        try:
+            data = json.loads(content[blobStart:blobEnd])
+        except ValueError:
+            data = None
+        for entry in data if isinstance(data, list) else [data]:
+            if isinstance(entry, dict) and entry.get('@type') in ('Product', 'ProductGroup'):
+                return entry
+        start = content.find(jsonLdMarker, blobEnd)
+    return None
+
+
+class StructuredDataParser:
+    name = 'jsonld'
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback if fallback is not None else domParser()
+
+    def parse(self, content):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        product = findJsonLd(content)
+        details = self.fromJsonLd(product, content) if product is not None else None
+        if details is None:
+            return self.fallback.parse(content)
+        return details
+
+    # None when the blob is missing something the DOM would have, so the fallback gets a go
+    def fromJsonLd(self, product, content):
+        offers = product.get('offers')
+        offer = offers[0] if isinstance(offers, list) and offers else offers
+        images = product.get('image')
+        images = [images] if isinstance(images, (str, dict)) else images
+        if not product.get('name') or not isinstance(offer, dict) or not images:
+            return None
+        try:
+            price = float(offer.get('price', offer.get('lowPrice')))
+        except (TypeError, ValueError):
+            return None
+
+        # schema.org says in stock or not, our rule needs the quantity line
+        availabilityText = self.scanAvailability(content)
+        inStock = not str(offer.get('availability', '')).endswith(outOfStock)
+        available = inStock and availabilityText == availableText
+        quantity = parseQuantity(availabilityText) if inStock else 0
+        hasVariations = (product.get('@type') == 'ProductGroup' or 'hasVariant' in product
+                         or offer.get('@type') == 'AggregateOffer' or self.scanVariations(content))
+        # JSON-LD lists the whole gallery in order, like the carousel the DOM parsers read;
+        # an ImageObject has its URL in contentUrl or url
+        images = [image.get('contentUrl', image.get('url')) if isinstance(image, dict) else image for image in images]
+        return ProductDetails(product['name'], price, uniqueSources(images), available, hasVariations, quantity)
+
+    # The quantity line's text, None without one
+    def scanAvailability(self, content):
+        start = content.find(availabilityMarker)
+        if start == -1:
+            return None
+        match = availabilitySpanPattern.search(content, start, start + 500)
+        return match.group(1).decode('utf-8', 'replace').strip() if match is not None else None
+
+    def scanVariations(self, content):
+        return any(b'vim' in match.group(1).split() for match in variationsPattern.finditer(content))
+
+
+parserBackends = {
+    SoupParser.name: SoupParser,
+    LxmlParser.name: LxmlParser,
+    SelectolaxParser.name: SelectolaxParser,
+    StructuredDataParser.name: StructuredDataParser,
+}
+
+
+def availableParsers():
+    missing = set()
+    if lxml is None:
+        missing.add(LxmlParser.name)
+    if SelectolaxHTMLParser is None:
+        missing.add(SelectolaxParser.name)
+    return [name for name in parserBackends if name not in missing]
+
+
+# The DOM parser for pages without structured data: lxml if it's installed, html.parser otherwise
+def domParser():
+    return LxmlParser() if lxml is not None else SoupParser()
+
+
+# Falls back to html.parser if the requested backend is unknown or its library isn't installed
+def getParser(name):
+    if name not in availableParsers():
+        print(f"HTML parser '{name}' is not available, falling back to {SoupParser.name}")
+        return SoupParser()
+    return parserBackends[name]()
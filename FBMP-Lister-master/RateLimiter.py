@@ -0,0 +1,198 @@
+import asyncio
+import email.utils
+import threading
+import time
+from urllib.parse import urlsplit
+
+# Default values
+defaultRate = 1000.0  # requests/sec per host to start with: in practice only the connection limits apply until a host pushes back
+defaultMaxRate = 1000.0
+defaultMinRate = 0.5
+defaultBurst = 25  # same as FetchEngine's defaultMaxPerHost
+defaultDecrease = 0.5  # rate multiplier when a host pushes back
+defaultIncrease = 1.0  # requests/sec gained per second of traffic that wasn't pushed back
+defaultCooldown = 1.0  # seconds; a burst of 429s from requests already in flight only counts once
+throttleStatuses = (429, 503)
+
+
+# Seconds to wait from a Retry-After header (either delay-seconds or an HTTP date), None if there isn't one
+def parseRetryAfter(value, now=None):
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retryAt = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retryAt.timestamp() - (now if now is not None else time.time()))
+
+
+# Wall-clock time during which at least one request was waiting. Overlapping waits count once, so it never
+# comes out longer than the run itself.
+class WaitTimer:
+    def __init__(self):
+        self.seconds = 0.0
+        self.waiting = 0
+        self.since = None
+
+    def start(self, now):
+        if not self.waiting:
+            self.since = now
+        self.waiting += 1
+
+    def stop(self, now):
+        self.waiting -= 1
+        if not self.waiting:
+            self.seconds += now - self.since
+
+
+# Token bucket for one host. Requests take a token each, tokens come back at `rate` per second up to `burst`.
+# A request that finds the bucket empty still takes its token (the count goes negative) and is told how long
+# to wait for it, so waiting requests go out evenly spaced in the order they asked. When the host pushes back,
+# those reservations are dropped and the waiters queue again at the new rate.
+# The rate is AIMD: halved when the host answers 429/503, then won back a little with every request it
+# takes without complaint, so we settle just under whatever the host is willing to serve. Halved from what we
+# were actually sending, since the starting rate is usually far above that.
+class HostBucket:
+    def __init__(self, rate, maxRate, minRate, burst, now):
+        self.rate = rate
+        self.maxRate = maxRate
+        self.minRate = minRate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.blockedUntil = 0.0  # Retry-After
+        self.lastDecrease = float('-inf')
+        self.throttles = 0  # 429/503 answers
+        self.waits = WaitTimer()  # requests waiting here for a token
+        self.generation = 0  # bumped whenever the host pushes back, outstanding reservations are void
+        self.windowStart = now
+        self.windowCount = 0
+        self.sentRate = None  # requests/sec answered over the last full window
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds the caller has to wait before its request can go out
+    def reserve(self, now):
+        self.refill(now)
+        self.tokens -= 1
+        return max(self.blockedUntil - now, -self.tokens / self.rate, 0.0)
+
+    @property
+    def throttledSeconds(self):
+        return self.waits.seconds
+
+    def countAnswer(self, now):
+        self.windowCount += 1
+        if now - self.windowStart >= 1:
+            self.sentRate = self.windowCount / (now - self.windowStart)
+            self.windowStart, self.windowCount = now, 0
+
+    def observedRate(self, now):
+        elapsed = now - self.windowStart
+        if elapsed >= 0.25 or self.sentRate is None:
+            return self.windowCount / max(elapsed, 0.25)
+        return self.sentRate
+
+    def slowDown(self, now, decrease, cooldown, retryAfter=None):
+        self.throttles += 1
+        if retryAfter is not None and now + retryAfter > self.blockedUntil:
+            self.blockedUntil = now + retryAfter
+            self.generation += 1
+        if now - self.lastDecrease >= cooldown:
+            self.rate = max(self.minRate, min(self.rate, self.observedRate(now)) * decrease)
+            self.lastDecrease = now
+            self.generation += 1
+        self.tokens = 0  # no burst straight after being told to slow down
+        self.updated = now
+
+    def speedUp(self, increase):
+        # +increase requests/sec for every second's worth of requests at the current rate
+        self.rate = min(self.maxRate, self.rate + increase / self.rate)
+
+
+# One limiter for every request the Scraper makes, page fetches and image downloads alike, so both paths
+# share a single budget per host instead of each hammering eBay on its own. FetchClient calls acquire()
+# before every attempt and record() with every answer. Shared by every thread and event loop that fetches.
+class RateLimiter:
+    def __init__(self, rate=defaultRate, maxRate=defaultMaxRate, minRate=defaultMinRate, burst=defaultBurst,
+                 decrease=defaultDecrease, increase=defaultIncrease, cooldown=defaultCooldown, clock=time.monotonic):
+        self.rate = rate
+        self.maxRate = max(rate, maxRate)
+        self.minRate = minRate
+        self.burst = burst
+        self.decrease = decrease
+        self.increase = increase
+        self.cooldown = cooldown
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets = {}  # host -> HostBucket
+        self.waits = WaitTimer()  # requests waiting on any host
+
+    def bucketFor(self, url):
+        host = urlsplit(url).hostname or ''
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            bucket = self.buckets[host] = HostBucket(self.rate, self.maxRate, self.minRate, self.burst, self.clock())
+        return bucket
+
+    async def acquire(self, url):
+        with self.lock:
+            bucket = self.bucketFor(url)
+            generation = bucket.generation
+            wait = bucket.reserve(self.clock())
+            if wait <= 0:
+                return
+            bucket.waits.start(self.clock())
+            self.waits.start(self.clock())
+        try:
+            while wait > 0:
+                await asyncio.sleep(wait)
+                with self.lock:
+                    if bucket.generation != generation:
+                        # the host pushed back while we were waiting, queue again at the new rate
+                        generation = bucket.generation
+                        wait = bucket.reserve(self.clock())
+                    else:
+                        wait = 0
+        finally:
+            with self.lock:
+                bucket.waits.stop(self.clock())
+                self.waits.stop(self.clock())
+
+    def record(self, url, status, retryAfter=None):
+        with self.lock:
+            bucket = self.bucketFor(url)
+            bucket.countAnswer(self.clock())
+            if status in throttleStatuses:
+                bucket.slowDown(self.clock(), self.decrease, self.cooldown, parseRetryAfter(retryAfter))
+            else:
+                bucket.speedUp(self.increase)
+
+    # host -> current requests/sec
+    def rates(self):
+        with self.lock:
+            return {host: bucket.rate for host, bucket in self.buckets.items()}
+
+    @property
+    def throttledSeconds(self):
+        with self.lock:
+            return self.waits.seconds
+
+    @property
+    def throttles(self):
+        with self.lock:
+            return sum(bucket.throttles for bucket in self.buckets.values())
+
+    def report(self):
+        with self.lock:
+            hosts = ", ".join(f"{host} {bucket.rate:.1f}/s ({bucket.throttles} pushed back, "
+                              f"throttled {bucket.throttledSeconds:.1f}s)"
+                              for host, bucket in sorted(self.buckets.items()))
+        if not hosts:
+            return "Rate limits: no requests yet"
+        return f"Rate limits: {hosts}; throttled for {self.throttledSeconds:.1f}s in all"
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+
+from ImageDownloader import DownloadStats
+
+# Default values
+defaultImageQueueSize = 64  # products parsed and placed but still waiting for an image worker
+
+
+# A batch on its way through the pipeline: closed once it has all the products it's going to get,
+# exported once it's closed and none of its products are still downloading images
+class BatchProgress:
+    def __init__(self):
+        self.products = []
+        self.closed = False
+        self.downloading = 0
+
+
+# The four stages of a store scrape running at the same time, connected by queues:
+#   fetch + parse  product pages, up to the fetch engine's concurrency (Scraper.scrapeProductDetailsAsync)
+#   order          puts finished products back in listing order and gives each its batch slot
+#   images         downloads each product's images into its folder, as soon as it has a slot, and runs them
+#                  through the ImageProcessor when there is one
+#   export         writes a batch's CSV and manifest once it's full and all of its images are on disk
+# A product page's fetch slot is only given back once the product has left the order stage, and that stage
+# waits on the bounded image queue, so when downloads fall behind the crawler stops instead of buffering
+# the whole store in memory. Products, batches and rows come out the same as when the stages ran one
+# after the other, only the export of a batch waits for its images so the uploader never gets a CSV whose
+# photos aren't there yet.
+class ScrapePipeline:
+    endMarker = object()
+
+    def __init__(self, scraper, session, imageCache=None, csvManager=None, httpCache=None, imageProcessor=None,
+                 imageQueueSize=defaultImageQueueSize):
+        self.scraper = scraper
+        self.session = session
+        self.imageCache = imageCache
+        self.httpCache = httpCache
+        self.imageProcessor = imageProcessor
+        self.csvManager = csvManager
+        self.imageQueueSize = imageQueueSize
+        self.imageStats = None
+        self.stageTimes = {}  # stage -> seconds from the start of the run until it finished
+
+    async def run(self, url):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        if self.session.delta is None:
+            knownItemIds = await loop.run_in_executor(self.scraper.parseExecutor, self.scraper.dbManager.getKnownItemIds)
+            rejectedItemIds = await loop.run_in_executor(self.scraper.parseExecutor, self.scraper.getRejectedItemIds,
+                                                         self.session)
+        else:
+            # re-scrape: known items are fetched too, processProductPage compares them, and rejected ones get another look
+            knownItemIds = rejectedItemIds = frozenset()
+
+        imageDownloader = self.scraper.imageDownloader
+        self.fetchSlots = asyncio.Semaphore(self.scraper.fetchEngine.maxConcurrency)
+        self.results = asyncio.Queue()  # (position, product or None), never longer than the number of fetch slots
+        self.images = asyncio.Queue(maxsize=self.imageQueueSize)
+        self.exports = asyncio.Queue()
+        self.batches = {}  # batch number -> BatchProgress
+        self.imageStats = DownloadStats()
+        self.inFlightImages = {}
+
+        async with self.scraper.fetchEngine.connect(self.httpCache) as client, imageDownloader.fetchEngine.connect() as imageClient:
+            orderer = asyncio.create_task(self.orderProducts())
+            imageWorkers = [asyncio.create_task(self.downloadImages(imageClient))
+                            for _ in range(imageDownloader.fetchEngine.maxConcurrency)]
+            exporter = asyncio.create_task(self.exportBatches())
+            try:
+                await self.fetchProducts(client, url, knownItemIds, rejectedItemIds)
+            finally:
+                # whatever was found before a failure still goes all the way through
+                await self.results.put(self.endMarker)
+                await orderer
+                self.stageTimes['fetch'] = time.perf_counter() - start
+                await self.images.join()
+                self.stageTimes['images'] = time.perf_counter() - start
+                for worker in imageWorkers:
+                    worker.cancel()
+                await self.exports.put(self.endMarker)
+                await exporter
+                self.stageTimes['export'] = time.perf_counter() - start
+
+        self.imageStats.elapsed = self.stageTimes['images']
+        imageDownloader.report(self.imageStats)
+        print(f"Skipped {self.session.skippedKnownItems} products already in the database and "
+              f"{self.session.skippedRejectedItems} the filters turned down before")
+        if self.session.filters is not None:
+            print(self.session.filters.report())
+        if self.httpCache is not None:
+            cacheStats = self.httpCache.stats
+            print(f"HTTP cache: {cacheStats.hits} pages reused, {cacheStats.revalidated} unchanged (304), "
+                  f"{cacheStats.misses} downloaded")
+        print(f"Pipeline: {len(self.session)} products in {self.stageTimes['export']:.1f}s (pages done at "
+              f"{self.stageTimes['fetch']:.1f}s, images at {self.stageTimes['images']:.1f}s)")
+
+    async def fetchProducts(self, client, url, knownItemIds, rejectedItemIds=frozenset()):
+        tasks = set()
+        try:
+            async for position, link in aenumerate(self.scraper.crawlStoreLinks(client, url, self.session, knownItemIds,
+                                                                                 rejectedItemIds)):
+                await self.fetchSlots.acquire()  # given back by orderProducts
+                task = asyncio.create_task(self.fetchProduct(client, link, position))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            await asyncio.gather(*tasks)
+
+    async def fetchProduct(self, client, link, position):
+        product = None
+        try:
+            product = await self.scraper.scrapeProductDetailsAsync(client, link, self.session, position)
+        finally:
+            await self.results.put((position, product))
+
+    async def orderProducts(self):
+        loop = asyncio.get_running_loop()
+        batchPlan = self.session.batchPlan
+        waiting = {}
+        nextPosition = 0
+        while True:
+            result = await self.results.get()
+            if result is self.endMarker:
+                break
+            position, product = result
+            waiting[position] = product
+            while nextPosition in waiting:
+                product = waiting.pop(nextPosition)
+                nextPosition += 1
+                self.fetchSlots.release()
+                if product is None:
+                    continue
+                try:
+                    if batchPlan.opensBatch:
+                        # allocating the batch number waits on products.db's write lock, which must not hold up the loop
+                        slot = await loop.run_in_executor(self.scraper.parseExecutor, batchPlan.add, product)
+                    else:
+                        slot = batchPlan.add(product)
+                except Exception as e:
+                    # still drain the results, the crawler is waiting on the fetch slots
+                    print(f"Error placing {product.title} in a batch: {e}")
+                    continue
+                progress = self.batches.setdefault(slot.batch, BatchProgress())
+                progress.products.append(product)
+                progress.downloading += 1
+                progress.closed = slot.row == batchPlan.productsPerBatch - 1
+                await self.images.put(product)
+        # the last batch is as full as it's going to get
+        for batch, progress in list(self.batches.items()):
+            progress.closed = True
+            self.exportIfReady(batch)
+
+    async def downloadImages(self, imageClient):
+        imageDownloader = self.scraper.imageDownloader
+        batchPlan = self.session.batchPlan
+        while True:
+            product = await self.images.get()
+            try:
+                downloads = self.scraper.getImageDownloads(batchPlan, product)
+                await asyncio.gather(*(imageDownloader.download(imageClient, url, filePath, self.imageStats,
+                                                                self.imageCache, self.inFlightImages)
+                                       for url, filePath in downloads))
+                filePaths = [filePath for _, filePath in downloads if os.path.exists(filePath)]
+                if self.imageProcessor is not None:
+                    await self.imageProcessor.process(filePaths)
+                batchPlan.setImageFiles(product, [os.path.basename(filePath) for filePath in filePaths])
+            except Exception as e:
+                print(f"Error downloading images for {product.title}: {e}")
+            finally:
+                batch = batchPlan.slotFor(product).batch
+                self.batches[batch].downloading -= 1
+                self.exportIfReady(batch)
+                self.images.task_done()
+
+    def exportIfReady(self, batch):
+        progress = self.batches.get(batch)
+        if progress is not None and progress.closed and progress.downloading == 0:
+            del self.batches[batch]
+            self.exports.put_nowait(progress.products)
+
+    async def exportBatches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            products = await self.exports.get()
+            if products is self.endMarker:
+                return
+            if self.csvManager is not None:
+                await loop.run_in_executor(self.scraper.parseExecutor, self.csvManager.saveProducts,
+                                           products, self.session.batchPlan)
+
+
+async def aenumerate(asyncIterable):
+    index = 0
+    async for item in asyncIterable:
+        yield index, item
+        index += 1
@@ -0,0 +1,68 @@
+import threading
+
+from BatchPlanner import BatchPlan
+
+
+# Everything one scrape run produces. Parser threads add to it concurrently, the UI reads it once the run
+# is over and releases it when it's done exporting, so nothing carries over into the next run.
+# Products finish in whatever order the network returns them, so each one is stored with its position in
+# the store listing and read back in that order.
+class ScrapeSession:
+    def __init__(self, storeUrl=None, filters=None):
+        self.storeUrl = storeUrl
+        self.filters = filters  # ProductFilters.FilterChain, None lets every product through
+        self.lock = threading.Lock()
+        self.entries = []  # (position, product)
+        self.skippedItemIds = []
+        self.skippedRejectedIds = []  # turned down by the filters on an earlier run
+        self.batchPlan = None
+        self.delta = None  # ListingDelta when this run is a re-scrape
+        self.htmlArchive = None  # HtmlArchive every fetched item page goes into, when archiveHtml is on
+
+    @property
+    def products(self):
+        with self.lock:
+            return [product for _, product in sorted(self.entries, key=lambda entry: entry[0])]
+
+    def addProduct(self, product, position=None):
+        with self.lock:
+            self.entries.append((len(self.entries) if position is None else position, product))
+
+    def planBatches(self, firstBatch):
+        self.batchPlan = BatchPlan(self.products, firstBatch)
+        return self.batchPlan
+
+    def addSkippedItem(self, itemId):
+        with self.lock:
+            self.skippedItemIds.append(itemId)
+
+    def addSkippedRejectedItem(self, itemId):
+        with self.lock:
+            self.skippedRejectedIds.append(itemId)
+
+    @property
+    def skippedKnownItems(self):
+        return len(self.skippedItemIds)
+
+    @property
+    def skippedRejectedItems(self):
+        return len(self.skippedRejectedIds)
+
+    def release(self):
+        with self.lock:
+            self.entries = []
+            self.batchPlan = None
+            self.delta = None
+            self.htmlArchive = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.release()
+
+    def __repr__(self):
+        return f"ScrapeSession(storeUrl={self.storeUrl}, products={len(self)})"
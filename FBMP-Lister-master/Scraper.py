@@ -1,41 +1,79 @@
-from collections import defaultdict
-import requests
+import asyncio
+import contextlib
+import aiohttp
 from bs4 import BeautifulSoup
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import math
-import threading
 import os
-from requests.adapters import HTTPAdapter
-from urllib3.util import Retry
+import sqlite3
+import time
+from urllib.parse import urljoin
 
 import Utils
+import ProductParser
+from BatchPlanner import BatchAllocator, BatchPlan
+from DatabaseWriter import DatabaseWriter
+from FetchEngine import FetchEngine
+from HtmlArchive import HtmlArchive
+from HttpCache import HttpCache
+from ImageCache import ImageCache
+from ImageDownloader import ImageDownloader
+from ListingDelta import ListingDelta, listingFingerprint
 from Product import Product
-
-products = []  # List of products
-imageDict = defaultdict(list)  # Dictionary of images
-dictionaryId = 0  # ID of the product in the dictionary
+from ProductFilters import buildFilterChain
+from RateLimiter import RateLimiter
+from ScrapePipeline import ScrapePipeline
+from ScrapeSession import ScrapeSession
 
 # Default values
 defaultFacebookFee = 5.0
 defaultSalesTax = 7.5
 defaultAdditionalProfit = 10.0
-
-# try to set up a cleaner session for fault tolerance
-def setup_session():
-    session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retries)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+defaultMaxConcurrentRequests = 100
+defaultMaxRequestsPerHost = 25
+defaultMaxStorePages = 100
+defaultMaxStoreItems = 5000
+defaultHtmlParser = 'jsonld'  # falls back to a DOM parser on pages without structured data
+defaultMaxConcurrentDownloads = 32
+defaultMaxDownloadsPerImageHost = 16
+defaultImageCacheMaxBytes = 2 * 1024 ** 3
+defaultImageSize = 960  # plenty for a Marketplace listing, 1600 is eBay's largest and costs about twice the bytes
+defaultProcessImages = False
+defaultImageMaxDimension = 1600
+defaultImageQuality = 85
+defaultArchiveHtml = False
+defaultHttpCache = True
+defaultHttpCacheMaxBytes = 512 * 1024 ** 2
+defaultStorePageTtl = 15 * 60  # seconds a store listing page is reused without asking eBay
+defaultRejectedItemTtl = 7 * 24 * 3600  # seconds an item the filters turned down is skipped before it gets another look
+defaultHostRequestRate = 1000.0  # requests/sec per host to start at, cut back when a host pushes back
+defaultMaxHostRequestRate = 1000.0
+defaultHtmlArchiveMaxBytes = 1024 ** 3
+defaultHtmlArchiveCompression = 'gzip'  # 'zstd' is smaller and faster, with zstandard installed
 
 class Scraper:
     def __init__(self, dbManager, settingsManager):
         self.dbManager = dbManager
+        self.dbWriter = DatabaseWriter(dbManager)
         self.settingsManager = settingsManager
-        self.productDirectoryName = "Products Directory"
-        self.batchNumber = Utils.getNextBatchNumber(self.productDirectoryName)
-        self.session = setup_session()
+        self.batchAllocator = BatchAllocator(dbManager, settingsManager)
+        # pages and images go through the same limiter, so eBay sees one well-behaved client rather than two
+        self.rateLimiter = RateLimiter(
+            rate=float(self.settingsManager.settings.get('hostRequestRate', defaultHostRequestRate)),
+            maxRate=float(self.settingsManager.settings.get('maxHostRequestRate', defaultMaxHostRequestRate)),
+            burst=int(self.settingsManager.settings.get('maxRequestsPerHost', defaultMaxRequestsPerHost)))
+        self.fetchEngine = FetchEngine(
+            maxConcurrency=int(self.settingsManager.settings.get('maxConcurrentRequests', defaultMaxConcurrentRequests)),
+            maxPerHost=int(self.settingsManager.settings.get('maxRequestsPerHost', defaultMaxRequestsPerHost)),
+            rateLimiter=self.rateLimiter)
+        # BeautifulSoup is pure CPU work, so it runs here instead of blocking the event loop that drives the fetches
+        self.parseExecutor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        self.productParser = ProductParser.getParser(self.settingsManager.settings.get('htmlParser', defaultHtmlParser))
+        self.soupParser = ProductParser.SoupParser()
+        self.imageDownloader = ImageDownloader(
+            maxConcurrency=int(self.settingsManager.settings.get('maxConcurrentDownloads', defaultMaxConcurrentDownloads)),
+            maxPerHost=int(self.settingsManager.settings.get('maxDownloadsPerImageHost', defaultMaxDownloadsPerImageHost)),
+            rateLimiter=self.rateLimiter)
 
     def calculateFinalPrice(self, price):
         try:
@@ -53,145 +91,245 @@ class Scraper:
             return price  # Fallback to original price if calculation fails
 
     def getTitle(self, soup):
-        h1Element = soup.find('h1', class_='x-item-title__mainTitle')
-        if h1Element:
-            spanElement = h1Element.find('span', class_='ux-textspans ux-textspans--BOLD')
-            if spanElement:
-                return spanElement.get_text()
-            else:
-                print("Nested <span> element not found.")
-        else:
-            print("<h1> element not found.")
+        return self.soupParser.getTitle(soup)
 
     def getPrice(self, soup):
-        priceDiv = soup.find('div', class_='x-price-primary')
-        if priceDiv:
-            priceSpan = priceDiv.find('span', class_='ux-textspans')
-            if priceSpan:
-                price = priceSpan.get_text()
-                strippedPrice = price.replace("US $", "").replace("/ea", "")
-                print(strippedPrice)
-                try:
-                    return self.calculateFinalPrice(float(strippedPrice))
-                except ValueError:
-                    print("Could not convert price to float.")
-            else:
-                print("Inner <span> element not found.")
-        else:
-            print("Outer <span> element not found.")
+        price = self.soupParser.getPrice(soup)
+        if price is not None:
+            return self.calculateFinalPrice(price)
 
     def getImages(self, soup):
-        print("Getting images")
-        divClass = "ux-image-carousel-item"
-        imgTags = soup.find("div", class_=divClass)
-        imageSources = []
-        if imgTags:
-            imgTags = imgTags.find_all(["img", "button"])
-            for tag in imgTags:
-                source = tag.get("src") if tag.name == "img" else tag.find("img").get("src") if tag.find("img") else None
-                if source:
-                    imageSources.append(source)
-        else:
-            activeImg = soup.find("div", class_="ux-image-carousel-item active image")
-            if activeImg and activeImg.find("img"):
-                imageSources.append(activeImg.find("img")["src"])
-        return imageSources
-
+        return self.soupParser.getImages(soup)
 
     # I consider a product being "Available" when there are more than 10 in stock. This way, there is a way
     # better chance that it will still be in stock by the time the user would have to order it from their customer.
     def isAvailable(self, soup):
-        divElement = soup.find('div', class_='d-quantity__availability')
-        if divElement:
-            spanElements = divElement.find_all('span', class_='ux-textspans')
-            if spanElements and spanElements[0].get_text() == "More than 10 available":
-                return True
-        else:
-            print("Availability information not found")
-        return False
+        return self.soupParser.isAvailable(soup)
 
     # Facebook has an awful variations system and they make it very difficult to input.
     # Variations also have a way higher chance of going out of stock unexpectedly so for now, we will exclude
     # the products that have them.
     def hasVariations(self, soup):
-        if soup.find('div', class_='vim x-msku'):
+        if self.soupParser.hasVariations(soup):
             print("Product skipped: Div class 'vim x-msku' found")
             return True
         return False
 
-    def scrapeProductDetails(self, url):
+    # A fresh chain for every run, its counters are that run's
+    def buildFilterChain(self):
+        return buildFilterChain(self.settingsManager.settings)
+
+    # Items this run's filters turned down on a recent run. Only rejections by a filter that's still on (with
+    # the same settings) count, and only for rejectedItemTtl, since stock and prices change. Rejections made
+    # under a filter's old settings are deleted.
+    def getRejectedItemIds(self, session):
+        if not session.filters:
+            return frozenset()
+        self.dbManager.clearStaleRejections({productFilter.name: productFilter.key for productFilter in session.filters.filters})
+        ttl = float(self.settingsManager.settings.get('rejectedItemTtl', defaultRejectedItemTtl))
+        return self.dbManager.getRejectedItemIds(session.filters.keys(), since=time.time() - ttl)
+
+    def scrapeProductDetails(self, url, session=None, position=None):
+        session = session if session is not None else ScrapeSession(filters=self.buildFilterChain())
         try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            title = self.getTitle(soup)
-            price = self.getPrice(soup)
-            images = self.getImages(soup)
-            productAlreadyInDb = self.dbManager.productAlreadyExistsInDatabase(url, title)
-
-            # if valid title, price, image(s) and not in db already
-            # (meaning the product was added on a previous run of the app): include these products.
-            if title and price and images and not productAlreadyInDb:
-                product = Product(title, price, images)
-                global dictionaryId
-                imageDict[str(dictionaryId)] = images
-                dictionaryId += 1
-                products.append(product)
-                self.dbManager.addProduct(url, title)
-                print(f"Scraped: {title}")
-        except requests.RequestException as e:
+            with self.openHttpCache() as httpCache:
+                content = self.fetchEngine.fetchOne(url, cache=httpCache)
+            if session.htmlArchive is None:
+                # a page scraped on its own goes into the archive too
+                with self.openHtmlArchive() as htmlArchive:
+                    if htmlArchive is not None:
+                        htmlArchive.store(url, content)
+            product = self.processProductPage(url, content, session, position)
+            self.dbWriter.flush()
+            return product
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
             print(f"Request error for {url}: {e}")
         except Exception as e:
             print(f"Error scraping {url}: {e}")
 
-    def scrapeEbayStore(self, url):
+    # One item page, fetched and parsed the same way scrapeProductDetails does it, but nothing is recorded.
+    # For re-checking items we already have (PriceMonitor); availability follows isAvailable.
+    def checkListing(self, url):
+        with self.openHttpCache() as httpCache:
+            return self.productParser.parse(self.fetchEngine.fetchOne(url, cache=httpCache))
+
+    async def scrapeProductDetailsAsync(self, client, url, session, position):
         try:
-            response = self.session.get(url)
-            soup = BeautifulSoup(response.content, 'html.parser')
-            productLinks = soup.find_all('a', class_='s-item__link')
-
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = {executor.submit(self.scrapeProductDetails, link['href']): link for link in
-                           productLinks[:100]}
-                for future in as_completed(futures):
-                    try:
-                        future.result()  # Retrieve the result to raise any exceptions
-                    except Exception as e:
-                        print(f"Error in scraping task: {e}")
+            content = await client.fetch(url)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.parseExecutor, self.processProductPage, url, content, session, position)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Request error for {url}: {e}")
         except Exception as e:
-            print(f"Error scraping eBay store: {e}")
+            print(f"Error scraping {url}: {e}")
 
-        self.downloadImagesSynchronously()
+    def processProductPage(self, url, content, session, position=None):
+        # archived before parsing, so a page the parser chokes on can be looked at later
+        if session.htmlArchive is not None:
+            session.htmlArchive.store(url, content)
+        details = self.productParser.parse(content)
 
-    def downloadImagesSynchronously(self):
-        threads = []
-        for product in products:
-            thread = threading.Thread(target=self.downloadImages, args=(product,))
-            threads.append(thread)
-            thread.start()
-        for thread in threads:
-            thread.join()
+        # re-scrape: an item we already listed is only compared with what we stored for it last time
+        itemId = Utils.getItemId(url)
+        if session.delta is not None and session.delta.isKnown(itemId):
+            session.delta.observe(itemId, url, details, self.calculateFinalPrice)
+            return None
 
-    def downloadImages(self, product):
-        productIndex = products.index(product)
+        # rejected products never get a batch slot, a product row or an image download, and the next run
+        # doesn't fetch them again
+        rejectedBy = session.filters.rejectedBy(details) if session.filters is not None else None
+        if rejectedBy is not None:
+            self.dbWriter.markRejected(url, rejectedBy.key)
+            return None
 
-        # only do 50 products before starting the next batch (fb has a 50 product limit for CSV uploads)
-        if productIndex % 50 == 0 and productIndex > 0:
-            self.batchNumber += 1
+        title = details.title
+        price = self.calculateFinalPrice(details.price) if details.price is not None else None
+        images = Utils.resizeEbayImageUrls(details.images, int(self.settingsManager.settings.get('imageSize', defaultImageSize)))
+        productAlreadyInDb = self.dbManager.productAlreadyExistsInDatabase(url, title)
 
-        batchNumber = self.batchNumber
-        productFolder = os.path.join(self.settingsManager.getBaseDir(), f"Products Directory {batchNumber}", str(productIndex + 1))
+        # if valid title, price, image(s) and not in db already
+        # (meaning the product was added on a previous run of the app): include these products.
+        if title and price and images and not productAlreadyInDb:
+            product = Product(title, price, images)
+            session.addProduct(product, position)
+            # written by the writer thread, this worker doesn't wait on SQLite
+            self.dbWriter.markSeen(url, title, details.price, details.available, listingFingerprint(details))
+            print(f"Scraped: {title}")
+            return product
+
+    def parseStorePage(self, content, pageUrl):
+        soup = BeautifulSoup(content, 'html.parser')
+        productLinks = [link['href'] for link in soup.find_all('a', class_='s-item__link') if link.get('href')]
+        nextLink = soup.find('a', class_='pagination__next')
+        nextUrl = urljoin(pageUrl, nextLink['href']) if nextLink and nextLink.get('href') else None
+        return productLinks, nextUrl
+
+    # Walks the store's pagination and hands out product links as soon as each page is parsed.
+    # The next page is already downloading while the caller works through the current page's links.
+    # Links are normalized to their item URL, and items in knownItemIds or rejectedItemIds are dropped here so
+    # they never cost a fetch.
+    async def crawlStoreLinks(self, client, url, session, knownItemIds=frozenset(), rejectedItemIds=frozenset()):
+        maxPages = int(self.settingsManager.settings.get('maxStorePages', defaultMaxStorePages))
+        maxItems = int(self.settingsManager.settings.get('maxStoreItems', defaultMaxStoreItems))
+        loop = asyncio.get_running_loop()
+        visitedPages = {url}
+        seenLinks = set()
+        pageUrl = url
+        storePageTtl = float(self.settingsManager.settings.get('storePageTtl', defaultStorePageTtl))
+        nextPage = asyncio.create_task(client.fetch(url, storePageTtl))
+        try:
+            while nextPage:
+                try:
+                    content = await nextPage
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if len(visitedPages) == 1:
+                        raise
+                    print(f"Stopping pagination, could not fetch {pageUrl}: {e}")
+                    return
+                productLinks, nextUrl = await loop.run_in_executor(self.parseExecutor, self.parseStorePage, content, pageUrl)
+
+                nextPage = None
+                if nextUrl and nextUrl not in visitedPages and len(visitedPages) < maxPages:
+                    visitedPages.add(nextUrl)
+                    pageUrl = nextUrl
+                    nextPage = asyncio.create_task(client.fetch(nextUrl, storePageTtl))
+
+                for link in productLinks:
+                    itemId = Utils.getItemId(link)
+                    if itemId in knownItemIds:
+                        session.addSkippedItem(itemId)
+                        continue
+                    if itemId in rejectedItemIds:
+                        session.addSkippedRejectedItem(itemId)
+                        continue
+                    link = Utils.canonicalItemUrl(link)
+                    if link in seenLinks:
+                        continue
+                    seenLinks.add(link)
+                    yield link
+                    if len(seenLinks) >= maxItems:
+                        return
+        finally:
+            if nextPage and not nextPage.done():
+                nextPage.cancel()
+
+    # Returns the run's ScrapeSession. Nothing about the run is kept on the Scraper, so several stores can be
+    # scraped at once from different threads and the caller decides when to release the results.
+    # With rescrape, items we already have are fetched again instead of skipped, and session.delta says which
+    # of them changed price or went in/out of stock. New items still come back as the session's products.
+    # Pages, images and (given a csvManager) the export all run at once through a ScrapePipeline; without a
+    # csvManager the caller exports session.products with session.batchPlan afterwards.
+    def scrapeEbayStore(self, url, rescrape=False, csvManager=None):
+        session = ScrapeSession(url, self.buildFilterChain())
+        if rescrape:
+            session.delta = ListingDelta(self.dbManager.getListingStates())
+        # batches are numbered as the pipeline opens them, products are placed in listing order
+        session.batchPlan = BatchPlan(allocateBatch=self.batchAllocator.nextBatch)
+        with self.openImageCache() as imageCache, self.openHtmlArchive() as htmlArchive, \
+                self.openHttpCache() as httpCache, self.openImageProcessor() as imageProcessor:
+            session.htmlArchive = htmlArchive
+            try:
+                asyncio.run(ScrapePipeline(self, session, imageCache, csvManager, httpCache, imageProcessor).run(url))
+            except Exception as e:
+                print(f"Error scraping eBay store: {e}")
+            finally:
+                # the next run's known-item check has to see everything this one found
+                self.dbWriter.flush()
+                self.dbManager.touchItems(session.skippedItemIds)
+                if session.delta is not None:
+                    self.dbManager.updateListings(session.delta.observations)
+                    print(f"Re-scrape: {session.delta}")
+                print(self.rateLimiter.report())
+                print(f"Database writer: {self.dbWriter.queueDepth} queued, last commit took "
+                      f"{self.dbWriter.lastFlushLatency * 1000:.1f}ms (max {self.dbWriter.maxFlushLatency * 1000:.1f}ms)")
+        return session
+
+    # Optional: resize, recompress and strip EXIF so the Selenium upload has less to push. The pipeline runs it
+    # on each product's images as they're downloaded, so a batch is exported with its final files.
+    # Off unless processImages is set, then it's a do-nothing context. Imported here so only runs with
+    # processImages on need Pillow installed.
+    def openImageProcessor(self):
+        settings = self.settingsManager.settings
+        if not settings.get('processImages', defaultProcessImages):
+            return contextlib.nullcontext()
+        from ImageProcessor import ImageProcessor
+        return ImageProcessor(maxDimension=int(settings.get('imageMaxDimension', defaultImageMaxDimension)),
+                              quality=int(settings.get('imageQuality', defaultImageQuality)))
+
+    # The cache lives next to the batch folders (unless imageCacheDir says otherwise) and persists between runs
+    def openImageCache(self):
+        cacheDir = self.settingsManager.settings.get('imageCacheDir') or os.path.join(self.settingsManager.getBaseDir(), "Image Cache")
+        maxBytes = int(self.settingsManager.settings.get('imageCacheMaxBytes', defaultImageCacheMaxBytes))
+        return ImageCache(cacheDir, maxBytes)
+
+    # Store and item pages with their validators (images have their own cache), next to the batch folders unless
+    # httpCacheDir says otherwise. Opened per run like the image cache, so a changed base folder is picked up.
+    # A cache that can't be opened only costs us the cache, the run goes on fetching everything.
+    def openHttpCache(self):
+        settings = self.settingsManager.settings
+        if not settings.get('httpCache', defaultHttpCache):
+            return contextlib.nullcontext()
+        cacheDir = settings.get('httpCacheDir') or os.path.join(self.settingsManager.getBaseDir(), "HTTP Cache")
+        try:
+            return HttpCache(cacheDir, int(settings.get('httpCacheMaxBytes', defaultHttpCacheMaxBytes)))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Error opening the HTTP cache in {cacheDir}, fetching without it: {e}")
+            return contextlib.nullcontext()
+
+    # Raw item pages for HtmlArchive.reparse, next to the batch folders unless htmlArchiveDir says otherwise.
+    # Off unless archiveHtml is set, then it's a do-nothing context.
+    def openHtmlArchive(self):
+        settings = self.settingsManager.settings
+        if not settings.get('archiveHtml', defaultArchiveHtml):
+            return contextlib.nullcontext()
+        archiveDir = settings.get('htmlArchiveDir') or os.path.join(self.settingsManager.getBaseDir(), "HTML Archive")
+        return HtmlArchive(archiveDir, int(settings.get('htmlArchiveMaxBytes', defaultHtmlArchiveMaxBytes)),
+                           settings.get('htmlArchiveCompression', defaultHtmlArchiveCompression))
+
+    def getImageDownloads(self, batchPlan, product):
+        productFolder = batchPlan.productFolder(self.settingsManager.getBaseDir(), product)
         if not os.path.exists(productFolder):
             os.makedirs(productFolder)
-        for index, url in enumerate(product.images, start=1):
-            try:
-                response = requests.get(url)
-                fileName = f"{index}_{os.path.basename(url)}"
-                filePath = os.path.join(productFolder, fileName)
-                with open(filePath, 'wb') as file:
-                    file.write(response.content)
-                print(f"Downloaded {fileName} for product {product.title}")
-            except requests.exceptions.RequestException as e:
-                print(f"Error downloading image from {url}: {e}")
+        return [(url, os.path.join(productFolder, f"{index}_{os.path.basename(url)}"))
+                for index, url in enumerate(product.images, start=1)]
 
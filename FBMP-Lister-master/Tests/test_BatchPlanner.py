@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from BatchPlanner import BatchAllocator, BatchPlan, readManifest, writeManifest
+from DatabaseManager import DatabaseManager
+from Product import Product
+
+class TestBatchPlanner(unittest.TestCase):
+
+    def setUp(self):
+        self.products = [Product(f"Product {i}", 10.0, []) for i in range(120)]
+
+    def test_slotFor_fiftyPerBatch(self):
+        plan = BatchPlan(self.products, firstBatch=3)
+
+        self.assertEqual(plan.slotFor(self.products[0]), (3, 0, '1'))
+        self.assertEqual(plan.slotFor(self.products[49]), (3, 49, '50'))
+        self.assertEqual(plan.slotFor(self.products[50]), (4, 0, '51'))
+        self.assertEqual(plan.slotFor(self.products[119]), (5, 19, '120'))
+        self.assertEqual(plan.batches, [3, 4, 5])
+
+    def test_samePlanEveryTime(self):
+        first = BatchPlan(self.products, firstBatch=1)
+        second = BatchPlan(self.products, firstBatch=1)
+
+        self.assertEqual([first.slotFor(p) for p in self.products], [second.slotFor(p) for p in self.products])
+
+    def test_add_allocatesBatchesAsTheyOpen(self):
+        batchNumbers = iter([7, 12, 13])
+        plan = BatchPlan(allocateBatch=lambda: next(batchNumbers))
+
+        slots = [plan.add(product) for product in self.products]
+
+        self.assertEqual(slots[0], (7, 0, '1'))
+        self.assertEqual(slots[50], (12, 0, '51'))
+        self.assertEqual(slots[119], (13, 19, '120'))
+        self.assertEqual(plan.batches, [7, 12, 13])
+
+    def test_paths(self):
+        plan = BatchPlan(self.products, firstBatch=1)
+
+        self.assertEqual(plan.productFolder('base', self.products[51]), os.path.join('base', 'Products Directory 2', '52'))
+        self.assertEqual(plan.csvPath('base', 2), os.path.join('base', 'Products Directory 2', 'Products2.csv'))
+
+    def test_manifest(self):
+        baseDir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, baseDir)
+        plan = BatchPlan(self.products, firstBatch=1)
+        plan.setImageFiles(self.products[50], ['1_s-l1600.jpg', '2_s-l1600.jpg'])
+        os.makedirs(plan.batchDirectory(baseDir, 2))
+
+        writeManifest(plan, baseDir, 2, self.products[50:100], plan.csvPath(baseDir, 2))
+
+        manifest = readManifest(plan.batchDirectory(baseDir, 2))
+        self.assertEqual(manifest['file'], 'Products2.csv')
+        self.assertEqual(manifest['products'][0], {'row': 0, 'title': 'Product 50', 'price': 10.0, 'folder': '51',
+                                                   'images': ['1_s-l1600.jpg', '2_s-l1600.jpg']})
+        self.assertEqual(manifest['products'][49]['images'], [])
+
+
+class TestBatchAllocator(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.baseDir = os.path.join(self.tempDir, 'Products')
+        os.makedirs(os.path.join(self.baseDir, 'Products Directory 4'))
+        self.settingsManager = Mock()
+        self.settingsManager.getBaseDir.return_value = self.baseDir
+        self.dbManager = DatabaseManager(os.path.join(self.tempDir, 'products.db'))
+        self.allocator = BatchAllocator(self.dbManager, self.settingsManager)
+
+    def tearDown(self):
+        self.dbManager.close()
+        shutil.rmtree(self.tempDir)
+
+    def test_allocate_carriesOnAfterExistingFolders(self):
+        self.assertEqual(self.allocator.allocate(120), 5)  # batches 5, 6 and 7
+        self.assertEqual(self.allocator.allocate(1), 8)
+
+    def test_allocate_scansOnlyOnce(self):
+        self.allocator.allocate(1)
+        os.makedirs(os.path.join(self.baseDir, 'Products Directory 40'))
+
+        # the database has the numbering now, folders made by hand don't move it
+        self.assertEqual(self.allocator.allocate(1), 6)
+
+if __name__ == '__main__':
+    unittest.main()
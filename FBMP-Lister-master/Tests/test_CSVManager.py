@@ -0,0 +1,111 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import CSVManager as CSVManagerModule
+from BatchPlanner import BatchPlan, readManifest
+from CSVManager import CSVManager
+from Product import Product
+
+
+def readCsv(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+
+class TestCSVManager(unittest.TestCase):
+
+    def setUp(self):
+        self.baseDir = tempfile.mkdtemp()
+        self.settingsManager = Mock()
+        self.settingsManager.settings = {'baseDir': self.baseDir,
+                                         'csvHeaders': {'CONDITION': 'New', 'OFFER FREE SHIPPING': 'Yes'}}
+        self.settingsManager.getBaseDir.return_value = self.baseDir
+        self.csvManager = CSVManager(self.settingsManager)
+        self.products = [Product(f"Product {i}", float(i), []) for i in range(120)]
+
+    def tearDown(self):
+        shutil.rmtree(self.baseDir)
+
+    def test_saveProducts_batches(self):
+        batchPlan = BatchPlan(self.products, 3)
+
+        self.csvManager.saveProducts(self.products, batchPlan)
+
+        for batch, expected in [(3, range(0, 50)), (4, range(50, 100)), (5, range(100, 120))]:
+            rows = readCsv(batchPlan.csvPath(self.baseDir, batch))
+            self.assertEqual([row['TITLE'] for row in rows], [f"Product {i}" for i in expected])
+            self.assertEqual(rows[0]['CONDITION'], 'New')
+            self.assertEqual(list(rows[0].keys()), ['TITLE', 'PRICE', 'CONDITION', 'OFFER FREE SHIPPING'])
+            self.assertFalse([name for name in os.listdir(batchPlan.batchDirectory(self.baseDir, batch)) if name.endswith('.tmp')])
+
+    def test_saveProducts_writesManifest(self):
+        batchPlan = BatchPlan(self.products, 1)
+        batchPlan.setImageFiles(self.products[60], ['1_s-l1600.jpg'])
+
+        self.csvManager.saveProducts(self.products, batchPlan)
+
+        manifest = readManifest(batchPlan.batchDirectory(self.baseDir, 2))
+        self.assertEqual(manifest['batch'], 2)
+        self.assertEqual(manifest['file'], 'Products2.csv')
+        self.assertEqual(manifest['products'][10], {'row': 10, 'title': 'Product 60', 'price': 60.0, 'folder': '61',
+                                                    'images': ['1_s-l1600.jpg']})
+
+    def test_saveProducts_withoutPlanUsesAllocator(self):
+        allocator = Mock()
+        allocator.allocate.return_value = 9
+        csvManager = CSVManager(self.settingsManager, allocator)
+
+        csvManager.saveProducts(self.products[:60])
+
+        allocator.allocate.assert_called_once_with(60)
+        self.assertTrue(os.path.isfile(os.path.join(self.baseDir, 'Products Directory 10', 'Products10.csv')))
+
+    def test_saveProducts_keepsExistingRows(self):
+        batchPlan = BatchPlan(self.products[:2], 1)
+        self.csvManager.saveProducts(self.products[:1], batchPlan)
+
+        self.csvManager.saveProducts(self.products[1:2], batchPlan)
+
+        rows = readCsv(batchPlan.csvPath(self.baseDir, 1))
+        self.assertEqual([row['TITLE'] for row in rows], ["Product 0", "Product 1"])
+
+    def test_writeProductsToCsv_failureLeavesFileUntouched(self):
+        csvFile = os.path.join(self.baseDir, 'Products1.csv')
+        self.csvManager.writeProductsToCsv(csvFile, self.products[:1])
+
+        with patch.object(self.csvManager, 'productRows', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.csvManager.writeProductsToCsv(csvFile, self.products[1:3])
+
+        self.assertEqual([row['TITLE'] for row in readCsv(csvFile)], ["Product 0"])
+        self.assertEqual(os.listdir(self.baseDir), ['Products1.csv'])
+
+    @unittest.skipUnless(CSVManagerModule.Workbook, "openpyxl is not installed")
+    def test_saveProducts_xlsx(self):
+        self.settingsManager.settings['exportFormat'] = 'xlsx'
+        batchPlan = BatchPlan(self.products, 1)
+
+        self.csvManager.saveProducts(self.products, batchPlan)
+        lateAddition = Product("Late addition", 1.0, [])
+        self.csvManager.saveProducts([lateAddition], BatchPlan([lateAddition], 3))
+
+        workbook = CSVManagerModule.load_workbook(batchPlan.exportPath(self.baseDir, 3, '.xlsx'), read_only=True)
+        rows = list(workbook.worksheets[0].iter_rows(values_only=True))
+        workbook.close()
+        self.assertEqual(rows[0], ('TITLE', 'PRICE', 'CONDITION', 'OFFER FREE SHIPPING'))
+        self.assertEqual(len(rows), 1 + 20 + 1)  # header, the batch's 20 products, then the appended one
+        self.assertEqual(rows[1], ('Product 100', 100, 'New', 'Yes'))
+        self.assertEqual(rows[-1][0], 'Late addition')
+        self.assertFalse(os.path.exists(batchPlan.csvPath(self.baseDir, 1)))
+
+    def test_getExporter_fallsBackToCsv(self):
+        self.assertIsInstance(CSVManagerModule.getExporter('pdf'), CSVManagerModule.CsvExporter)
+        with patch.object(CSVManagerModule, 'Workbook', None):
+            self.assertIsInstance(CSVManagerModule.getExporter('xlsx'), CSVManagerModule.CsvExporter)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,39 +1,43 @@
+import os
+import shutil
+import tempfile
 import unittest
 import sqlite3
 from unittest.mock import patch
 
 from DatabaseManager import DatabaseManager
+from DatabaseMigrations import migrations
 
 class TestDatabaseManager(unittest.TestCase):
 
     def setUp(self):
-        self.db_manager = DatabaseManager(dbPath='test_products.db')
+        # A fresh database file for every test
+        self.tempDir = tempfile.mkdtemp()
+        self.dbPath = os.path.join(self.tempDir, 'test_products.db')
+        self.db_manager = DatabaseManager(dbPath=self.dbPath)
         self.initialize_test_db()
 
     def tearDown(self):
-        # Clean up the test database file after each test
-        conn = sqlite3.connect('test_products.db')
-        c = conn.cursor()
-        c.execute("DROP TABLE IF EXISTS products")
-        conn.commit()
-        conn.close()
+        self.db_manager.close()
+        shutil.rmtree(self.tempDir)
 
     def initialize_test_db(self):
         # Initialize the test database with a products table
-        with sqlite3.connect('test_products.db') as conn:
+        with sqlite3.connect(self.dbPath) as conn:
             cursor = conn.cursor()
             cursor.execute('''CREATE TABLE IF NOT EXISTS products (
                                 id INTEGER PRIMARY KEY,
                                 url TEXT UNIQUE,
                                 title TEXT
                               )''')
+        conn.close()
 
     def test_addProduct(self):
         # Add a product to the database
         self.db_manager.addProduct('https://www.example.com/product1', 'Product 1')
 
         # Verify that the product was added by checking if it exists in the database
-        conn = sqlite3.connect('test_products.db')
+        conn = sqlite3.connect(self.dbPath)
         c = conn.cursor()
         c.execute("SELECT * FROM products WHERE url=? AND title=?", ('https://www.example.com/product1', 'Product 1'))
         result = c.fetchone()
@@ -61,5 +65,152 @@ class TestDatabaseManager(unittest.TestCase):
         # Verify that the print function is called with the appropriate message for existing URL
         mock_print.assert_called_once_with("Product with URL https://www.example.com/product3 already exists.")
 
+    def test_addProducts(self):
+        added = self.db_manager.addProducts([('https://www.example.com/product5', 'Product 5'),
+                                             ('https://www.example.com/product6', 'Product 6'),
+                                             ('https://www.example.com/product5', 'Product 5 Duplicate')])
+
+        self.assertEqual(added, 2)
+        self.assertTrue(self.db_manager.productAlreadyExistsInDatabase('https://www.example.com/product6', 'Product 6'))
+
+    def test_bufferProduct_writtenOnFlush(self):
+        self.db_manager.flushInterval = 60
+        self.db_manager.bufferProduct('https://www.example.com/product7', 'Product 7')
+
+        # still buffered: not on disk yet, but already counts as known
+        conn = sqlite3.connect(self.dbPath)
+        self.assertIsNone(conn.execute("SELECT 1 FROM products WHERE url=?", ('https://www.example.com/product7',)).fetchone())
+        self.assertTrue(self.db_manager.productAlreadyExistsInDatabase('https://www.example.com/product7', 'Product 7'))
+
+        self.db_manager.flushProducts()
+        self.assertIsNotNone(conn.execute("SELECT 1 FROM products WHERE url=?", ('https://www.example.com/product7',)).fetchone())
+        conn.close()
+
+    def test_bufferProduct_flushesAtBatchSize(self):
+        self.db_manager.batchSize = 3
+        self.db_manager.flushInterval = 60
+        for i in range(3):
+            self.db_manager.bufferProduct(f'https://www.example.com/batch{i}', f'Batch {i}')
+
+        self.assertEqual(self.db_manager.pendingProducts, [])
+
+    def test_getKnownItemIds(self):
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489312007?hash=item3bb', 'Water Bottle')
+        self.db_manager.addProduct('https://www.ebay.com/itm/T-Shirt-Pack/256489318844', 'T-Shirt')
+        self.db_manager.addProduct('https://www.example.com/product4', 'Product 4')
+
+        knownItemIds = self.db_manager.getKnownItemIds()
+        self.assertIn(256489312007, knownItemIds)
+        self.assertIn(256489318844, knownItemIds)
+        self.assertNotIn(256489310000, knownItemIds)
+
+    def test_knownItems_loadedAtStartup(self):
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489312007?hash=item3bb', 'Water Bottle')
+
+        reopened = DatabaseManager(dbPath=self.dbPath)
+
+        # any URL for the same item counts, no matter the tracking parameters
+        self.assertTrue(reopened.productAlreadyExistsInDatabase('https://www.ebay.com/itm/Water-Bottle/256489312007', 'Water Bottle'))
+        self.assertFalse(reopened.productAlreadyExistsInDatabase('https://www.ebay.com/itm/256489318844', 'T-Shirt'))
+        reopened.close()
+
+    def test_addProduct_sameItemDifferentUrl(self):
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489312007?hash=item3bb', 'Water Bottle', 24.99)
+        with patch('builtins.print') as mock_print:
+            self.db_manager.addProduct('https://www.ebay.com/itm/256489312007?_trksid=p2', 'Water Bottle')
+        mock_print.assert_called_once_with("Product with URL https://www.ebay.com/itm/256489312007?_trksid=p2 already exists.")
+
+        conn = sqlite3.connect(self.dbPath)
+        itemId, price, firstSeen = conn.execute("SELECT item_id, last_price, first_seen FROM products").fetchone()
+        conn.close()
+        self.assertEqual((itemId, price), (256489312007, 24.99))
+        self.assertIsNotNone(firstSeen)
+
+    def test_touchItems(self):
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489312007', 'Water Bottle')
+        self.db_manager.conn.execute("UPDATE products SET last_seen=0")
+
+        self.db_manager.touchItems([256489312007])
+
+        lastSeen = self.db_manager.conn.execute("SELECT last_seen FROM products").fetchone()[0]
+        self.assertGreater(lastSeen, 0)
+
+    def test_getListingStates(self):
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489312007', 'Water Bottle', 24.99, True, 'abc123')
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489318844', 'T-Shirt')
+        self.db_manager.addProduct('https://www.example.com/product1', 'Product 1', 5.0, True, 'def456')
+
+        states = self.db_manager.getListingStates()
+
+        self.assertEqual(states[256489312007], (24.99, True, 'abc123'))
+        self.assertEqual(states[256489318844], (None, None, None))
+        self.assertEqual(len(states), 2)  # rows without an item ID can't be re-scraped by item
+
+    def test_updateListings(self):
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489312007', 'Water Bottle', 24.99, True, 'abc123')
+
+        self.db_manager.updateListings([(21.50, False, 'fff000', 256489312007)])
+
+        self.assertEqual(self.db_manager.getListingStates()[256489312007], (21.50, False, 'fff000'))
+
+    def test_monitorSchedule(self):
+        self.db_manager.addProduct('https://www.ebay.com/itm/256489312007', 'Water Bottle', 24.99, True, 'abc123')
+
+        self.db_manager.updateSchedule([(900.0, 1000.0, 256489312007)])
+
+        self.assertEqual(self.db_manager.getMonitoredItems(),
+                         [(256489312007, 'https://www.ebay.com/itm/256489312007', 24.99, True, 'abc123', 900.0, 1000.0)])
+
+    def test_allocateBatches(self):
+        self.assertIsNone(self.db_manager.lastAllocatedBatch())
+
+        self.assertEqual(self.db_manager.allocateBatches(3, '/base', firstFree=4), 4)
+        self.assertEqual(self.db_manager.allocateBatches(1, '/base', firstFree=1), 7)
+        self.assertEqual(self.db_manager.allocateBatches(0, '/base'), 8)  # nothing reserved
+        self.assertEqual(self.db_manager.lastAllocatedBatch(), 7)
+
+
+class TestDatabaseMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.dbPath = os.path.join(self.tempDir, 'products.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def test_migrate_legacyDatabase(self):
+        # products.db as the app created it before migrations existed, with one item stored twice
+        with sqlite3.connect(self.dbPath) as conn:
+            conn.execute("CREATE TABLE products (id INTEGER PRIMARY KEY, url TEXT UNIQUE, title TEXT)")
+            conn.executemany("INSERT INTO products (url, title) VALUES (?, ?)", [
+                ('https://www.ebay.com/itm/256489312007?hash=item3bb', 'Water Bottle'),
+                ('https://www.ebay.com/itm/Water-Bottle/256489312007?_trksid=p2', 'Water Bottle'),
+                ('https://www.example.com/product1', 'Product 1'),
+            ])
+        conn.close()
+
+        dbManager = DatabaseManager(self.dbPath)
+
+        self.assertEqual(dbManager.conn.execute("PRAGMA user_version").fetchone()[0], len(migrations))
+        itemIds = [row[0] for row in dbManager.conn.execute("SELECT item_id FROM products ORDER BY id")]
+        self.assertEqual(itemIds, [256489312007, None, None])
+        self.assertIn(256489312007, dbManager.getKnownItemIds())
+        self.assertTrue(dbManager.productAlreadyExistsInDatabase('https://www.example.com/product1', 'Product 1'))
+        with self.assertRaises(sqlite3.IntegrityError):
+            dbManager.conn.execute("UPDATE products SET item_id=256489312007 WHERE id=2")
+        dbManager.close()
+
+    def test_migrate_onlyPendingMigrations(self):
+        DatabaseManager(self.dbPath).close()
+
+        with patch('DatabaseManager.migrations', migrations + [lambda conn: conn.execute("ALTER TABLE products ADD COLUMN note TEXT")]):
+            dbManager = DatabaseManager(self.dbPath)
+
+        columns = [row[1] for row in dbManager.conn.execute("PRAGMA table_info(products)")]
+        self.assertIn('note', columns)
+        self.assertEqual(dbManager.conn.execute("PRAGMA user_version").fetchone()[0], len(migrations) + 1)
+        dbManager.close()
+
 if __name__ == '__main__':
     unittest.main()
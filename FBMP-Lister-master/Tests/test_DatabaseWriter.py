@@ -0,0 +1,79 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from DatabaseManager import DatabaseManager
+from DatabaseWriter import DatabaseWriter
+
+class TestDatabaseWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.dbPath = os.path.join(self.tempDir, 'products.db')
+        self.dbManager = DatabaseManager(self.dbPath, batchSize=10, flushInterval=60)
+        self.writer = DatabaseWriter(self.dbManager)
+
+    def tearDown(self):
+        self.writer.close()
+        self.dbManager.close()
+        shutil.rmtree(self.tempDir)
+
+    def countRows(self):
+        conn = sqlite3.connect(self.dbPath)
+        count = conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        conn.close()
+        return count
+
+    def test_flush_waitsForQueuedRecords(self):
+        for i in range(25):
+            self.writer.markSeen(f'https://www.ebay.com/itm/{300000000000 + i}', f'Product {i}')
+
+        self.writer.flush()
+
+        self.assertEqual(self.countRows(), 25)
+        self.assertEqual(self.writer.queueDepth, 0)
+        self.assertGreater(self.writer.maxFlushLatency, 0)
+
+    def test_close_writesEverything(self):
+        for i in range(5):
+            self.writer.markSeen(f'https://www.ebay.com/itm/{300000000000 + i}', f'Product {i}')
+
+        self.writer.close()
+
+        self.assertEqual(self.countRows(), 5)
+        with self.assertRaises(RuntimeError):
+            self.writer.markSeen('https://www.ebay.com/itm/300000000099', 'Too late')
+
+    def test_markRejected_skippedWhileTheSameFilterIsOn(self):
+        self.writer.markRejected('https://www.ebay.com/itm/300000000001?_trksid=p2', 'variations')
+        self.writer.markRejected('https://www.ebay.com/itm/300000000002', 'price range 5.0-None')
+        self.writer.markRejected('https://www.example.com/product1', 'variations')  # no item ID, not kept
+        self.writer.flush()
+
+        self.assertEqual(self.countRows(), 0)
+        rejected = self.dbManager.getRejectedItemIds(['variations', 'price range 10.0-None'])
+        self.assertIn(300000000001, rejected)
+        self.assertNotIn(300000000002, rejected)  # the price range has changed since
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(len(self.dbManager.getRejectedItemIds(['variations'], since=time.time() + 60)), 0)
+        self.assertEqual(len(self.dbManager.getRejectedItemIds([])), 0)
+
+    def test_clearStaleRejections_forgetsOldSettings(self):
+        self.writer.markRejected('https://www.ebay.com/itm/300000000001', 'availability')  # from before the threshold
+        self.writer.markRejected('https://www.ebay.com/itm/300000000002', 'availability 11')
+        self.writer.markRejected('https://www.ebay.com/itm/300000000003', 'availability 5')
+        self.writer.markRejected('https://www.ebay.com/itm/300000000004', 'variations')
+        self.writer.flush()
+
+        self.dbManager.clearStaleRejections({'availability': 'availability 5', 'variations': 'variations'})
+
+        rejected = self.dbManager.getRejectedItemIds(['availability', 'availability 11', 'availability 5', 'variations'])
+        self.assertEqual(len(rejected), 2)
+        self.assertIn(300000000003, rejected)
+        self.assertIn(300000000004, rejected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import aiohttp
+from aiohttp import web
+
+from FetchEngine import FetchEngine
+
+
+class TestFetchEngine(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.statuses = []  # answered in order before the page, one per request
+        self.requests = 0
+        self.inFlight = {}  # Host header -> requests being answered right now
+        self.maxInFlight = {}
+        self.maxTotalInFlight = 0
+
+        async def page(request):
+            self.requests += 1
+            if self.statuses:
+                return web.Response(status=self.statuses.pop(0))
+            return web.Response(body=b'<html>item</html>')
+
+        async def slow(request):
+            host = request.host.split(':')[0]
+            self.inFlight[host] = self.inFlight.get(host, 0) + 1
+            self.maxInFlight[host] = max(self.maxInFlight.get(host, 0), self.inFlight[host])
+            self.maxTotalInFlight = max(self.maxTotalInFlight, sum(self.inFlight.values()))
+            await asyncio.sleep(0.1)
+            self.inFlight[host] -= 1
+            return web.Response(body=b'slow')
+
+        app = web.Application()
+        app.router.add_get('/itm/1', page)
+        app.router.add_get('/slow/{index}', slow)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}/itm/1"
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def fetch(self, engine, url=None):
+        async with engine.connect() as client:
+            return await client.fetch(url or self.url)
+
+    async def test_fetch_retriesServerErrorsWithBackoff(self):
+        self.statuses = [500, 429, 503]
+
+        with patch('FetchEngine.asyncio.sleep', new_callable=AsyncMock) as mockSleep:
+            body = await self.fetch(FetchEngine(backoffFactor=0.5))
+
+        self.assertEqual(body, b'<html>item</html>')
+        self.assertEqual(self.requests, 4)
+        self.assertEqual([call.args[0] for call in mockSleep.await_args_list], [0.5, 1.0, 2.0])
+
+    async def test_fetch_raisesOnceRetriesRunOut(self):
+        self.statuses = [503] * 10
+
+        with patch('FetchEngine.asyncio.sleep', new_callable=AsyncMock):
+            with self.assertRaises(aiohttp.ClientResponseError) as raised:
+                await self.fetch(FetchEngine(retries=2))
+
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(self.requests, 3)
+
+    async def test_fetch_doesNotRetryClientErrors(self):
+        self.statuses = [404]
+
+        with self.assertRaises(aiohttp.ClientResponseError) as raised:
+            await self.fetch(FetchEngine())
+
+        self.assertEqual(raised.exception.status, 404)
+        self.assertEqual(self.requests, 1)
+
+    async def test_fetch_retriesConnectionErrors(self):
+        await self.runner.cleanup()  # nothing listening any more
+
+        with patch('FetchEngine.asyncio.sleep', new_callable=AsyncMock) as mockSleep:
+            with self.assertRaises(aiohttp.ClientConnectionError):
+                await self.fetch(FetchEngine(retries=3))
+
+        self.assertEqual(mockSleep.await_count, 3)
+
+    async def test_connect_limitsRequestsInFlight(self):
+        # the same server under two host names, so the per-host limit and the overall one both come into play
+        urls = [f"http://{host}:{self.port}/slow/{index}" for host in ('127.0.0.1', 'localhost') for index in range(12)]
+
+        async with FetchEngine(maxConcurrency=6, maxPerHost=4).connect() as client:
+            bodies = await asyncio.gather(*(client.fetch(url) for url in urls))
+
+        self.assertEqual(bodies, [b'slow'] * len(urls))
+        # how the 6 are split between the hosts after the first 4 depends on which answers come back first
+        self.assertEqual(self.maxInFlight['127.0.0.1'], 4)
+        self.assertLessEqual(self.maxInFlight['localhost'], 4)
+        self.assertEqual(self.maxTotalInFlight, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
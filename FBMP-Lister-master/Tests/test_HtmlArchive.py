@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import HtmlArchive
+
+fixturesDir = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def readFixture(name):
+    with open(os.path.join(fixturesDir, name), 'rb') as file:
+        return file.read()
+
+
+class TestHtmlArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.archiveDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.archiveDir)
+
+    def test_store_newestCopyByItemId(self):
+        with HtmlArchive.HtmlArchive(self.archiveDir, compression='gzip') as archive:
+            archive.store('https://www.ebay.com/itm/256489312007', b'<html>old</html>', fetched=100.0)
+            archive.store('https://www.ebay.com/itm/256489312007?_trksid=p2', b'<html>new</html>', fetched=200.0)
+
+        with HtmlArchive.HtmlArchive(self.archiveDir, compression='gzip') as archive:
+            self.assertEqual(archive.get(256489312007), b'<html>new</html>')
+            self.assertEqual([fetched for fetched, _ in archive.history(256489312007)], [100.0, 200.0])
+            self.assertIsNone(archive.get(256489318844))
+            self.assertEqual(len(archive), 2)
+
+    def test_evict_oldestSegmentsFirst(self):
+        page = readFixture('ebay_item.html')
+        with HtmlArchive.HtmlArchive(self.archiveDir, maxBytes=1, compression='gzip', segmentBytes=1) as archive:
+            for index in range(3):
+                archive.store(f'https://www.ebay.com/itm/25648931200{index}', page, fetched=float(index))
+
+            # every page filled a segment, only the newest is left
+            self.assertEqual(len(archive), 1)
+            self.assertIsNotNone(archive.get(256489312002))
+        self.assertEqual(sorted(name for name in os.listdir(self.archiveDir) if name.startswith('segment-')),
+                         ['segment-000003.gz'])
+
+    def test_twoArchivesOnOneFolder_keepEachOthersPages(self):
+        page = readFixture('ebay_item.html')
+        storeRun = HtmlArchive.HtmlArchive(self.archiveDir, maxBytes=float('inf'), compression='gzip')
+        storeRun.store('https://www.ebay.com/itm/256489312001', page, fetched=1.0)
+        # a single item scraped while the store run is going, closed (and evicting) first
+        with HtmlArchive.HtmlArchive(self.archiveDir, maxBytes=1, compression='gzip') as singleItem:
+            singleItem.store('https://www.ebay.com/itm/256489312002', page, fetched=2.0)
+        storeRun.store('https://www.ebay.com/itm/256489312003', page, fetched=3.0)
+        storeRun.close()
+
+        with HtmlArchive.HtmlArchive(self.archiveDir, maxBytes=float('inf'), compression='gzip') as archive:
+            self.assertEqual(archive.get(256489312001), page)
+            self.assertEqual(archive.get(256489312003), page)
+            self.assertEqual(len(archive), 3)
+
+    def test_getCodec_fallsBackToGzip(self):
+        with patch('HtmlArchive.zstandard', None), patch('HtmlArchive.warnedCodecs', set()), \
+                patch('builtins.print') as mockPrint:
+            self.assertEqual(HtmlArchive.getCodec('zstd'), 'gzip')
+            self.assertEqual(HtmlArchive.getCodec('zstd'), 'gzip')
+        mockPrint.assert_called_once_with("Compression 'zstd' is not available, falling back to gzip")
+
+    def test_reparse_latestCopies(self):
+        with HtmlArchive.HtmlArchive(self.archiveDir, compression='gzip') as archive:
+            archive.store('https://www.ebay.com/itm/256489312007', b'<html>broken</html>', fetched=100.0)
+            archive.store('https://www.ebay.com/itm/256489312007', readFixture('ebay_item.html'), fetched=200.0)
+            archive.store('https://www.ebay.com/itm/256489318844', readFixture('ebay_item_variations.html'), fetched=150.0)
+
+            results = {}
+            stats = HtmlArchive.reparse(archive, 'lxml', workers=1,
+                                        onResult=lambda itemId, url, fetched, details: results.update({itemId: details}))
+
+        self.assertEqual(stats.pages, 2)
+        self.assertEqual(stats.missingTitle, 0)
+        self.assertEqual(results[256489312007].price, 24.99)
+        self.assertTrue(results[256489318844].hasVariations)
+        self.assertIn("pages/sec", stats.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from aiohttp import web
+
+from FetchEngine import FetchEngine
+from HttpCache import HttpCache
+
+
+class TestHttpCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.cache = HttpCache(self.cacheDir, maxBytes=100)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.cacheDir)
+
+    def test_store_keepsValidators(self):
+        self.cache.store('http://store/page1', b'<html>1</html>', {'ETag': '"v1"', 'Last-Modified': 'Mon, 12 Oct 2026 10:00:00 GMT'})
+
+        entry = self.cache.lookup('http://store/page1')
+
+        self.assertEqual(self.cache.read(entry), b'<html>1</html>')
+        self.assertEqual(self.cache.conditionalHeaders(entry),
+                         {'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 12 Oct 2026 10:00:00 GMT'})
+        self.assertTrue(self.cache.isFresh(entry, 60))
+        self.assertFalse(self.cache.isFresh(entry, None))
+
+    def test_store_noStore(self):
+        self.cache.store('http://store/page1', b'<html>1</html>', {'Cache-Control': 'private, no-store'})
+
+        self.assertIsNone(self.cache.lookup('http://store/page1'))
+
+    def test_evict_leastRecentlyUsed(self):
+        self.cache.store('http://store/a', b'a' * 40, {})
+        self.cache.store('http://store/b', b'b' * 40, {})
+        self.cache.lookup('http://store/a')
+        self.cache.store('http://store/c', b'c' * 40, {})
+
+        self.assertIsNone(self.cache.lookup('http://store/b'))
+        self.assertIsNotNone(self.cache.lookup('http://store/a'))
+        self.assertIsNotNone(self.cache.lookup('http://store/c'))
+        self.assertEqual(self.cache.totalSize, 80)
+
+
+class TestConditionalFetch(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.cacheDir = tempfile.mkdtemp()
+        self.requests = []
+
+        async def page(request):
+            self.requests.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match') == '"v1"':
+                return web.Response(status=304)
+            return web.Response(body=b'<html>store page</html>', headers={'ETag': '"v1"'})
+
+        app = web.Application()
+        app.router.add_get('/store', page)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/store"
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+        shutil.rmtree(self.cacheDir)
+
+    async def test_fetch_missRevalidateHit(self):
+        with HttpCache(self.cacheDir) as cache:
+            async with FetchEngine().connect(cache) as client:
+                first = await client.fetch(self.url)
+                second = await client.fetch(self.url)  # no TTL: asks, gets a 304
+                third = await client.fetch(self.url, ttl=60)  # fresh: never asks
+
+            self.assertEqual({first, second, third}, {b'<html>store page</html>'})
+            self.assertEqual(self.requests, [None, '"v1"'])
+            self.assertEqual((cache.stats.misses, cache.stats.revalidated, cache.stats.hits), (1, 1, 1))
+
+    # another thread evicts the body between our lookup and our read
+    async def fetchAfterEviction(self, ttl):
+        with HttpCache(self.cacheDir) as cache:
+            async with FetchEngine().connect(cache) as client:
+                await client.fetch(self.url)
+                entry = cache.lookup(self.url)
+                os.remove(cache.bodyPath(self.url))
+                with patch.object(cache, 'lookup', return_value=entry):
+                    body = await client.fetch(self.url, ttl)
+            return body, cache.stats
+
+    async def test_fetch_evictedFreshEntryIsAMiss(self):
+        body, stats = await self.fetchAfterEviction(ttl=60)
+
+        self.assertEqual(body, b'<html>store page</html>')
+        self.assertEqual(self.requests, [None, None])
+        self.assertEqual((stats.misses, stats.revalidated, stats.hits), (2, 0, 0))
+
+    async def test_fetch_evictedAfter304FetchesAgain(self):
+        body, stats = await self.fetchAfterEviction(ttl=None)
+
+        self.assertEqual(body, b'<html>store page</html>')
+        self.assertEqual(self.requests, [None, '"v1"', None])
+        self.assertEqual((stats.misses, stats.revalidated, stats.hits), (2, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
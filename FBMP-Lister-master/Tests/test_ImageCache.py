@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from ImageCache import ImageCache
+
+class TestImageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.cache = ImageCache(os.path.join(self.tempDir, 'cache'), maxBytes=1000)
+
+    def tearDown(self):
+        self.cache.conn.close()
+        shutil.rmtree(self.tempDir)
+
+    def downloadInto(self, url, content):
+        tempPath = self.cache.newTempPath()
+        with open(tempPath, 'wb') as file:
+            file.write(content)
+        return self.cache.store(url, tempPath)
+
+    def test_lookup_afterStore(self):
+        self.assertIsNone(self.cache.lookup('https://i.ebayimg.com/images/g/a/s-l500.jpg'))
+        contentHash = self.downloadInto('https://i.ebayimg.com/images/g/a/s-l500.jpg', b'image a')
+
+        self.assertEqual(self.cache.lookup('https://i.ebayimg.com/images/g/a/s-l500.jpg'), contentHash)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_store_identicalBytesStoredOnce(self):
+        firstHash = self.downloadInto('https://i.ebayimg.com/images/g/a/s-l500.jpg', b'same bytes')
+        secondHash = self.downloadInto('https://i.ebayimg.com/images/g/b/s-l500.jpg', b'same bytes')
+
+        self.assertEqual(firstHash, secondHash)
+        self.assertEqual(self.cache.totalBytes(), len(b'same bytes'))
+
+    def test_materialize_copiesWhenLinksAreUnsupported(self):
+        contentHash = self.downloadInto('https://i.ebayimg.com/images/g/a/s-l500.jpg', b'image a')
+        linkedPath = os.path.join(self.tempDir, 'linked.jpg')
+        copiedPath = os.path.join(self.tempDir, 'copied.jpg')
+
+        self.cache.materialize(contentHash, linkedPath)
+        with patch('os.link', side_effect=OSError("links not supported")):
+            self.cache.materialize(contentHash, copiedPath)
+
+        for path in (linkedPath, copiedPath):
+            with open(path, 'rb') as file:
+                self.assertEqual(file.read(), b'image a')
+
+    @patch('builtins.print')
+    def test_evict_leastRecentlyUsedFirst(self, mock_print):
+        oldHash = self.downloadInto('https://i.ebayimg.com/images/g/old/s-l500.jpg', b'o' * 400)
+        newHash = self.downloadInto('https://i.ebayimg.com/images/g/new/s-l500.jpg', b'n' * 400)
+        self.cache.conn.execute("UPDATE blobs SET lastUsed=0 WHERE hash=?", (oldHash,))
+        self.downloadInto('https://i.ebayimg.com/images/g/newest/s-l500.jpg', b'x' * 400)
+
+        self.cache.evict()
+
+        self.assertIsNone(self.cache.lookup('https://i.ebayimg.com/images/g/old/s-l500.jpg'))
+        self.assertFalse(os.path.exists(self.cache.blobPath(oldHash)))
+        self.assertEqual(self.cache.lookup('https://i.ebayimg.com/images/g/new/s-l500.jpg'), newHash)
+        self.assertLessEqual(self.cache.totalBytes(), 1000)
+
+if __name__ == '__main__':
+    unittest.main()
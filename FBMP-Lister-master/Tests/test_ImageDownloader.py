@@ -0,0 +1,127 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from aiohttp import web
+
+from ImageCache import ImageCache
+from ImageDownloader import DownloadStats, ImageDownloader
+
+image = b'\xff\xd8' + b'image bytes ' * 1000
+
+
+class TestImageDownloader(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.requests = 0
+        self.truncated = 0  # how many of the next answers are cut off halfway
+        self.release = asyncio.Event()  # the slow image's second half waits for this
+
+        async def picture(request):
+            self.requests += 1
+            response = web.StreamResponse(headers={'Content-Length': str(len(image))})
+            await response.prepare(request)
+            await response.write(image[:1000])
+            if self.truncated:
+                self.truncated -= 1
+                request.transport.close()
+                return response
+            if request.match_info['name'] == 'slow.jpg':
+                await self.release.wait()
+            await response.write(image[1000:])
+            return response
+
+        app = web.Application()
+        app.router.add_get('/images/{name}', picture)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.baseUrl = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/images"
+        self.downloader = ImageDownloader(chunkSize=256)
+        self.downloader.fetchEngine.backoffFactor = 0
+
+    async def asyncTearDown(self):
+        self.release.set()
+        await self.runner.cleanup()
+        shutil.rmtree(self.tempDir)
+
+    def filePath(self, name):
+        return os.path.join(self.tempDir, name)
+
+    def readFile(self, name):
+        with open(self.filePath(name), 'rb') as file:
+            return file.read()
+
+    async def download(self, name, stats, imageCache=None):
+        async with self.downloader.fetchEngine.connect() as client:
+            await self.downloader.download(client, f"{self.baseUrl}/{name}", self.filePath(name), stats, imageCache, {})
+
+    async def test_download_streamsToPartFileThenRenames(self):
+        stats = DownloadStats()
+        task = asyncio.create_task(self.download('slow.jpg', stats))
+        while not os.path.exists(self.filePath('slow.jpg.part')):
+            await asyncio.sleep(0.01)
+
+        self.assertFalse(os.path.exists(self.filePath('slow.jpg')))
+        self.release.set()
+        await task
+
+        self.assertEqual(self.readFile('slow.jpg'), image)
+        self.assertFalse(os.path.exists(self.filePath('slow.jpg.part')))
+        self.assertEqual((stats.files, stats.bytes, stats.failures), (1, len(image), 0))
+
+    async def test_download_retriesAfterACutOffBody(self):
+        self.truncated = 1
+        stats = DownloadStats()
+
+        await self.download('a.jpg', stats)
+
+        self.assertEqual(self.requests, 2)
+        self.assertEqual(self.readFile('a.jpg'), image)
+        self.assertEqual(os.listdir(self.tempDir), ['a.jpg'])
+
+    @patch('builtins.print')
+    async def test_download_failureLeavesNoFiles(self, mockPrint):
+        self.truncated = 10
+        self.downloader.fetchEngine.retries = 2
+        stats = DownloadStats()
+
+        await self.download('a.jpg', stats)
+
+        self.assertEqual(self.requests, 3)
+        self.assertEqual((stats.files, stats.failures), (0, 1))
+        self.assertEqual(os.listdir(self.tempDir), [])
+
+    async def test_download_skipsFilesThatAlreadyExist(self):
+        with open(self.filePath('a.jpg'), 'wb') as file:
+            file.write(b'from an earlier run')
+        stats = DownloadStats()
+
+        await self.download('a.jpg', stats)
+
+        self.assertEqual(self.requests, 0)
+        self.assertEqual(self.readFile('a.jpg'), b'from an earlier run')
+        self.assertEqual((stats.files, stats.existing), (1, 1))
+
+    @patch('builtins.print')
+    async def test_downloadAll_sharedUrlDownloadedOnceThroughTheCache(self, mockPrint):
+        url = f"{self.baseUrl}/a.jpg"
+        os.makedirs(self.filePath('product1'))
+        os.makedirs(self.filePath('product2'))
+        with ImageCache(self.filePath('cache')) as imageCache:
+            stats = await self.downloader.downloadAll([(url, self.filePath('product1/1_a.jpg')),
+                                                      (url, self.filePath('product2/1_a.jpg'))], imageCache)
+
+        self.assertEqual(self.requests, 1)
+        self.assertEqual(self.readFile('product1/1_a.jpg'), image)
+        self.assertEqual(self.readFile('product2/1_a.jpg'), image)
+        self.assertEqual((stats.files, stats.failures), (2, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
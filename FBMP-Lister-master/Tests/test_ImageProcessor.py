@@ -0,0 +1,82 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from ImageProcessor import ImageProcessor
+
+class TestImageProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir)
+
+    def createImage(self, name, size, withExif=False):
+        filePath = os.path.join(self.tempDir, name)
+        image = Image.effect_noise(size, 64).convert('RGB')
+        exif = Image.Exif()
+        if withExif:
+            exif[0x010F] = "Camera Maker"  # Make
+        image.save(filePath, format='JPEG', quality=100, exif=exif)
+        return filePath
+
+    @patch('builtins.print')
+    def test_processAll_resizesAndStripsExif(self, mock_print):
+        filePath = self.createImage('1_s-l1600.jpg', (2400, 1200), withExif=True)
+        sizeBefore = os.path.getsize(filePath)
+
+        stats = ImageProcessor(maxDimension=800, quality=70, workers=1).processAll([filePath])
+
+        with Image.open(filePath) as image:
+            self.assertEqual(image.size, (800, 400))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertFalse(image.getexif())
+        self.assertEqual(stats.files, 1)
+        self.assertEqual(stats.bytesBefore, sizeBefore)
+        self.assertLess(stats.bytesAfter, stats.bytesBefore)
+
+    @patch('builtins.print')
+    def test_processAll_replacesInsteadOfWritingThroughHardlinks(self, mock_print):
+        filePath = self.createImage('cached.jpg', (1200, 1200))
+        linkedPath = os.path.join(self.tempDir, 'linked.jpg')
+        os.link(filePath, linkedPath)
+        sizeBefore = os.path.getsize(filePath)
+
+        ImageProcessor(maxDimension=600, workers=1).processAll([linkedPath])
+
+        self.assertEqual(os.path.getsize(filePath), sizeBefore)
+        self.assertLess(os.path.getsize(linkedPath), sizeBefore)
+
+    @patch('builtins.print')
+    def test_process_keepsThePoolUntilTheContextCloses(self, mock_print):
+        filePaths = [self.createImage(f'{index}_s-l1600.jpg', (1200, 1200)) for index in (1, 2)]
+
+        with ImageProcessor(maxDimension=600, workers=1) as imageProcessor:
+            asyncio.run(imageProcessor.process(filePaths[:1]))
+            asyncio.run(imageProcessor.process(filePaths[1:]))
+            mock_print.assert_not_called()
+
+        for filePath in filePaths:
+            with Image.open(filePath) as image:
+                self.assertEqual(image.size, (600, 600))
+        self.assertEqual(imageProcessor.stats.files, 2)
+        mock_print.assert_called_once()
+
+    @patch('builtins.print')
+    def test_processAll_reportsBadImages(self, mock_print):
+        filePath = os.path.join(self.tempDir, 'broken.jpg')
+        with open(filePath, 'wb') as file:
+            file.write(b'not an image')
+
+        stats = ImageProcessor(workers=1).processAll([filePath])
+
+        self.assertEqual((stats.files, stats.failures), (0, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from ItemKeyIndex import ItemKeyIndex
+
+class TestItemKeyIndex(unittest.TestCase):
+
+    def test_contains_loadedKeys(self):
+        index = ItemKeyIndex([256489312007, 256489318844, 'https://www.example.com/product1'])
+
+        self.assertIn(256489312007, index)
+        self.assertIn('https://www.example.com/product1', index)
+        self.assertNotIn(256489310000, index)
+        self.assertEqual(len(index), 3)
+
+    def test_add_mergesIntoSortedArray(self):
+        index = ItemKeyIndex([5, 1, 9], compactThreshold=3)
+        for itemId in [7, 3, 9, 2]:
+            index.add(itemId)
+
+        self.assertEqual(list(index.sortedIds), [1, 2, 3, 5, 7, 9])
+        self.assertEqual(index.recentIds, set())
+        for itemId in [1, 2, 3, 5, 7, 9]:
+            self.assertIn(itemId, index)
+        self.assertNotIn(4, index)
+
+    def test_containsUrl(self):
+        index = ItemKeyIndex()
+        index.addUrl('https://www.ebay.com/itm/256489312007?hash=item3bb')
+
+        self.assertTrue(index.containsUrl('https://www.ebay.com/itm/Water-Bottle/256489312007'))
+        self.assertFalse(index.containsUrl('https://www.ebay.com/itm/256489318844'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+
+from ListingDelta import ListingDelta, ListingState, listingFingerprint
+from ProductParser import ProductDetails
+
+itemId = 256489312007
+url = 'https://www.ebay.com/itm/256489312007'
+
+
+def details(price=24.99, available=True, title="Water Bottle"):
+    return ProductDetails(title, price, ["https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg"], available, False)
+
+
+def finalPrice(price):
+    return round(price * 2)
+
+
+class TestListingDelta(unittest.TestCase):
+
+    def test_observe_unchanged(self):
+        delta = ListingDelta({itemId: ListingState(24.99, True, listingFingerprint(details()))})
+
+        delta.observe(itemId, url, details(), finalPrice)
+
+        self.assertEqual(delta.changedCount, 0)
+        self.assertEqual(delta.unchanged, 1)
+        self.assertEqual(len(delta.observations), 1)
+
+    def test_observe_priceChange(self):
+        delta = ListingDelta({itemId: ListingState(24.99, True, listingFingerprint(details()))})
+
+        delta.observe(itemId, url, details(price=19.99), finalPrice)
+
+        self.assertEqual(delta.priceChanges, [(url, "Water Bottle", 50, 40, 19.99)])
+        self.assertEqual(delta.observations, [(19.99, True, listingFingerprint(details(price=19.99)), itemId)])
+
+    def test_observe_stockChanges(self):
+        otherId = 256489318844
+        delta = ListingDelta({itemId: ListingState(24.99, True, 'old'), otherId: ListingState(24.99, False, 'old')})
+
+        delta.observe(itemId, url, details(available=False), finalPrice)
+        delta.observe(otherId, 'https://www.ebay.com/itm/256489318844', details(), finalPrice)
+
+        self.assertEqual(delta.lowStock, [(url, "Water Bottle")])
+        self.assertEqual(delta.backInStock, [('https://www.ebay.com/itm/256489318844', "Water Bottle")])
+        self.assertEqual(delta.priceChanges, [])
+
+    def test_observe_rowWithoutHistory(self):
+        # stored before prices and stock were tracked: nothing to compare with, but the state is recorded
+        otherId = 256489318844
+        delta = ListingDelta({itemId: ListingState(None, None, None), otherId: ListingState(None, None, None)})
+
+        delta.observe(itemId, url, details(), finalPrice)
+        delta.observe(otherId, 'https://www.ebay.com/itm/256489318844', details(available=False), finalPrice)
+
+        self.assertEqual(delta.changedCount, 0)
+        self.assertEqual(delta.lowStock, [])
+        self.assertEqual(len(delta.observations), 2)
+
+    def test_fingerprint_followsListingChanges(self):
+        self.assertNotEqual(listingFingerprint(details()), listingFingerprint(details(title="Water Bottle 32oz")))
+        self.assertNotEqual(listingFingerprint(details()), listingFingerprint(details(available=False)))
+        self.assertEqual(listingFingerprint(details()), listingFingerprint(details()))
+
+if __name__ == '__main__':
+    unittest.main()
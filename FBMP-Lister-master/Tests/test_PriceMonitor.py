@@ -0,0 +1,100 @@
+import os
+import unittest
+
+import PriceMonitor
+from PriceMonitor import MonitoredItem, MonitorSchedule, PriceMonitor as Monitor, RequestBudget, VirtualClock
+from ProductParser import ProductDetails
+
+fixturesDir = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def details(price=24.99, available=True):
+    return ProductDetails("Water Bottle", price, [], available, False)
+
+
+class TestMonitorSchedule(unittest.TestCase):
+
+    def setUp(self):
+        self.schedule = MonitorSchedule(minInterval=60, maxInterval=3600, initialInterval=600, lowStockInterval=300)
+
+    def test_pop_earliestFirst(self):
+        self.schedule.add(MonitoredItem(1, 'a', nextCheck=50), 0)
+        self.schedule.add(MonitoredItem(2, 'b', nextCheck=10), 0)
+        self.schedule.add(MonitoredItem(3, 'c'), 0)  # never checked: due now
+
+        self.assertEqual([self.schedule.pop().itemId for _ in range(3)], [3, 2, 1])
+
+    def test_record_intervalFollowsVolatility(self):
+        item = MonitoredItem(1, 'a', price=24.99, available=True)
+        self.schedule.add(item, 0)
+        self.schedule.pop()
+
+        self.assertEqual(self.schedule.record(item, details(), 0), (False, False))
+        self.assertEqual(item.interval, 900)
+        self.schedule.pop()
+        self.assertEqual(self.schedule.record(item, details(price=19.99), 900), (True, False))
+        self.assertEqual(item.interval, 450)
+        self.assertEqual(item.nextCheck, 1350)
+        self.assertEqual(item.price, 19.99)
+
+    def test_record_lowStockCheckedSooner(self):
+        item = MonitoredItem(1, 'a', price=24.99, available=True)
+        self.schedule.add(item, 0)
+        self.schedule.pop()
+
+        self.assertEqual(self.schedule.record(item, details(available=False), 0), (False, True))
+        self.assertEqual(item.interval, 300)
+
+    def test_record_failedCheckKeepsState(self):
+        item = MonitoredItem(1, 'a', price=24.99, available=True)
+        self.schedule.add(item, 0)
+        self.schedule.pop()
+
+        self.schedule.record(item, None, 100)
+
+        self.assertEqual((item.price, item.interval, item.nextCheck), (24.99, 600, 700))
+
+
+class TestPriceMonitor(unittest.TestCase):
+
+    def test_run_respectsRequestBudget(self):
+        schedule = MonitorSchedule()
+        for itemId in range(50):
+            schedule.add(MonitoredItem(itemId, str(itemId)), 0)
+        clock = VirtualClock()
+        checkTimes = []
+
+        def check(item, now):
+            checkTimes.append(now)
+            return details()
+
+        stats = Monitor(schedule, RequestBudget(requestsPerMinute=6), check, clock=clock, sleep=clock.sleep).run(until=300)
+
+        # 6 a minute for 5 minutes, 10 seconds apart
+        self.assertEqual(stats.checks, 30)
+        self.assertTrue(all(later - earlier >= 10 for earlier, later in zip(checkTimes, checkTimes[1:])))
+
+    def test_run_failedCheckCounted(self):
+        schedule = MonitorSchedule()
+        schedule.add(MonitoredItem(1, 'a'), 0)
+        clock = VirtualClock()
+
+        def check(item, now):
+            raise ValueError("page changed")
+
+        stats = Monitor(schedule, RequestBudget(), check, clock=clock, sleep=clock.sleep).run(maxChecks=1)
+
+        self.assertEqual((stats.checks, stats.failures), (1, 1))
+        self.assertEqual(len(schedule), 1)
+
+    def test_simulate(self):
+        fixturePaths = [os.path.join(fixturesDir, name) for name in ('ebay_item.html', 'ebay_item_variations.html')]
+        store, stats = PriceMonitor.simulate(fixturePaths, items=50, hours=6, requestsPerMinute=2)
+
+        self.assertLessEqual(stats.checks, 6 * 60 * 2)
+        changes, caught, delays = store.coverage(6 * 3600)
+        self.assertLessEqual(caught, changes)
+        self.assertEqual(len(delays), caught)
+
+if __name__ == '__main__':
+    unittest.main()
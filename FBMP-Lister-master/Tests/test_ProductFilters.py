@@ -0,0 +1,88 @@
+import unittest
+
+from ProductFilters import (AvailabilityFilter, FilterChain, PriceRangeFilter, ProductFilter, TitleBlocklistFilter,
+                            VariationsFilter, buildFilterChain)
+from ProductParser import ProductDetails
+
+images = ["https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg",
+          "https://i.ebayimg.com/images/g/V~4AAOSwLmJk3Ab2/s-l500.jpg"]
+
+
+def details(title="Water Bottle", price=24.99, available=True, hasVariations=False, quantity=None):
+    if quantity is None:
+        quantity = 11 if available else 4
+    return ProductDetails(title, price, images, available, hasVariations, quantity)
+
+
+class TestProductFilters(unittest.TestCase):
+
+    def test_defaultChain_skipsVariationsAndLowStock(self):
+        chain = buildFilterChain({})
+
+        self.assertEqual([productFilter.name for productFilter in chain.filters], ['variations', 'availability'])
+        self.assertTrue(chain.accepts(details()))
+        self.assertFalse(chain.accepts(details(hasVariations=True)))
+        self.assertFalse(chain.accepts(details(available=False)))
+
+    def test_buildFilterChain_fromSettings(self):
+        chain = buildFilterChain({'skipVariations': False, 'skipUnavailable': False, 'minEbayPrice': '5',
+                                  'maxEbayPrice': 50, 'titleBlocklist': "Refurbished, , for parts"})
+
+        self.assertEqual([productFilter.name for productFilter in chain.filters], ['price range', 'title blocklist'])
+        self.assertEqual(chain.filters[0].minPrice, 5.0)
+        self.assertEqual(chain.filters[1].words, ['refurbished', 'for parts'])
+
+    def test_availability_minAvailableFromSettings(self):
+        availability = buildFilterChain({'skipVariations': False, 'minAvailable': '3'}).filters[0]
+
+        self.assertEqual(availability.minAvailable, 3)
+        self.assertEqual(availability.key, 'availability 3')
+        self.assertTrue(availability.accepts(details(available=False, quantity=3)))
+        self.assertFalse(availability.accepts(details(available=False, quantity=2)))
+        self.assertFalse(availability.accepts(ProductDetails("Water Bottle", 24.99, images, False, False)))  # no quantity line
+
+    def test_priceRange(self):
+        priceRange = PriceRangeFilter(minPrice=10, maxPrice=30)
+
+        self.assertTrue(priceRange.accepts(details(price=10)))
+        self.assertFalse(priceRange.accepts(details(price=9.99)))
+        self.assertFalse(priceRange.accepts(details(price=30.01)))
+        self.assertTrue(priceRange.accepts(details(price=None)))
+
+    def test_titleBlocklist_ignoresCase(self):
+        blocklist = TitleBlocklistFilter(["refurbished"])
+
+        self.assertFalse(blocklist.accepts(details(title="Phone - Refurbished Excellent")))
+        self.assertTrue(blocklist.accepts(details(title=None)))
+
+    def test_chain_stopsAtFirstRejection(self):
+        variations, availability = VariationsFilter(), AvailabilityFilter()
+        chain = FilterChain([variations, availability])
+
+        chain.accepts(details(hasVariations=True, available=False))
+        chain.accepts(details(available=False))
+        chain.accepts(details())
+
+        self.assertEqual((variations.rejected, availability.rejected), (1, 1))
+        self.assertEqual(variations.imagesSaved, len(images))
+        self.assertEqual(chain.rejected, 2)
+        self.assertEqual(chain.report(), "Filters rejected 2 products: variations 1 (2 images), availability 1 (2 images)")
+
+    def test_rejectedBy_andKeys(self):
+        chain = buildFilterChain({'minEbayPrice': 5, 'titleBlocklist': "for parts, Refurbished"})
+
+        self.assertIs(chain.rejectedBy(details(available=False)), chain.filters[1])
+        self.assertIsNone(chain.rejectedBy(details()))
+        self.assertEqual(chain.keys(), ['variations', 'availability 11', 'price range 5.0-None',
+                                        'title blocklist for parts,refurbished'])
+
+    def test_filterWithoutAccepts_cantBeCreated(self):
+        class NoRule(ProductFilter):
+            name = 'no rule'
+
+        with self.assertRaises(TypeError):
+            NoRule()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import unittest
+from unittest.mock import Mock, patch
+
+import ProductParser
+
+fixturesDir = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def readFixture(name):
+    with open(os.path.join(fixturesDir, name), 'rb') as file:
+        return file.read()
+
+
+class TestProductParser(unittest.TestCase):
+
+    def test_parse_simpleItem(self):
+        content = readFixture('ebay_item.html')
+        for name in ProductParser.availableParsers():
+            with self.subTest(parser=name):
+                details = ProductParser.getParser(name).parse(content)
+                self.assertEqual(details.title, "Stainless Steel Insulated Water Bottle 32oz Leak Proof Lid")
+                self.assertEqual(details.price, 24.99)
+                self.assertEqual(details.images[0], "https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg")
+                self.assertTrue(details.available)
+                self.assertFalse(details.hasVariations)
+                self.assertEqual(details.quantity, 11)
+
+    def test_parse_itemWithVariations(self):
+        content = readFixture('ebay_item_variations.html')
+        for name in ProductParser.availableParsers():
+            with self.subTest(parser=name):
+                details = ProductParser.getParser(name).parse(content)
+                self.assertEqual(details.price, 18.5)
+                self.assertFalse(details.available)
+                self.assertTrue(details.hasVariations)
+                self.assertEqual(details.quantity, 1)  # "Last one"
+
+    def test_parse_missingElements(self):
+        for name in ProductParser.availableParsers():
+            with self.subTest(parser=name):
+                details = ProductParser.getParser(name).parse(b"<html><body><p>Item not found</p></body></html>")
+                self.assertIsNone(details.title)
+                self.assertIsNone(details.price)
+                self.assertEqual(details.images, [])
+                self.assertFalse(details.available)
+                self.assertIsNone(details.quantity)
+
+    def test_parse_allBackendsFindTheWholeGallery(self):
+        content = readFixture('ebay_item.html')
+        withoutJsonLd = content.replace(b'application/ld+json', b'text/plain')
+        gallery = ["https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg",
+                   "https://i.ebayimg.com/images/g/w4EAAOSw8ZFk3Ab2/s-l500.jpg",
+                   "https://i.ebayimg.com/images/g/Q1sAAOSw2rNk3Ab3/s-l500.jpg",
+                   "https://i.ebayimg.com/images/g/7mQAAOSwlb9k3Ab4/s-l500.jpg"]
+        for name in ProductParser.availableParsers():
+            with self.subTest(parser=name):
+                parser = ProductParser.getParser(name)
+                self.assertEqual(parser.parse(content).images, gallery)
+                # the JSON-LD parser's DOM fallback too
+                self.assertEqual(parser.parse(withoutJsonLd).images, gallery)
+
+    def test_structuredData_skipsTheDom(self):
+        fallback = Mock()
+        parser = ProductParser.StructuredDataParser(fallback)
+
+        details = parser.parse(readFixture('ebay_item.html'))
+
+        self.assertEqual(details.price, 24.99)
+        fallback.parse.assert_not_called()
+
+    def test_structuredData_keepsTheWholeGallery(self):
+        content = readFixture('ebay_item.html').replace(
+            b'"https://i.ebayimg.com/images/g/7mQAAOSwlb9k3Ab4/s-l500.jpg"',
+            b'{"@type": "ImageObject", "contentUrl": "https://i.ebayimg.com/images/g/7mQAAOSwlb9k3Ab4/s-l500.jpg"}, '
+            b'"https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg"')
+
+        details = ProductParser.StructuredDataParser().parse(content)
+
+        self.assertEqual(details.images, ["https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg",
+                                          "https://i.ebayimg.com/images/g/w4EAAOSw8ZFk3Ab2/s-l500.jpg",
+                                          "https://i.ebayimg.com/images/g/Q1sAAOSw2rNk3Ab3/s-l500.jpg",
+                                          "https://i.ebayimg.com/images/g/7mQAAOSwlb9k3Ab4/s-l500.jpg"])
+
+    def test_structuredData_fallsBackWithoutJsonLd(self):
+        content = readFixture('ebay_item.html').replace(b'application/ld+json', b'text/plain')
+
+        details = ProductParser.StructuredDataParser().parse(content)
+
+        self.assertIsNone(ProductParser.findJsonLd(content))
+        self.assertEqual(details, ProductParser.LxmlParser().parse(content))
+
+    def test_structuredData_outOfStock(self):
+        content = readFixture('ebay_item.html').replace(b'schema.org/InStock', b'schema.org/OutOfStock')
+
+        details = ProductParser.StructuredDataParser().parse(content)
+        self.assertFalse(details.available)
+        self.assertEqual(details.quantity, 0)
+
+    def test_parseQuantity(self):
+        self.assertEqual(ProductParser.parseQuantity("7 available"), 7)
+        self.assertEqual(ProductParser.parseQuantity("1,250 available"), 1250)
+        self.assertEqual(ProductParser.parseQuantity("More than 10 available"), 11)
+        self.assertEqual(ProductParser.parseQuantity("Last one"), 1)
+        self.assertEqual(ProductParser.parseQuantity("Out of Stock"), 0)
+        self.assertIsNone(ProductParser.parseQuantity("Limited quantity available"))
+        self.assertIsNone(ProductParser.parseQuantity(None))
+
+    def test_withoutLxml_fallsBackToHtmlParser(self):
+        with patch('ProductParser.lxml', None):
+            self.assertNotIn('lxml', ProductParser.availableParsers())
+            self.assertIsInstance(ProductParser.getParser('lxml'), ProductParser.SoupParser)
+            parser = ProductParser.getParser('jsonld')
+        self.assertIsInstance(parser.fallback, ProductParser.SoupParser)
+
+    def test_getParser_unknownBackendFallsBack(self):
+        self.assertIsInstance(ProductParser.getParser('does-not-exist'), ProductParser.SoupParser)
+
+if __name__ == '__main__':
+    unittest.main()
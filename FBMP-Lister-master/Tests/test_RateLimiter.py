@@ -0,0 +1,122 @@
+import asyncio
+import time
+import unittest
+
+from aiohttp import web
+
+from FetchEngine import FetchEngine
+from RateLimiter import RateLimiter, parseRetryAfter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(rate=10, maxRate=20, minRate=1, burst=2, clock=self.clock)
+        self.bucket = self.limiter.bucketFor('https://www.ebay.com/itm/1')
+
+    # one answer every `interval` seconds for a second
+    def send(self, interval):
+        for _ in range(round(1 / interval)):
+            self.clock.now += interval
+            self.bucket.countAnswer(self.clock.now)
+
+    def test_reserve_spacesRequestsOnceTheBurstIsUsed(self):
+        waits = [self.bucket.reserve(self.clock.now) for _ in range(4)]
+
+        self.assertEqual(waits, [0.0, 0.0, 0.1, 0.2])
+
+    def test_bucketsArePerHost(self):
+        self.assertIs(self.limiter.bucketFor('https://www.ebay.com/str/store'), self.bucket)
+        self.assertIsNot(self.limiter.bucketFor('https://i.ebayimg.com/images/g/a/s-l500.jpg'), self.bucket)
+
+    def test_record_halvesOnceAndHonorsRetryAfter(self):
+        self.send(0.1)
+        self.limiter.record('https://www.ebay.com/itm/1', 429, '3')
+        self.limiter.record('https://www.ebay.com/itm/2', 503)  # same burst of pushback, inside the cooldown
+
+        self.assertAlmostEqual(self.bucket.rate, 5)
+        self.assertEqual(self.bucket.throttles, 2)
+        self.assertAlmostEqual(self.bucket.reserve(self.clock.now), 3.0)
+
+    def test_record_halvesWhatWasActuallySent(self):
+        self.send(0.25)  # 4/s, well under the allowed 10/s
+
+        self.limiter.record('https://www.ebay.com/itm/1', 429)
+
+        self.assertAlmostEqual(self.bucket.rate, 2)
+
+    def test_record_recoversSlowly(self):
+        self.send(0.1)
+        self.limiter.record('https://www.ebay.com/itm/1', 429)
+        for _ in range(25):
+            self.limiter.record('https://www.ebay.com/itm/1', 200)
+
+        self.assertAlmostEqual(self.limiter.rates()['www.ebay.com'], 9.0, places=0)
+        for _ in range(1000):
+            self.limiter.record('https://www.ebay.com/itm/1', 200)
+        self.assertEqual(self.limiter.rates()['www.ebay.com'], 20)
+
+    def test_parseRetryAfter(self):
+        self.assertEqual(parseRetryAfter('120'), 120.0)
+        self.assertEqual(parseRetryAfter('Wed, 21 Oct 2026 07:28:30 GMT', now=1792567700.0), 10.0)
+        self.assertIsNone(parseRetryAfter('soon'))
+        self.assertIsNone(parseRetryAfter(None))
+
+
+class TestRateLimitedFetch(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.requests = 0
+
+        async def page(request):
+            self.requests += 1
+            if self.requests == 1:
+                return web.Response(status=429, headers={'Retry-After': '0'})
+            return web.Response(body=b'<html>item</html>')
+
+        app = web.Application()
+        app.router.add_get('/itm/1', page)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/itm/1"
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def test_fetch_retries429WithoutFixedBackoff(self):
+        limiter = RateLimiter(rate=10)
+        start = time.perf_counter()
+        async with FetchEngine(rateLimiter=limiter, backoffFactor=5).connect() as client:
+            body = await client.fetch(self.url)
+
+        self.assertEqual(body, b'<html>item</html>')
+        self.assertEqual(self.requests, 2)
+        self.assertLess(time.perf_counter() - start, 2)  # paced by the limiter, not a 5s backoff
+        self.assertEqual(limiter.throttles, 1)
+        self.assertIn('127.0.0.1', limiter.report())
+
+    async def test_throttledSeconds_countsOverlappingWaitsOnce(self):
+        limiter = RateLimiter(rate=10, maxRate=10, burst=1)
+        start = time.monotonic()
+
+        await asyncio.gather(*(limiter.acquire(self.url) for _ in range(5)))
+
+        # waits of 0.1 to 0.4s add up to 1s, but they overlap: only 0.4s went by
+        self.assertGreaterEqual(limiter.throttledSeconds, 0.35)
+        self.assertLessEqual(limiter.throttledSeconds, time.monotonic() - start)
+        self.assertIn(f"throttled for {limiter.throttledSeconds:.1f}s in all", limiter.report())
+
+
+if __name__ == '__main__':
+    unittest.main()
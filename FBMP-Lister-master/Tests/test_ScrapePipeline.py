@@ -0,0 +1,161 @@
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from unittest.mock import Mock
+
+from BatchPlanner import BatchPlan
+from Product import Product
+from ScrapePipeline import ScrapePipeline
+from ScrapeSession import ScrapeSession
+
+
+class FakeEngine:
+    def __init__(self, maxConcurrency):
+        self.maxConcurrency = maxConcurrency
+
+    @asynccontextmanager
+    async def connect(self, cache=None):
+        yield None
+
+
+class FakeImageDownloader:
+    def __init__(self, log):
+        self.fetchEngine = FakeEngine(4)
+        self.log = log
+
+    async def download(self, client, url, filePath, stats, imageCache=None, inFlight=None):
+        await asyncio.sleep(random.random() / 1000)
+        with open(filePath, 'wb') as file:
+            file.write(b'image')
+        self.log.append(('image', os.path.basename(os.path.dirname(filePath))))
+
+    def report(self, stats):
+        pass
+
+
+class FakeImageProcessor:
+    def __init__(self, log):
+        self.log = log
+
+    async def process(self, filePaths):
+        await asyncio.sleep(random.random() / 1000)
+        self.log.extend(('processed', os.path.basename(os.path.dirname(filePath))) for filePath in filePaths)
+
+
+# Stands in for the Scraper: links 0..count-1, every product page finishing after a random delay,
+# every seventh one rejected
+class FakeScraper:
+    def __init__(self, baseDir, count, log):
+        self.baseDir = baseDir
+        self.count = count
+        self.log = log
+        self.fetchEngine = FakeEngine(8)
+        self.imageDownloader = FakeImageDownloader(log)
+        self.parseExecutor = ThreadPoolExecutor(max_workers=2)
+        self.dbManager = Mock()
+        self.inFlight = 0
+        self.maxInFlight = 0
+
+    def getRejectedItemIds(self, session):
+        return frozenset()
+
+    async def crawlStoreLinks(self, client, url, session, knownItemIds, rejectedItemIds):
+        for index in range(self.count):
+            yield f"https://www.ebay.com/itm/{300000000000 + index}"
+
+    async def scrapeProductDetailsAsync(self, client, url, session, position):
+        self.inFlight += 1
+        self.maxInFlight = max(self.maxInFlight, self.inFlight)
+        await asyncio.sleep(random.random() / 500)
+        self.inFlight -= 1
+        if position % 7 == 6:
+            return None
+        product = Product(f"Product {position}", 10.0, [f"https://i.ebayimg.com/images/g/{position}/s-l1600.jpg"])
+        session.addProduct(product, position)
+        return product
+
+    def getImageDownloads(self, batchPlan, product):
+        productFolder = batchPlan.productFolder(self.baseDir, product)
+        os.makedirs(productFolder, exist_ok=True)
+        return [(url, os.path.join(productFolder, f"{index}_{os.path.basename(url)}"))
+                for index, url in enumerate(product.images, start=1)]
+
+
+class TestScrapePipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.baseDir = tempfile.mkdtemp()
+        self.log = []
+        self.csvManager = Mock()
+        self.csvManager.saveProducts.side_effect = lambda products, plan: self.log.append(
+            ('export', plan.slotFor(products[0]).batch, [product.title for product in products]))
+
+    def tearDown(self):
+        shutil.rmtree(self.baseDir)
+
+    def runPipeline(self, count, imageQueueSize=4, imageProcessor=None, batchPlan=None):
+        random.seed(count)
+        scraper = FakeScraper(self.baseDir, count, self.log)
+        session = ScrapeSession()
+        session.batchPlan = batchPlan if batchPlan is not None else BatchPlan(firstBatch=1)
+        asyncio.run(ScrapePipeline(scraper, session, csvManager=self.csvManager, imageProcessor=imageProcessor,
+                                   imageQueueSize=imageQueueSize).run('store'))
+        return scraper, session
+
+    def test_run_listingOrder(self):
+        scraper, session = self.runPipeline(130)
+
+        accepted = [f"Product {position}" for position in range(130) if position % 7 != 6]
+        exports = sorted(entry for entry in self.log if entry[0] == 'export')
+        self.assertEqual([entry[1] for entry in exports], [1, 2, 3])
+        self.assertEqual([title for entry in exports for title in entry[2]], accepted)
+        self.assertEqual([slot.folder for slot in session.batchPlan.slots.values()], [str(index) for index in range(1, len(accepted) + 1)])
+
+    def test_run_exportsBatchAfterItsImages(self):
+        scraper, session = self.runPipeline(60)
+
+        for position, entry in enumerate(self.log):
+            if entry[0] == 'export':
+                folders = {session.batchPlan.slotFor(product).folder for product in session.products
+                           if session.batchPlan.slotFor(product).batch == entry[1]}
+                downloaded = {logged[1] for logged in self.log[:position] if logged[0] == 'image'}
+                self.assertLessEqual(folders, downloaded)
+        self.assertEqual(session.batchPlan.imageFiles[session.products[0]], ['1_s-l1600.jpg'])
+
+    def test_run_exportsBatchAfterItsImagesAreProcessed(self):
+        scraper, session = self.runPipeline(60, imageProcessor=FakeImageProcessor(self.log))
+
+        for position, entry in enumerate(self.log):
+            if entry[0] == 'export':
+                folders = {session.batchPlan.slotFor(product).folder for product in session.products
+                           if session.batchPlan.slotFor(product).batch == entry[1]}
+                processed = {logged[1] for logged in self.log[:position] if logged[0] == 'processed'}
+                self.assertLessEqual(folders, processed)
+        self.assertEqual(len([entry for entry in self.log if entry[0] == 'processed']), len(session.products))
+
+    def test_run_allocatesBatchesOffTheEventLoop(self):
+        threads = []
+
+        def allocateBatch():
+            threads.append(threading.current_thread())
+            return 40 + len(threads)
+
+        scraper, session = self.runPipeline(130, batchPlan=BatchPlan(allocateBatch=allocateBatch))
+
+        self.assertEqual(session.batchPlan.batches, [41, 42, 43])
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_run_fetchesBoundedByEngine(self):
+        scraper, session = self.runPipeline(200, imageQueueSize=1)
+
+        self.assertLessEqual(scraper.maxInFlight, scraper.fetchEngine.maxConcurrency)
+        self.assertEqual(len(session), len([position for position in range(200) if position % 7 != 6]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from Product import Product
+from ScrapeSession import ScrapeSession
+
+class TestScrapeSession(unittest.TestCase):
+
+    def test_addProduct_concurrently(self):
+        session = ScrapeSession('https://www.ebay.com/str/examplestore')
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for i in range(400):
+                executor.submit(session.addProduct, Product(f"Product {i}", 10.0, []))
+
+        self.assertEqual(len(session), 400)
+
+    def test_sessionsAreIsolated(self):
+        first = ScrapeSession()
+        second = ScrapeSession()
+        first.addProduct(Product("Product 1", 10.0, []))
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 0)
+
+    def test_release(self):
+        with ScrapeSession() as session:
+            session.addProduct(Product("Product 1", 10.0, []))
+        self.assertEqual(session.products, [])
+
+    def test_products_inListingOrder(self):
+        session = ScrapeSession()
+        for position in [2, 0, 1]:
+            session.addProduct(Product(f"Product {position}", 10.0, []), position)
+
+        self.assertEqual([product.title for product in session.products], ["Product 0", "Product 1", "Product 2"])
+
+if __name__ == '__main__':
+    unittest.main()
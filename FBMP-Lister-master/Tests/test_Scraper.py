@@ -0,0 +1,119 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock, patch
+
+import aiohttp
+
+from DatabaseManager import DatabaseManager
+from ScrapeSession import ScrapeSession
+from Scraper import Scraper
+
+storeUrl = 'https://www.ebay.com/str/store'
+
+
+# nextPage: a page number, or the next link's href as it is
+def storePage(itemIds, nextPage=None):
+    links = "".join(f'<li><a class="s-item__link" href="https://www.ebay.com/itm/{itemId}?_trksid=p{index}">Item</a></li>'
+                    for index, itemId in enumerate(itemIds))
+    nextHref = nextPage if isinstance(nextPage, str) else f"?_pgn={nextPage}"
+    nextLink = f'<a class="pagination__next" href="{nextHref}">Next</a>' if nextPage else ''
+    return f'<html><body><ul>{links}</ul>{nextLink}</body></html>'.encode('utf-8')
+
+
+# Store pages by URL; a page that's an exception is raised instead
+class FakeClient:
+    def __init__(self, pages):
+        self.pages = pages
+        self.fetched = []
+
+    async def fetch(self, url, ttl=None):
+        self.fetched.append(url)
+        await asyncio.sleep(0)
+        page = self.pages[url]
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+
+class TestCrawlStoreLinks(unittest.TestCase):
+
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+        self.dbManager = DatabaseManager(os.path.join(self.tempDir, 'products.db'))
+        self.settingsManager = Mock()
+        self.settingsManager.settings = {}
+        self.settingsManager.getBaseDir.return_value = self.tempDir
+        self.scraper = Scraper(self.dbManager, self.settingsManager)
+
+    def tearDown(self):
+        self.scraper.dbWriter.close()
+        self.scraper.parseExecutor.shutdown()
+        self.dbManager.close()
+        shutil.rmtree(self.tempDir)
+
+    def crawl(self, pages, session=None, knownItemIds=frozenset()):
+        client = FakeClient(pages)
+        session = session if session is not None else ScrapeSession(storeUrl)
+
+        async def collect():
+            return [link async for link in self.scraper.crawlStoreLinks(client, storeUrl, session, knownItemIds)]
+        return asyncio.run(collect()), client.fetched
+
+    def test_followsPaginationToTheLastPage(self):
+        links, fetched = self.crawl({
+            storeUrl: storePage([100000000001, 100000000002], nextPage=2),
+            f'{storeUrl}?_pgn=2': storePage([100000000003], nextPage=3),
+            f'{storeUrl}?_pgn=3': storePage([100000000004]),
+        })
+
+        self.assertEqual(links, [f'https://www.ebay.com/itm/{itemId}' for itemId in range(100000000001, 100000000005)])
+        self.assertEqual(fetched, [storeUrl, f'{storeUrl}?_pgn=2', f'{storeUrl}?_pgn=3'])
+
+    def test_stopsAtMaxStorePagesAndMaxStoreItems(self):
+        pages = {storeUrl: storePage([100000000001, 100000000002], nextPage=2),
+                 f'{storeUrl}?_pgn=2': storePage([100000000003, 100000000004], nextPage=3),
+                 f'{storeUrl}?_pgn=3': storePage([100000000005])}
+
+        self.settingsManager.settings = {'maxStorePages': 2}
+        links, fetched = self.crawl(pages)
+        self.assertEqual(len(links), 4)
+        self.assertEqual(fetched, [storeUrl, f'{storeUrl}?_pgn=2'])
+
+        self.settingsManager.settings = {'maxStoreItems': 3}
+        links, _ = self.crawl(pages)
+        self.assertEqual(len(links), 3)
+
+    def test_linksAreDeduplicatedAcrossPages(self):
+        session = ScrapeSession(storeUrl)
+        links, _ = self.crawl({
+            storeUrl: storePage([100000000001, 100000000002], nextPage=2),
+            # a listing from page 1 again (different tracking parameters) and an item we already have
+            f'{storeUrl}?_pgn=2': storePage([100000000002, 100000000003, 100000000009], nextPage=3),
+            # the last page links back to the first one
+            f'{storeUrl}?_pgn=3': storePage([100000000001], nextPage=storeUrl),
+        }, session, knownItemIds={100000000009})
+
+        self.assertEqual(links, ['https://www.ebay.com/itm/100000000001', 'https://www.ebay.com/itm/100000000002',
+                                 'https://www.ebay.com/itm/100000000003'])
+        self.assertEqual(session.skippedItemIds, [100000000009])
+
+    @patch('builtins.print')
+    def test_failedPageKeepsWhatWasFound(self, mockPrint):
+        links, _ = self.crawl({
+            storeUrl: storePage([100000000001, 100000000002], nextPage=2),
+            f'{storeUrl}?_pgn=2': aiohttp.ClientConnectionError("connection reset"),
+        })
+
+        self.assertEqual(links, ['https://www.ebay.com/itm/100000000001', 'https://www.ebay.com/itm/100000000002'])
+        mockPrint.assert_called_once_with(f"Stopping pagination, could not fetch {storeUrl}?_pgn=2: connection reset")
+
+    def test_failedFirstPageRaises(self):
+        with self.assertRaises(aiohttp.ClientConnectionError):
+            self.crawl({storeUrl: aiohttp.ClientConnectionError("connection reset")})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import Utils
+
+class TestUtils(unittest.TestCase):
+
+    def test_getNextBatchNumber_scansParentDir(self):
+        with tempfile.TemporaryDirectory() as parentDir:
+            for name in ['Products Directory 1', 'Products Directory 7', 'Image Cache']:
+                os.makedirs(os.path.join(parentDir, name))
+
+            self.assertEqual(Utils.getNextBatchNumber('Products Directory', parentDir), 8)
+
+    def test_getItemId(self):
+        self.assertEqual(Utils.getItemId('https://www.ebay.com/itm/256489312007'), 256489312007)
+        self.assertEqual(Utils.getItemId('https://www.ebay.com/itm/256489312007?hash=item3bb80f8a07:g:qYkAAOSw&amdata=enc'), 256489312007)
+        self.assertEqual(Utils.getItemId('https://www.ebay.com/itm/Insulated-Water-Bottle-32oz/256489312007?var=0'), 256489312007)
+        self.assertEqual(Utils.getItemId('https://cgi.ebay.com/ws/eBayISAPI.dll?ViewItem&item=256489312007'), 256489312007)
+
+    def test_getItemId_notAnItem(self):
+        self.assertIsNone(Utils.getItemId('https://www.ebay.com/str/examplestore'))
+        self.assertIsNone(Utils.getItemId('https://www.example.com/product1'))
+
+    def test_canonicalItemUrl(self):
+        self.assertEqual(Utils.canonicalItemUrl('https://www.ebay.com/itm/Water-Bottle/256489312007?hash=item3bb'),
+                         'https://www.ebay.com/itm/256489312007')
+        self.assertEqual(Utils.canonicalItemUrl('https://www.example.com/product1'), 'https://www.example.com/product1')
+
+    def test_resizeEbayImageUrl(self):
+        self.assertEqual(Utils.resizeEbayImageUrl('https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l140.webp', 1600),
+                         'https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l1600.webp')
+        # sizes eBay doesn't have round up to the next one it does
+        self.assertEqual(Utils.resizeEbayImageUrl('https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg', 800),
+                         'https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l960.jpg')
+        self.assertEqual(Utils.resizeEbayImageUrl('https://example.com/photo.jpg', 1600), 'https://example.com/photo.jpg')
+
+    def test_resizeEbayImageUrl_leavesTheRequestedSizeAlone(self):
+        url = 'https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l960.png'
+        self.assertIs(Utils.resizeEbayImageUrl(url, 960), url)
+        self.assertIs(Utils.resizeEbayImageUrl(url, 900), url)
+        self.assertEqual(Utils.resizeEbayImageUrl(url + '?set_id=880000500F', 960), url)
+        self.assertEqual(Utils.resizeEbayImageUrl(url, 500), 'https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.png')
+
+    def test_resizeEbayImageUrls_collapsesSizeVariants(self):
+        urls = ['https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l500.jpg',
+                'https://i.ebayimg.com/images/g/w4EAAOSw8ZFk3Ab2/s-l500.jpg',
+                'https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l140.jpg']
+        self.assertEqual(Utils.resizeEbayImageUrls(urls, 640),
+                         ['https://i.ebayimg.com/images/g/qYkAAOSwZ9Jk3Ab1/s-l640.jpg',
+                          'https://i.ebayimg.com/images/g/w4EAAOSw8ZFk3Ab2/s-l640.jpg'])
+
+if __name__ == '__main__':
+    unittest.main()
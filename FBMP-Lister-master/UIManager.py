@@ -6,7 +6,7 @@ from urllib.parse import urlparse
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout,
-    QHBoxLayout, QComboBox, QMessageBox, QGroupBox, QStackedWidget, QListWidget, QFileDialog,
+    QHBoxLayout, QComboBox, QMessageBox, QGroupBox, QStackedWidget, QListWidget, QFileDialog, QCheckBox,
 )
 
 # The resolution was super bad between my devices. I found that putting these next two lines makes it more
@@ -15,7 +15,6 @@ QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
 QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
 
 from PyQt5.QtGui import QIntValidator, QDoubleValidator, QIcon, QColor
-from Scraper import products
 from PyQt5.QtGui import QFont
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -194,6 +193,12 @@ class UIManager(QMainWindow):
         """)
         layout.addWidget(self.urlEntry)
 
+        # Re-scrape: check the products we already listed from this store for price changes and stock-outs too
+        self.rescrapeCheckbox = QCheckBox("Also check my existing listings for price and stock changes")
+        self.rescrapeCheckbox.setFont(QFont("Arial", 12))
+        self.rescrapeCheckbox.setStyleSheet("color: #ecf0f1;")
+        layout.addWidget(self.rescrapeCheckbox)
+
         # Scrape button
         scrapeButton = self.createButton("Start Scraping", "#2ecc71")  # Green button color
         scrapeButton.setFont(QFont("Arial", 16, QFont.Bold))
@@ -434,12 +439,20 @@ class UIManager(QMainWindow):
 
         try:
             logging.info(f"Starting scraping for URL: {url}")
-            self.scraper.scrapeEbayStore(url)
-            self.csvManager.saveProducts(products)
+            # each batch's CSV is written during the scrape, as soon as the batch's images are downloaded
+            session = self.scraper.scrapeEbayStore(url, rescrape=self.rescrapeCheckbox.isChecked(), csvManager=self.csvManager)
+            updatesDir = None
+            try:
+                if session.delta is not None:
+                    updatesDir = self.csvManager.saveDelta(session.delta)
+            finally:
+                session.release()  # drop this run's products now that they're exported
             # Fetch the base directory from settings when the button is clicked
             baseDir = self.settingsManager.getBaseDir()  # Get the actual base directory from settings
 
             directoryMessage = f"Scraping completed successfully.\nProducts saved in {baseDir}."
+            if updatesDir:
+                directoryMessage += f"\nPrice and stock changes saved in {updatesDir}."
 
             customMessagebox = QMessageBox(self)
             customMessagebox.setWindowTitle("Scraping Status")
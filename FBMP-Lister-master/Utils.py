@@ -1,8 +1,11 @@
 import os
+import re
+from urllib.parse import urlparse, parse_qs
 
-def getNextBatchNumber(baseDir):
+# baseDir is the batch folder prefix ("Products Directory"), parentDir the folder the batches live in
+def getNextBatchNumber(baseDir, parentDir='.'):
     try:
-        existingDirs = [d for d in os.listdir('.') if os.path.isdir(d) and d.startswith(baseDir)]
+        existingDirs = [d for d in os.listdir(parentDir) if os.path.isdir(os.path.join(parentDir, d)) and d.startswith(baseDir)]
         existingNums = [int(d.split()[-1]) for d in existingDirs if d.split()[-1].isdigit()]
         maxNum = max(existingNums, default=0)
         return maxNum + 1
@@ -13,4 +16,50 @@ def getNextBatchNumber(baseDir):
     except Exception as e:
         # Handle other exceptions that may occur
         print(f"Unexpected error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+# eBay item URLs look like /itm/<id>, /itm/<title-slug>/<id> or the old ViewItem ?item=<id>,
+# usually with a pile of tracking parameters on the end.
+itemIdPattern = re.compile(r'/itm/(?:[^/?#]+/)?(\d{9,15})(?:[/?#]|$)')
+
+def getItemId(url):
+    parsedUrl = urlparse(url)
+    match = itemIdPattern.search(parsedUrl.path + '/')
+    if match:
+        return int(match.group(1))
+    itemParam = parse_qs(parsedUrl.query).get('item')
+    if itemParam and itemParam[0].isdigit():
+        return int(itemParam[0])
+    return None
+
+# Same item, same URL: strips tracking parameters and title slugs so an item is only ever fetched and stored once
+def canonicalItemUrl(url):
+    itemId = getItemId(url)
+    if itemId is None:
+        return url
+    parsedUrl = urlparse(url)
+    return f"{parsedUrl.scheme}://{parsedUrl.netloc}/itm/{itemId}"
+
+
+# eBay serves every picture at a fixed set of sizes, picked by the s-l<N> part of the file name
+# (https://i.ebayimg.com/images/g/<key>/s-l500.jpg). Any size suffix works on any picture, so we can
+# ask for exactly the one we want instead of whatever the page happened to show.
+ebayImageSizes = (64, 140, 225, 300, 400, 500, 640, 960, 1200, 1600)
+ebayImagePattern = re.compile(r'^(https?://i\.ebayimg\.com/.+/)s-l(\d+)(\.(?:jpe?g|png|webp|gif))(\?.*)?$', re.IGNORECASE)
+
+def resizeEbayImageUrl(url, size):
+    match = ebayImagePattern.match(url)
+    if not match:
+        return url
+    # round up to the nearest size eBay actually has so we never get served something smaller than asked for
+    size = next((available for available in ebayImageSizes if available >= size), ebayImageSizes[-1])
+    if int(match.group(2)) == size and not match.group(4):
+        return url
+    # the extension stays, eBay serves the same format at every size. The query string goes, the picture is the
+    # same without it and the file name we save it under comes from the URL.
+    return f"{match.group(1)}s-l{size}{match.group(3)}"
+
+# Thumbnails and full size versions of the same picture become one URL, in their original order
+def resizeEbayImageUrls(urls, size):
+    return list(dict.fromkeys(resizeEbayImageUrl(url, size) for url in urls))
@@ -37,7 +37,7 @@ def main():
         settingsManager = SettingsManager()
         dbManager = DatabaseManager()
         scraper = Scraper(dbManager, settingsManager)
-        csvManager = CSVManager(settingsManager)
+        csvManager = CSVManager(settingsManager, scraper.batchAllocator)
         uiManager = UIManager(settingsManager, scraper, csvManager)
 
         uiManager.show()